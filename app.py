@@ -1,15 +1,53 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, make_response, request
+from functools import wraps
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
+from urllib.parse import urlencode
+import hmac
+import json
+import threading
+import time
 from werkzeug.exceptions import HTTPException
 from services.recommender_service import RecommenderService, RecommenderServiceException
-from services.food_item_service import FoodItemService, FoodItemServiceException
-from services.nutrient_amount_service import NutrientAmountService, NutrientAmountServiceException
-from services.search_service import SearchService
+from services.food_item_service import ERROR_MESSAGE_FOOD_ITEM_NOT_FOUND, FoodItemService, FoodItemServiceException
+from services.nutrient_amount_service import ERROR_NUTRIENT_NOT_FOUND, NutrientAmountService, NutrientAmountServiceException
+from services.nutrient_index import NutrientIndexException, get_nutrient_index
+from services.search_service import SEARCH_MODES, SearchService
+from services.lexical_index import DEFAULT_AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, get_lexical_index
+from services.catalog_service import CatalogServiceException, catalog_service, get_catalog, get_catalog_diff, update_catalog
+from services.constants import ADMIN_API_TOKEN, EMBEDDER_MODEL_NAME, METRICS_ENABLED, RESPONSE_CACHE_MAX_AGE_SECONDS, RESPONSE_CACHE_SIZE, SEARCH_MODE, SIMILARITY_INDEX_BACKEND
+from services import embedder_service
+from services.embedder_service import get_embedder_revision, get_embedder_stats
+from services.metrics import METRIC_TYPE_COUNTER, METRIC_TYPE_GAUGE, PROMETHEUS_CONTENT_TYPE, MetricFamily, finish_request_timing, measure_stage, register_collector, render_metrics, start_request_timing
+from services.response_cache import ResponseCache, compute_etag
+from services.json_fragments import encode_json, get_json_fragments, render_json
+from services.nutrient_profiles import NUTRIENT_PROFILES, NutrientProfileException, get_nutrient_weights
+from services.pagination import DEFAULT_PAGE_SIZE, PaginationException, get_page
+from services.warmup_service import STATE_READY, ComponentNotReadyException, LazyComponent, get_component_statuses, register_component, start_components
+from models.catalog import Catalog
+from models.catalog_update import CatalogUpdate
 from models.food_item import FoodItem
 
 app = Flask(__name__)
 
 ARGUMENT_FOOD_ITEM_URI: str = 'food_item_uri'
 ARGUMENT_SEARCH_TEXT: str = "search_text"
+ARGUMENT_FOOD_ITEM_URIS: str = 'food_item_uris'
+ARGUMENT_SEARCH_TEXTS: str = "search_texts"
+MAX_BATCH_SIZE: int = 1000
+ARGUMENT_CURSOR: str = 'cursor'
+ARGUMENT_LIMIT: str = 'limit'
+ARGUMENT_STREAM: str = 'stream'
+STREAM_CHUNK_SIZE: int = 256
+ARGUMENT_UPSERT: str = 'upsert'
+ARGUMENT_REMOVE: str = 'remove'
+ARGUMENT_PERSIST: str = 'persist'
+ARGUMENT_PROFILE: str = 'profile'
+ARGUMENT_NUTRIENT_WEIGHTS: str = 'nutrient_weights'
+ARGUMENT_MODE: str = 'mode'
+ARGUMENT_PREFIX: str = 'prefix'
+ARGUMENT_WHERE: str = 'where'
+ARGUMENT_SORT: str = 'sort'
 
 @app.route("/")
 def home_page():
@@ -23,88 +61,546 @@ def home_page():
                   <li>browse available food item uris: /food-item-uris</li>
                   <li>check the detail of specific food item: /detail/food-items/food_item_uri</li>
                   <li>recommend healthier similar food items: /recommend-alternative-food-items</li>
+                  <li>filter food items by nutrient amounts: /filter?where=protein > 20 g and sugars < 5 g</li>
                 </ul>
                 </p>
              </html> 
            """
 
-recommender_service = RecommenderService() # initialise the RecommenderService() to reduce response time 
+def sync_service(service: Any, catalog: Catalog) -> Any:
+    """Bring a model-backed service to a Catalog snapshot, only embedding and scoring what changed since its own snapshot.
+    """
+    service_catalog = service.food_item_service.catalog
+    if service_catalog.version == catalog.version:
+        return service
+    return service.apply_catalog_update(catalog, get_catalog_diff(service_catalog, catalog))
+
+
+def sync_components() -> None:
+    """Apply the current Catalog to the loaded model-backed services, components that are still loading sync when they are done.
+    """
+    with catalog_update_lock:
+        # reloads can follow each other quickly, the services skip straight to the newest snapshot
+        catalog = get_catalog()
+        for component in (recommender_component, search_component):
+            if component.state == STATE_READY:
+                component.replace(sync_service(component.get(), catalog))
+
+
+# the model-backed services load in the background, so catalog-only endpoints serve immediately,
+# a service built while the catalog was reloaded catches up before it is published
+recommender_component = register_component('recommender_service', lambda: sync_service(RecommenderService(), get_catalog()))
+search_component = register_component('search_service', lambda: sync_service(SearchService(), get_catalog()))
+started_at = time.time()
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+catalog_update_lock = threading.Lock() # updates are applied one at a time, readers never take it
+# a reload is noticed by a request, the services are updated next to it instead of holding it up
+catalog_service.add_reload_listener(lambda catalog: threading.Thread(target=sync_components, daemon=True).start())
+start_components()
+
+
+def get_model_version() -> str:
+    """Get the model, the revision of its embeddings with the inference backend actually in use (a fallback
+    from the configured one included) and the similarity index backend, responses of the model depend on all of them.
+    """
+    return '{}@{}:{}'.format(EMBEDDER_MODEL_NAME, get_embedder_revision(), SIMILARITY_INDEX_BACKEND)
+
+
+def cached_response(component: Optional[LazyComponent] = None) -> Callable:
+    """Serve a deterministic GET endpoint with an ETag and Cache-Control, answer a matching If-None-Match
+    with 304 and keep rendered responses until the catalog (or, for endpoints backed by a model component,
+    the catalog of the service that renders them) changes.
+    """
+    def decorate(view: Callable) -> Callable:
+        @wraps(view)
+        def cached_view(*args: Any, **kwargs: Any) -> Response:
+            catalog_version = get_catalog().version
+            response_version = catalog_version
+            if component is not None:
+                # a service follows a reload a little later, until then it renders its own snapshot, the model is fixed per process
+                response_version = '{}:{}'.format(component.get().food_item_service.catalog.version, get_model_version())
+            request_key = '{}?{}'.format(request.path, urlencode(sorted(request.args.items(multi=True))))
+            etag = compute_etag(response_version, request_key)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(catalog_version, '{} {}'.format(response_version, request_key))
+                if cached is not None:
+                    response = Response(cached[0], mimetype=cached[1])
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if not response.is_streamed:
+                        # streamed listings keep their memory flat, they are revalidated but not kept
+                        response_cache.put(catalog_version, '{} {}'.format(response_version, request_key),
+                                           (response.get_data(), response.mimetype))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'public, max-age={}'.format(RESPONSE_CACHE_MAX_AGE_SECONDS)
+            return response
+        return cached_view
+    return decorate
+
+def json_response(value: Any) -> Response:
+    """Render a JSON response byte for byte like jsonify, pre-encoded fragments in the value (see services.json_fragments)
+    are spliced in instead of serializing the food items again.
+    """
+    return Response(render_json(value) + b'\n', mimetype='application/json')
+
+
+def get_nutrient_weights_argument(arguments: Any, recommender_service: RecommenderService) -> dict[str, float]:
+    """Read the personalized nutrient weights of a request: a named 'profile' and/or custom 'nutrient_weights',
+    a JSON object of nutrient labels of the recommender's catalog and weights, e.g. {"sodium": -3}.
+    """
+    nutrient_weights = arguments.get(ARGUMENT_NUTRIENT_WEIGHTS)
+    if isinstance(nutrient_weights, str):
+        try:
+            nutrient_weights = json.loads(nutrient_weights)
+        except ValueError:
+            raise NutrientProfileException('Invalid nutrient weights, expected a JSON object.')
+    return get_nutrient_weights(arguments.get(ARGUMENT_PROFILE), nutrient_weights,
+                                recommender_service.nutrient_amount_service.nutrient_matrix.columns_by_nutrient_label)
+
 
 @app.route("/recommend-alternative-food-item")
+@cached_response(recommender_component)
 def recommend_alternative_food_item():
-    """Recommend a healthy alternative to given fooditem. Expects argument 'food_item_uri'.
+    """Recommend a healthy alternative to given fooditem. Expects argument 'food_item_uri',
+    optionally personalized with 'profile' and 'nutrient_weights'.
     """
     #recommender_service = RecommenderService() # It takes time to initialize the recommender_service, because of the embedding process
-    food_item_service = FoodItemService()
+    recommender_service = recommender_component.get()
+    # looked up in the recommender's own snapshot, the one its responses are cached for
+    food_item_service = recommender_service.food_item_service
 
     food_item_uri: str = request.args.get(ARGUMENT_FOOD_ITEM_URI, default='')
     if food_item_uri == '':
         raise HTTPException('Invalid food item uri.')
     food_item: FoodItem = food_item_service.get_food_item(
         food_item_uri=food_item_uri)
+    nutrient_weights = get_nutrient_weights_argument(request.args, recommender_service)
     alternative_food_items = recommender_service.recommend_alternative_food_item(
-        food_item=food_item)
-    return jsonify([food.serialize() for food in alternative_food_items])
+        food_item=food_item, nutrient_weights=nutrient_weights)
+    with measure_stage('serialize'):
+        return json_response(get_json_fragments(food_item_service.catalog).get_food_items(alternative_food_items))
+
+
+def is_paginated() -> bool:
+    """Check whether a listing request asks for a page instead of the full listing.
+    """
+    return ARGUMENT_CURSOR in request.args or ARGUMENT_LIMIT in request.args
+
+
+def get_listing_page(sorted_keys: tuple[str, ...]) -> tuple[tuple[str, ...], Any]:
+    """Cut the page that the 'cursor' and 'limit' arguments ask for out of a pre-sorted index.
+    """
+    try:
+        limit = int(request.args.get(ARGUMENT_LIMIT, default=DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationException('Invalid limit.')
+    return get_page(sorted_keys, request.args.get(ARGUMENT_CURSOR), limit)
+
+
+def stream_listing(encoded_items: Iterable[bytes]) -> Response:
+    """Stream a full listing of JSON encoded items (see services.json_fragments) as one JSON array, byte for byte
+    like jsonify, or as NDJSON with 'stream=ndjson', a chunk of items at a time.
+    """
+    stream_format = request.args.get(ARGUMENT_STREAM) or 'json'
+    if stream_format not in ('json', 'ndjson'):
+        raise HTTPException('Invalid stream format, expected json or ndjson.')
+    encoded_items = iter(encoded_items)
+
+    def generate_chunks() -> Iterator[bytes]:
+        if stream_format == 'json':
+            yield b'['
+        for chunk_index, chunk in enumerate(iter(lambda: list(islice(encoded_items, STREAM_CHUNK_SIZE)), [])):
+            if stream_format == 'ndjson':
+                yield b'\n'.join(chunk) + b'\n'
+            else:
+                yield (b',' if chunk_index else b'') + b','.join(chunk)
+        if stream_format == 'json':
+            yield b']\n'
+
+    return Response(generate_chunks(), mimetype='application/x-ndjson' if stream_format == 'ndjson' else 'application/json')
 
 
 @app.route("/food-items")
+@cached_response()
 def food_items():
-    """Retrieve all fooditems.
+    """Retrieve all fooditems, streamed with 'stream', or one page of them ordered by URI with 'limit' and 'cursor'.
     """
-    food_item_service = FoodItemService()
-    food_items: list[FoodItem] = food_item_service.get_food_items()
-    return jsonify([food_item.serialize() for food_item in food_items])
+    food_item_service = FoodItemService(get_catalog())
+    json_fragments = get_json_fragments(food_item_service.catalog)
+    if is_paginated():
+        food_item_uris, next_cursor = get_listing_page(food_item_service.catalog.sorted_food_item_uris)
+        return json_response({"items": json_fragments.get_food_items(
+                                  [food_item_service.food_items_by_food_item_uri[food_item_uri] for food_item_uri in food_item_uris]),
+                              "next_cursor": next_cursor})
+    if ARGUMENT_STREAM in request.args:
+        return stream_listing(json_fragments.get_food_item(food_item) for food_item in food_item_service.get_food_items())
+    return json_response(json_fragments.get_food_items(food_item_service.get_food_items()))
 
 
 @app.route("/food-item-uris")
+@cached_response()
 def food_item_uris():
-    """Retrieve the food-item uris.
+    """Retrieve the food-item uris in sorted order, between 'start_index' and 'end_index', or paged with 'limit' and 'cursor',
+    or all of them streamed with 'stream'.
     """
-    nutrient_amount_service = NutrientAmountService()
-    food_item_uris = nutrient_amount_service.get_food_item_uris_for_nutrient_amounts()
+    sorted_food_item_uris = NutrientAmountService(get_catalog()).catalog.sorted_nutrient_food_item_uris
+    if is_paginated():
+        page, next_cursor = get_listing_page(sorted_food_item_uris)
+        return jsonify({"items": list(page), "next_cursor": next_cursor})
+    if ARGUMENT_STREAM in request.args:
+        return stream_listing(encode_json(food_item_uri) for food_item_uri in sorted_food_item_uris)
     start_index = max(int(request.args.get('start_index', default=0)), 0)
     end_index = min(int(request.args.get(
-        'end_index', default=100)), len(food_item_uris) - 1)
-    filtered_food_item_uris = sorted(food_item_uris)[
-        start_index:(end_index + 1)]
-    return jsonify(filtered_food_item_uris)
+        'end_index', default=100)), len(sorted_food_item_uris) - 1)
+    # the uris are sorted once per catalog version, a request only slices
+    return jsonify(list(sorted_food_item_uris[start_index:(end_index + 1)]))
+
+
+def get_search_mode(arguments: Any) -> str:
+    """Read the search mode of a request, 'semantic' or 'hybrid', SEARCH_MODE when it is not given.
+    """
+    mode = arguments.get(ARGUMENT_MODE, SEARCH_MODE)
+    if mode not in SEARCH_MODES:
+        raise HTTPException('Invalid search mode, expected one of {}.'.format(', '.join(SEARCH_MODES)))
+    return mode
 
 
+@app.route("/autocomplete")
+@cached_response()
+def autocomplete():
+    """
+    complete a prefix typed in a search box from the food labels, answered by the lexical index without the model
+    """
+    prefix: str = request.args.get(ARGUMENT_PREFIX, default='')
+    try:
+        limit = int(request.args.get(ARGUMENT_LIMIT, default=DEFAULT_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        raise HTTPException('Invalid limit.')
+    if not 0 < limit <= MAX_AUTOCOMPLETE_LIMIT:
+        raise HTTPException('Invalid limit, expected 1 to {}.'.format(MAX_AUTOCOMPLETE_LIMIT))
+    catalog = get_catalog()
+    lexical_index = get_lexical_index(catalog)
+    return json_response(get_json_fragments(catalog).get_food_items(
+        [lexical_index.food_items[position] for position in lexical_index.complete(prefix, limit)]))
 
-search_service = SearchService()
 
 @app.route("/search")
+@cached_response(search_component)
 def search_food():
     """
-    search relevant food items given text
+    search relevant food items given text, with 'mode=hybrid' exact label matches skip the model,
+    with 'where' only among the food items matching a nutrient filter
     """
     search_text: str = request.args.get(ARGUMENT_SEARCH_TEXT, default='') 
     if search_text == '':
         raise HTTPException("Invalid food name.")
-    relevant_food_items = search_service.compute_top_k_sim_items(search_text)
+    search_service = search_component.get()
+    mode = get_search_mode(request.args)
+    if ARGUMENT_WHERE in request.args:
+        # filtered on the search service's own snapshot, so positions and food item indexes agree
+        nutrient_index = get_nutrient_index(search_service.food_item_service.catalog)
+        with measure_stage('filter'):
+            food_item_positions = nutrient_index.filter(nutrient_index.parse_predicates(request.args.getlist(ARGUMENT_WHERE)))
+        relevant_food_items = search_service.compute_top_k_sim_items_among(search_text, food_item_positions, mode=mode)
+    else:
+        relevant_food_items = search_service.compute_top_k_sim_items(search_text, mode=mode)
+
+    with measure_stage('serialize'):
+        return json_response(get_json_fragments(search_service.food_item_service.catalog).get_food_items(relevant_food_items))
 
-    return jsonify([food.serialize() for food in relevant_food_items])
+
+def get_batch_argument(argument_name: str) -> list[str]:
+    """Read a non-empty list of strings from the JSON body of a batch request.
+    """
+    body = request.get_json(silent=True)
+    values = body.get(argument_name) if isinstance(body, dict) else None
+    if not isinstance(values, list) or not values or len(values) > MAX_BATCH_SIZE \
+            or not all(isinstance(value, str) and value != '' for value in values):
+        raise HTTPException('Invalid {}, expected a list of 1 to {} strings.'.format(argument_name, MAX_BATCH_SIZE))
+    return values
+
+
+@app.route("/filter")
+@cached_response()
+def filter_food_items():
+    """Retrieve the food items whose nutrient amounts match every 'where' filter, e.g. 'protein > 20 g and sugars < 5 g',
+    ordered by URI or by the nutrient of 'sort' ('-' for decreasing), one page at a time with 'limit' and 'cursor'.
+    """
+    catalog = get_catalog()
+    nutrient_index = get_nutrient_index(catalog)
+    try:
+        limit = int(request.args.get(ARGUMENT_LIMIT, default=DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationException('Invalid limit.')
+    with measure_stage('filter'):
+        food_items, total, next_cursor = nutrient_index.get_page(nutrient_index.parse_predicates(request.args.getlist(ARGUMENT_WHERE)),
+                                                                 request.args.get(ARGUMENT_SORT), request.args.get(ARGUMENT_CURSOR), limit)
+    with measure_stage('serialize'):
+        return json_response({"items": get_json_fragments(catalog).get_food_items(food_items),
+                              "total": total,
+                              "next_cursor": next_cursor})
+
+
+@app.route("/search/batch", methods=["POST"])
+def search_food_batch():
+    """
+    search relevant food items for every text in the JSON body {"search_texts": [...], "mode": "semantic"}
+    """
+    search_texts = get_batch_argument(ARGUMENT_SEARCH_TEXTS)
+    mode = get_search_mode(request.get_json(silent=True))
+    relevant_food_items = search_component.get().compute_top_k_sim_items_batch(search_texts, mode=mode)
+    with measure_stage('serialize'):
+        json_fragments = get_json_fragments(get_catalog())
+        return json_response([{"search_text": search_text, "food_items": json_fragments.get_food_items(food_items)}
+                              for search_text, food_items in zip(search_texts, relevant_food_items)])
 
 
+@app.route("/recommend/batch", methods=["POST"])
+def recommend_alternative_food_item_batch():
+    """
+    recommend healthy alternatives for every uri in the JSON body {"food_item_uris": [...]},
+    optionally personalized with "profile" and "nutrient_weights"
+    """
+    food_item_uris = get_batch_argument(ARGUMENT_FOOD_ITEM_URIS)
+    recommender_service = recommender_component.get()
+    nutrient_weights = get_nutrient_weights_argument(request.get_json(silent=True), recommender_service)
+    food_item_service = FoodItemService(get_catalog())
+    found_food_items = [food_item_service.food_items_by_food_item_uri.get(food_item_uri) for food_item_uri in food_item_uris]
+    alternative_food_items = iter(recommender_service.recommend_alternative_food_items(
+        [food_item for food_item in found_food_items if food_item is not None], nutrient_weights))
+    with measure_stage('serialize'):
+        json_fragments = get_json_fragments(food_item_service.catalog)
+        results = []
+        for food_item_uri, food_item in zip(food_item_uris, found_food_items):
+            if food_item is None:
+                results.append({"food_item_uri": food_item_uri, "error": ERROR_MESSAGE_FOOD_ITEM_NOT_FOUND})
+            else:
+                results.append({"food_item_uri": food_item_uri,
+                                "food_items": json_fragments.get_food_items(next(alternative_food_items))})
+        return json_response(results)
+
+
+@app.route("/nutrient-profiles")
+def nutrient_profiles():
+    """
+    the named nutrient profiles and the weights they override
+    """
+    return jsonify(NUTRIENT_PROFILES)
+
+
+@app.route("/search/cache-stats")
+def search_cache_stats():
+    """
+    hit rates of the query embedding and search result caches
+    """
+    return jsonify(search_component.get().query_cache.get_stats())
+
+
+@app.route("/response-cache/stats")
+def response_cache_stats():
+    """
+    hit rate of the server-side response cache
+    """
+    return jsonify(response_cache.get_stats())
+
+
+@app.route("/embedder/stats")
+def embedder_stats():
+    """
+    batch sizes, queueing delays and inference backend of the shared embedder
+    """
+    search_component.get() # the embedder is loaded by the search service
+    return jsonify(get_embedder_stats())
+
+
+def collect_service_metrics() -> list[MetricFamily]:
+    """Report the catalog size and load time, the component load times and the cache and model call counters
+    the services already keep, read when /metrics is rendered so the hot path does not pay for them.
+    """
+    catalog = get_catalog()
+    component_statuses = get_component_statuses()
+    response_cache_stats = response_cache.get_stats()
+    metric_families: list[MetricFamily] = [
+        ('food_retriever_catalog_food_items', METRIC_TYPE_GAUGE, 'Number of food items in the catalog.',
+         [('', {}, len(catalog.food_items_by_food_item_uri))]),
+        ('food_retriever_catalog_nutrients', METRIC_TYPE_GAUGE, 'Number of nutrients in the catalog.',
+         [('', {}, len(catalog.nutrient_matrix.nutrient_uris))]),
+        ('food_retriever_catalog_load_duration_seconds', METRIC_TYPE_GAUGE, 'Duration of the last catalog load.',
+         [('', {}, catalog_service.load_duration_seconds or 0.0)]),
+        ('food_retriever_catalog_info', METRIC_TYPE_GAUGE, 'The version of the current catalog snapshot.',
+         [('', {'version': catalog.version}, 1)]),
+        ('food_retriever_component_ready', METRIC_TYPE_GAUGE, 'Whether a model-backed component is loaded.',
+         [('', {'component': name}, status['state'] == 'ready') for name, status in component_statuses.items()]),
+        ('food_retriever_component_load_duration_seconds', METRIC_TYPE_GAUGE, 'Duration of the load of a model-backed component.',
+         [('', {'component': name}, status['load_duration_seconds']) for name, status in component_statuses.items()
+          if status['load_duration_seconds'] is not None]),
+        ('food_retriever_response_cache_hits_total', METRIC_TYPE_COUNTER, 'Responses served from the response cache.',
+         [('', {}, response_cache_stats['hits'])]),
+        ('food_retriever_response_cache_misses_total', METRIC_TYPE_COUNTER, 'Responses rendered on a response cache miss.',
+         [('', {}, response_cache_stats['misses'])])]
+    if search_component.state == 'ready':
+        query_cache_stats = search_component.get().query_cache.get_stats()
+        tiers = ('embeddings', 'persistent_embeddings', 'results')
+        metric_families.append(('food_retriever_query_cache_hits_total', METRIC_TYPE_COUNTER, 'Search cache hits, by tier.',
+                                [('', {'tier': tier}, query_cache_stats[tier]['hits']) for tier in tiers]))
+        metric_families.append(('food_retriever_query_cache_misses_total', METRIC_TYPE_COUNTER, 'Search cache misses, by tier.',
+                                [('', {'tier': tier}, query_cache_stats[tier]['misses']) for tier in tiers]))
+        similarity_index = search_component.get().similarity_index
+        metric_families.append(('food_retriever_similarity_scan_bytes', METRIC_TYPE_GAUGE,
+                                'Bytes a search scans, by similarity index backend.',
+                                [('', {'backend': similarity_index.backend}, similarity_index.get_scan_bytes())]))
+    if recommender_component.state == 'ready':
+        food_rankings_cache = recommender_component.get().food_rankings_cache
+        metric_families.append(('food_retriever_food_ranking_cache_hits_total', METRIC_TYPE_COUNTER,
+                                'Health score rankings served from the nutrient profile cache.', [('', {}, food_rankings_cache.hits)]))
+        metric_families.append(('food_retriever_food_ranking_cache_misses_total', METRIC_TYPE_COUNTER,
+                                'Health score rankings computed on a nutrient profile cache miss.', [('', {}, food_rankings_cache.misses)]))
+        recommender_service = recommender_component.get()
+        if recommender_service.neighbor_table is not None:
+            metric_families.append(('food_retriever_neighbor_table_hits_total', METRIC_TYPE_COUNTER,
+                                    'Catalog food items recommended from the neighbor table.',
+                                    [('', {}, recommender_service.neighbor_table_hits)]))
+            metric_families.append(('food_retriever_neighbor_table_misses_total', METRIC_TYPE_COUNTER,
+                                    'Catalog food items with too few healthier neighbours in the table, recommended by a scan.',
+                                    [('', {}, recommender_service.neighbor_table_misses)]))
+    if embedder_service.embedder is not None:
+        embedder_stats = embedder_service.embedder.get_stats()
+        metric_families.append(('food_retriever_embedder_batches_total', METRIC_TYPE_COUNTER,
+                                'Forward passes of the model on query texts.', [('', {}, embedder_stats['batches'])]))
+        metric_families.append(('food_retriever_embedder_texts_total', METRIC_TYPE_COUNTER,
+                                'Query texts encoded by the model.', [('', {}, embedder_stats['texts'])]))
+    return metric_families
+
+
+register_collector(collect_service_metrics)
+
+
+if METRICS_ENABLED:
+    @app.before_request
+    def start_timing():
+        start_request_timing(request.endpoint or '')
+
+    @app.after_request
+    def add_server_timing(response: Response) -> Response:
+        """Record the latency of the request and report the time spent in every stage in the Server-Timing header.
+        """
+        server_timing = finish_request_timing(response.status_code)
+        if server_timing is not None:
+            response.headers['Server-Timing'] = server_timing
+        return response
+
+
+@app.route("/metrics")
+def metrics():
+    """
+    per-stage latency histograms, cache and model call counters and catalog gauges in the Prometheus text format
+    """
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route("/healthz")
+def healthz():
+    """
+    liveness: the process serves requests, with the load state and duration of every component
+    """
+    return jsonify({"status": "ok", "uptime_seconds": time.time() - started_at,
+                    "components": get_component_statuses()})
+
+
+@app.route("/readyz")
+def readyz():
+    """
+    readiness: HTTP 200 once every component is loaded, HTTP 503 before
+    """
+    statuses = get_component_statuses()
+    ready = all(status["state"] == "ready" for status in statuses.values())
+    return jsonify({"ready": ready, "components": statuses}), 200 if ready else 503
+
+
+
+
+def get_catalog_update() -> tuple[CatalogUpdate, bool]:
+    """Read a CatalogUpdate from the JSON body of an admin request:
+    {"upsert": [{"uri": ..., "label": ..., "labels": [...], "nutrients": [{"uri", "label_en", "unit", "value"}, ...]}], "remove": [uri, ...], "persist": false}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise HTTPException('Invalid catalog update, expected a JSON object.')
+    raw_food_items = body.get(ARGUMENT_UPSERT, [])
+    removed_food_item_uris = body.get(ARGUMENT_REMOVE, [])
+    if not isinstance(raw_food_items, list) or not isinstance(removed_food_item_uris, list) \
+            or len(raw_food_items) + len(removed_food_item_uris) > MAX_BATCH_SIZE \
+            or not all(isinstance(food_item_uri, str) and food_item_uri != '' for food_item_uri in removed_food_item_uris):
+        raise HTTPException('Invalid catalog update, expected at most {} food items to upsert or remove.'.format(MAX_BATCH_SIZE))
+    upserted_food_items = []
+    nutrient_amounts_by_food_item_uri = {}
+    for raw_food_item in raw_food_items:
+        if not isinstance(raw_food_item, dict) or not isinstance(raw_food_item.get('uri'), str) or raw_food_item['uri'] == '' \
+                or not isinstance(raw_food_item.get('label'), str) or raw_food_item['label'] == '':
+            raise HTTPException('Invalid food item, expected a uri and a label.')
+        other_labels = raw_food_item.get('labels', [])
+        if not isinstance(other_labels, list) or not all(isinstance(other_label, str) and other_label != '' for other_label in other_labels):
+            raise HTTPException('Invalid labels, expected a list of preferred labels.')
+        upserted_food_items.append(FoodItem(uri=raw_food_item['uri'], label=raw_food_item['label'], labels=tuple(other_labels)))
+        if 'nutrients' in raw_food_item:
+            if not isinstance(raw_food_item['nutrients'], list) or not all(isinstance(nutrient, dict) for nutrient in raw_food_item['nutrients']):
+                raise HTTPException('Invalid nutrients, expected a list of nutrient amounts.')
+            nutrient_amounts_by_food_item_uri[raw_food_item['uri']] = raw_food_item['nutrients']
+    return CatalogUpdate(upserted_food_items, nutrient_amounts_by_food_item_uri, removed_food_item_uris), \
+        bool(body.get(ARGUMENT_PERSIST, False))
+
+
+@app.route("/admin/catalog-update", methods=["POST"])
+def admin_catalog_update():
+    """
+    add, update or remove food items and their nutrient amounts without a restart, requires 'Authorization: Bearer <ADMIN_API_TOKEN>'
+    """
+    if ADMIN_API_TOKEN == '':
+        return jsonify({"error": "The admin API is disabled."}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer {}'.format(ADMIN_API_TOKEN)):
+        return jsonify({"error": "Invalid admin token."}), 401
+    catalog_update, persist = get_catalog_update()
+    with catalog_update_lock:
+        # until the services are swapped, requests see the new catalog with the previous services, which stay self-consistent
+        recommender_service = recommender_component.get()
+        search_service = search_component.get()
+        started_at_update = time.perf_counter()
+        catalog = update_catalog(catalog_update, persist)
+        recommender_component.replace(recommender_service.apply_catalog_update(catalog, catalog_update))
+        search_component.replace(search_service.apply_catalog_update(catalog, catalog_update))
+    return jsonify({"version": catalog.version,
+                    "food_item_count": len(catalog.food_items_by_food_item_uri),
+                    "update_duration_seconds": time.perf_counter() - started_at_update})
 
 
 @app.route("/detail")
+@cached_response()
 def food_item_detail():
     """
     view detail of a specific food item given uri
     """
-    food_item_service = FoodItemService()
-    nutrient_amount_service = NutrientAmountService()
+    catalog = get_catalog() # one snapshot per request keeps both services consistent during a reload
+    food_item_service = FoodItemService(catalog)
+    nutrient_amount_service = NutrientAmountService(catalog)
     food_item_uri: str = request.args.get(ARGUMENT_FOOD_ITEM_URI, default='')
     if food_item_uri == '':
         raise HTTPException('Invalid food item uri.')
     food_item: FoodItem = food_item_service.get_food_item(
         food_item_uri=food_item_uri)
-    nutrient_amount = nutrient_amount_service.get_nutrient_amounts_for_food_item(food_item)
-    food_item_nutrient_dict = {"food_item": food_item.serialize(),
-        "nutrient_amounts":[nutrient.serialize() for nutrient in nutrient_amount]               
+    if food_item.uri not in nutrient_amount_service.nutrient_matrix.row_by_food_item_uri:
+        raise NutrientAmountServiceException(ERROR_NUTRIENT_NOT_FOUND)
+    # the food item and its nutrient amounts are encoded once per catalog version
+    json_fragments = get_json_fragments(catalog)
+    food_item_nutrient_dict = {"food_item": json_fragments.get_food_item(food_item),
+        "nutrient_amounts": json_fragments.get_nutrient_amounts(food_item.uri)
     }
-    return jsonify(food_item_nutrient_dict)
+    return json_response(food_item_nutrient_dict)
     
     
     
@@ -114,12 +610,21 @@ def food_item_detail():
 
 
 
+@app.errorhandler(ComponentNotReadyException)
+def handle_component_not_ready(e):
+    """Handle requests that need a component which is still loading by returning HTTP 503.
+    """
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Handle Errornous requests to API by returning HTTP 500.
     """
     exception_classes = [HTTPException, NutrientAmountServiceException,
-                         FoodItemServiceException, RecommenderServiceException]
+                         FoodItemServiceException, RecommenderServiceException,
+                         CatalogServiceException, PaginationException, NutrientProfileException,
+                         NutrientIndexException]
     if type(e) in exception_classes:
         return jsonify({"error": str(e)}), 500
     else:
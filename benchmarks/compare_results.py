@@ -0,0 +1,72 @@
+from typing import Any, Iterator
+import argparse
+import json
+
+# Constants
+FILE_MODE_READ: str = 'r'
+STARTUP_KINDS: list[str] = ['cold_startup', 'warm_startup']
+
+
+def get_metrics(results: dict[str, Any]) -> dict[str, float]:
+    """Flatten the results of a benchmark run into named metrics, lower is better for all of them.
+
+    Parameters
+    ----------
+    results: dict[str, Any]
+        The results written by `python -m benchmarks.run_benchmarks`
+
+    Returns
+    -------
+    dict[str, float]
+        The metrics keyed by catalog size and name, e.g. '10000/search/p99_ms'
+    """
+    metrics = {}
+    for run in results['runs']:
+        for startup_kind in STARTUP_KINDS:
+            for step_name, duration_seconds in run[startup_kind]['durations_seconds'].items():
+                metrics['{}/{}/{}_seconds'.format(run['food_items'], startup_kind, step_name)] = duration_seconds
+            metrics['{}/{}/peak_rss_mb'.format(run['food_items'], startup_kind)] = run[startup_kind]['peak_rss_mb']
+        for endpoint_name, summary in run['endpoints']['endpoints'].items():
+            for statistic in ('p50_ms', 'p99_ms'):
+                metrics['{}/{}/{}'.format(run['food_items'], endpoint_name, statistic)] = summary[statistic]
+        metrics['{}/endpoints/peak_rss_mb'.format(run['food_items'])] = run['endpoints']['peak_rss_mb']
+    return metrics
+
+
+def compare_results(baseline: dict[str, Any], candidate: dict[str, Any]) -> Iterator[tuple[str, float, float, float]]:
+    """Compare the metrics two benchmark runs have in common.
+
+    Parameters
+    ----------
+    baseline: dict[str, Any]
+        The results to compare against
+    candidate: dict[str, Any]
+        The new results
+
+    Returns
+    -------
+    Iterator[tuple[str, float, float, float]]
+        The name, the baseline value, the candidate value and their ratio of every common metric
+    """
+    baseline_metrics = get_metrics(baseline)
+    candidate_metrics = get_metrics(candidate)
+    for metric_name, baseline_value in baseline_metrics.items():
+        if metric_name in candidate_metrics:
+            candidate_value = candidate_metrics[metric_name]
+            yield metric_name, baseline_value, candidate_value, candidate_value / baseline_value if baseline_value else float('inf')
+
+
+if __name__ == '__main__':
+    # Compare two benchmark results, e.g.
+    # python -m benchmarks.compare_results data/benchmarks/before.json data/benchmarks/after.json --threshold 1.2
+    argument_parser = argparse.ArgumentParser(description='Compare two benchmark results.')
+    argument_parser.add_argument('baseline')
+    argument_parser.add_argument('candidate')
+    argument_parser.add_argument('--threshold', type=float, default=None, help='only show metrics that got this many times worse')
+    arguments = argument_parser.parse_args()
+
+    with open(arguments.baseline, FILE_MODE_READ) as baseline_file, open(arguments.candidate, FILE_MODE_READ) as candidate_file:
+        comparison = compare_results(json.load(baseline_file), json.load(candidate_file))
+    for metric_name, baseline_value, candidate_value, ratio in comparison:
+        if arguments.threshold is None or ratio >= arguments.threshold:
+            print('{:<55} {:>12.3f} {:>12.3f} {:>8.2f}x'.format(metric_name, baseline_value, candidate_value, ratio))
@@ -0,0 +1,323 @@
+from typing import Any, Callable, Optional
+from benchmarks.synthetic_catalog import SYNTHETIC_SEED, SyntheticCatalog
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Constants
+BENCHMARK_DIR_PATH: str = 'data/benchmarks'
+BENCHMARK_FORMAT_VERSION: int = 1
+BENCHMARK_ENVIRONMENT: dict[str, str] = {'EMBEDDER_BACKEND': 'stub', 'RESPONSE_CACHE_SIZE': '0'} # overridden by the caller's environment
+BATCH_SIZE: int = 32
+CACHE_DIR_NAMES: list[str] = ['catalog', 'embeddings', 'indexes', 'cache', 'models']
+CONFIGURATION_VARIABLES: list[str] = ['EMBEDDER_BACKEND', 'EMBEDDER_MAX_BATCH_SIZE', 'EMBEDDER_MAX_WAIT_MS', 'QUERY_CACHE_PATH',
+                                      'QUERY_EMBEDDING_CACHE_SIZE', 'QUERY_RESULT_CACHE_SIZE', 'RESPONSE_CACHE_SIZE',
+                                      'SEARCH_MODE', 'SIMILARITY_INDEX_BACKEND', 'USE_NEIGHBOR_TABLE']
+DEFAULT_FOOD_ITEM_COUNTS: list[int] = [10000, 100000]
+DEFAULT_REQUEST_COUNT: int = 200
+DEFAULT_WARMUP_REQUEST_COUNT: int = 10
+ERROR_MESSAGE_PHASE_FAILED: str = 'Benchmark phase {} failed with exit code {}:\n{}'
+ERROR_MESSAGE_REQUEST_FAILED: str = 'Request {} failed with HTTP {}.'
+PHASE_ENDPOINTS: str = 'endpoints'
+PHASE_STARTUP: str = 'startup'
+PROFILE_NAME: str = 'low-sugar'
+REPOSITORY_DIR_PATH: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BenchmarkException(Exception):
+    """An Exception in a benchmark run, do nothing.
+    """
+    pass
+
+
+def get_peak_rss_mb() -> float:
+    """Get the peak resident set size of this process.
+
+    Returns
+    -------
+    float
+        The peak RSS in MiB
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / (1 << 20) if sys.platform == 'darwin' else peak_rss / (1 << 10)
+
+
+def summarize_latencies(latencies_seconds: list[float], elapsed_seconds: float) -> dict[str, float]:
+    """Summarize the latencies of a series of requests.
+
+    Parameters
+    ----------
+    latencies_seconds: list[float]
+        The latency of every request
+    elapsed_seconds: float
+        The wall time of the whole series
+
+    Returns
+    -------
+    dict[str, float]
+        The request count, the p50, p99 and mean latencies in milliseconds and the throughput in requests per second
+    """
+    latencies_ms = np.array(latencies_seconds) * 1000
+    return {'requests': len(latencies_ms),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+            'mean_ms': float(np.mean(latencies_ms)),
+            'throughput_rps': len(latencies_ms) / elapsed_seconds if elapsed_seconds > 0 else 0.0}
+
+
+def run_startup_phase() -> dict[str, Any]:
+    """Load the catalog and build the model-backed services once, in the data directory of the current working directory.
+
+    Returns
+    -------
+    dict[str, Any]
+        The duration of every step in seconds and the peak RSS
+    """
+    durations_seconds: dict[str, float] = {}
+    started_at = time.perf_counter()
+    from services.catalog_service import get_catalog
+    from services.recommender_service import RecommenderService
+    from services.search_service import SearchService
+    durations_seconds['import'] = time.perf_counter() - started_at
+
+    steps: list[tuple[str, Callable[[], Any]]] = [('catalog', get_catalog),
+                                                  ('recommender_service', RecommenderService),
+                                                  ('search_service', SearchService)]
+    for step_name, step in steps:
+        step_started_at = time.perf_counter()
+        step()
+        durations_seconds[step_name] = time.perf_counter() - step_started_at
+    durations_seconds['total'] = time.perf_counter() - started_at
+    return {'durations_seconds': durations_seconds,
+            'food_items': len(get_catalog().food_items_by_food_item_uri),
+            'peak_rss_mb': get_peak_rss_mb()}
+
+
+def run_endpoints_phase(request_count: int, warmup_request_count: int, seed: int) -> dict[str, Any]:
+    """Time every endpoint through the Flask test client, in the data directory of the current working directory.
+
+    Every request of a series asks for a different food item or text, so the caches answer as
+    they would for varied traffic. Set RESPONSE_CACHE_SIZE to measure cached responses instead.
+
+    Parameters
+    ----------
+    request_count: int
+        The number of timed requests per endpoint
+    warmup_request_count: int
+        The number of untimed requests per endpoint before the timed ones
+    seed: int
+        The seed the food items and texts are sampled with
+
+    Returns
+    -------
+    dict[str, Any]
+        The latency summary of every endpoint, the component load durations and the peak RSS
+    """
+    started_at = time.perf_counter()
+    from app import app
+    from services.catalog_service import get_catalog
+    from services.warmup_service import get_component_statuses, wait_for_components
+    wait_for_components()
+    component_statuses = get_component_statuses()
+    for component_name, component_status in component_statuses.items():
+        if component_status['error'] is not None:
+            raise BenchmarkException('{}: {}'.format(component_name, component_status['error']))
+    startup_seconds = time.perf_counter() - started_at
+
+    catalog = get_catalog()
+    food_items = list(catalog.food_items_by_food_item_uri.values())
+    random_generator = np.random.default_rng(seed)
+    sample_size = request_count + warmup_request_count
+    sampled_food_items = [food_items[row] for row in random_generator.choice(
+        len(food_items), size=sample_size, replace=sample_size > len(food_items))]
+    batches = [[sampled_food_items[(start + offset) % sample_size] for offset in range(BATCH_SIZE)]
+               for start in range(sample_size)]
+    start_indexes = random_generator.integers(0, max(len(catalog.sorted_nutrient_food_item_uris) - 100, 1), size=sample_size)
+
+    # every endpoint maps the index of a request to the arguments of the test client
+    endpoints: dict[str, Callable[[int], tuple[str, dict[str, Any]]]] = {
+        'food_items_page': lambda index: ('/food-items', {'query_string': {'limit': 100}}),
+        'food_item_uris': lambda index: ('/food-item-uris', {'query_string': {
+            'start_index': int(start_indexes[index]), 'end_index': int(start_indexes[index]) + 99}}),
+        'detail': lambda index: ('/detail', {'query_string': {'food_item_uri': sampled_food_items[index].uri}}),
+        'autocomplete': lambda index: ('/autocomplete', {'query_string': {'prefix': sampled_food_items[index].label[:3]}}),
+        'search': lambda index: ('/search', {'query_string': {'search_text': sampled_food_items[index].label}}),
+        'search_hybrid': lambda index: ('/search', {'query_string': {
+            'search_text': sampled_food_items[index].label, 'mode': 'hybrid'}}),
+        'recommend': lambda index: ('/recommend-alternative-food-item', {'query_string': {
+            'food_item_uri': sampled_food_items[index].uri}}),
+        'recommend_profile': lambda index: ('/recommend-alternative-food-item', {'query_string': {
+            'food_item_uri': sampled_food_items[index].uri, 'profile': PROFILE_NAME}}),
+        'search_batch': lambda index: ('/search/batch', {'method': 'POST', 'json': {
+            'search_texts': [food_item.label for food_item in batches[index]]}}),
+        'recommend_batch': lambda index: ('/recommend/batch', {'method': 'POST', 'json': {
+            'food_item_uris': [food_item.uri for food_item in batches[index]]}}),
+    }
+    test_client = app.test_client()
+    results: dict[str, Any] = {}
+    for endpoint_name, get_request in endpoints.items():
+        latencies_seconds = []
+        series_started_at = time.perf_counter()
+        for index in range(sample_size):
+            path, request_arguments = get_request(index)
+            request_started_at = time.perf_counter()
+            response = test_client.open(path, **request_arguments)
+            response.get_data()
+            if index >= warmup_request_count:
+                latencies_seconds.append(time.perf_counter() - request_started_at)
+            elif index == warmup_request_count - 1:
+                series_started_at = time.perf_counter()
+            if response.status_code != 200:
+                raise BenchmarkException(ERROR_MESSAGE_REQUEST_FAILED.format(path, response.status_code))
+        results[endpoint_name] = summarize_latencies(latencies_seconds, time.perf_counter() - series_started_at)
+    return {'endpoints': results,
+            'startup_seconds': startup_seconds,
+            'components': component_statuses,
+            'peak_rss_mb': get_peak_rss_mb()}
+
+
+def run_phase(work_dir_path: str, phase_arguments: list[str]) -> dict[str, Any]:
+    """Run a benchmark phase in a fresh process, so every phase starts cold in memory and has its own peak RSS.
+
+    Parameters
+    ----------
+    work_dir_path: str
+        The working directory of the process, holding the data directory of the synthetic catalog
+    phase_arguments: list[str]
+        The arguments of the phase
+
+    Returns
+    -------
+    dict[str, Any]
+        The results the phase printed as its last line
+    """
+    environment = {**BENCHMARK_ENVIRONMENT, **os.environ}
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [REPOSITORY_DIR_PATH, os.environ.get('PYTHONPATH')]))
+    completed_process = subprocess.run([sys.executable, '-m', 'benchmarks.run_benchmarks'] + phase_arguments,
+                                       cwd=work_dir_path, env=environment, capture_output=True, text=True)
+    if completed_process.returncode != 0:
+        raise BenchmarkException(ERROR_MESSAGE_PHASE_FAILED.format(
+            ' '.join(phase_arguments), completed_process.returncode, completed_process.stderr[-2000:]))
+    return json.loads(completed_process.stdout.strip().splitlines()[-1])
+
+
+def benchmark_catalog_size(food_item_count: int, benchmark_dir_path: str, request_count: int,
+                           warmup_request_count: int, seed: int) -> dict[str, Any]:
+    """Generate a synthetic catalog and run every benchmark on it.
+
+    Cold startup runs on the JSON sources without any compiled catalog, embedding store or index
+    on disk. Warm startup runs after the catalog was compiled and the first start stored the
+    embeddings and indexes, as a restarted server would.
+
+    Parameters
+    ----------
+    food_item_count: int
+        The size of the synthetic catalog
+    benchmark_dir_path: str
+        The directory the working directories of every size are created in
+    request_count: int
+        The number of timed requests per endpoint
+    warmup_request_count: int
+        The number of untimed requests per endpoint
+    seed: int
+        The seed of the synthetic catalog and the sampled requests
+
+    Returns
+    -------
+    dict[str, Any]
+        The results of the catalog generation, the cold and warm startups and the endpoints
+    """
+    from services.catalog_service import CatalogService
+
+    work_dir_path = os.path.abspath(os.path.join(benchmark_dir_path, 'food-items-{}'.format(food_item_count)))
+    data_dir_path = os.path.join(work_dir_path, 'data')
+    shutil.rmtree(work_dir_path, ignore_errors=True)
+    started_at = time.perf_counter()
+    synthetic_catalog = SyntheticCatalog(CatalogService().load_catalog_from_sources(), food_item_count, seed)
+    data_file_paths = synthetic_catalog.write(data_dir_path)
+    generation = {'duration_seconds': time.perf_counter() - started_at,
+                  'size_mb': sum(os.path.getsize(data_file_path) for data_file_path in data_file_paths) / (1 << 20)}
+
+    for cache_dir_name in CACHE_DIR_NAMES:
+        shutil.rmtree(os.path.join(data_dir_path, cache_dir_name), ignore_errors=True)
+    cold_startup = run_phase(work_dir_path, ['--phase', PHASE_STARTUP])
+    subprocess.run([sys.executable, '-m', 'services.catalog_store'], cwd=work_dir_path, check=True, capture_output=True,
+                   env={**BENCHMARK_ENVIRONMENT, **os.environ, 'PYTHONPATH': REPOSITORY_DIR_PATH})
+    warm_startup = run_phase(work_dir_path, ['--phase', PHASE_STARTUP])
+    endpoints = run_phase(work_dir_path, ['--phase', PHASE_ENDPOINTS, '--requests', str(request_count),
+                                          '--warmup-requests', str(warmup_request_count), '--seed', str(seed)])
+    return {'food_items': food_item_count,
+            'generation': generation,
+            'cold_startup': cold_startup,
+            'warm_startup': warm_startup,
+            'endpoints': endpoints}
+
+
+def get_git_commit() -> Optional[str]:
+    """Get the commit of the benchmarked code.
+
+    Returns
+    -------
+    Optional[str]
+        The commit hash, None outside a git checkout
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY_DIR_PATH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    # Benchmark startup, endpoint latency and memory on synthetic catalogs, e.g.
+    # python -m benchmarks.run_benchmarks --food-items 10000 100000 --output data/benchmarks/results.json
+    argument_parser = argparse.ArgumentParser(description='Benchmark the app offline on synthetic catalogs.')
+    argument_parser.add_argument('--food-items', type=int, nargs='+', default=DEFAULT_FOOD_ITEM_COUNTS)
+    argument_parser.add_argument('--requests', type=int, default=DEFAULT_REQUEST_COUNT)
+    argument_parser.add_argument('--warmup-requests', type=int, default=DEFAULT_WARMUP_REQUEST_COUNT)
+    argument_parser.add_argument('--seed', type=int, default=SYNTHETIC_SEED)
+    argument_parser.add_argument('--benchmark-dir', default=BENCHMARK_DIR_PATH)
+    argument_parser.add_argument('--output', default=None, help='defaults to <benchmark-dir>/results-<timestamp>.json')
+    argument_parser.add_argument('--phase', choices=[PHASE_STARTUP, PHASE_ENDPOINTS], default=None, help=argparse.SUPPRESS)
+    arguments = argument_parser.parse_args()
+
+    if arguments.phase == PHASE_STARTUP:
+        print(json.dumps(run_startup_phase()))
+    elif arguments.phase == PHASE_ENDPOINTS:
+        print(json.dumps(run_endpoints_phase(arguments.requests, arguments.warmup_requests, arguments.seed)))
+    else:
+        results = {'format_version': BENCHMARK_FORMAT_VERSION,
+                   'meta': {'git_commit': get_git_commit(),
+                            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                            'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'cpu_count': os.cpu_count(),
+                            'environment': {key: value for key, value in {**BENCHMARK_ENVIRONMENT, **os.environ}.items()
+                                            if key in CONFIGURATION_VARIABLES},
+                            'requests': arguments.requests,
+                            'seed': arguments.seed},
+                   'runs': []}
+        output_file_path = arguments.output or os.path.join(
+            arguments.benchmark_dir, 'results-{}.json'.format(time.strftime('%Y%m%d-%H%M%S')))
+        for food_item_count in arguments.food_items:
+            run = benchmark_catalog_size(food_item_count, arguments.benchmark_dir, arguments.requests,
+                                         arguments.warmup_requests, arguments.seed)
+            results['runs'].append(run)
+            print(json.dumps({'food_items': food_item_count,
+                              'cold_startup_seconds': run['cold_startup']['durations_seconds']['total'],
+                              'warm_startup_seconds': run['warm_startup']['durations_seconds']['total'],
+                              'p50_ms': {name: round(summary['p50_ms'], 3) for name, summary in run['endpoints']['endpoints'].items()}}))
+        os.makedirs(os.path.dirname(os.path.abspath(output_file_path)), exist_ok=True)
+        with open(output_file_path, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print('wrote {}'.format(output_file_path))
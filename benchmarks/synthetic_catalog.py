@@ -0,0 +1,139 @@
+from typing import Any, Iterator
+from models.catalog import Catalog
+from services.constants import KEY_DATA, KEY_FOODITEM_URI, KEY_FOODITEMS_WITH_NUTRIENTS, KEY_LABEL, KEY_LABEL_EN, KEY_NUTRIENTS, KEY_PREFLABELS, KEY_UNIT, KEY_URI, KEY_VALUE
+import json
+import os
+
+import numpy as np
+
+# Constants
+FILE_MODE_WRITE: str = 'w'
+FOOD_ITEM_LABELS_FILE_NAME: str = 'food_item_labels_{}_{}.json'
+FOOD_ITEMS_PER_LABELS_FILE: int = 10000
+KEY_LANGUAGE: str = 'language'
+LANGUAGE_EN: str = 'en'
+NUTRIENT_AMOUNTS_FILE_NAME: str = 'nutrient_amounts_for_food_items.json'
+NUTRIENT_AMOUNT_JITTER: float = 0.1 # sigma of the log-normal factor the template amounts are scaled by
+SYNTHETIC_FOOD_ITEM_URI: str = 'http://www.foodvoc.org/resource/synthetic#foodItem{}'
+SYNTHETIC_SEED: int = 0
+VARIANT_WORDS: list[str] = ['organic', 'homemade', 'frozen', 'canned', 'light', 'wholegrain', 'smoked', 'dried',
+                            'unsalted', 'sweetened', 'fresh', 'roasted', 'baked', 'boiled', 'fried', 'steamed']
+
+
+class SyntheticCatalog:
+    """The SyntheticCatalog scales a template Catalog, e.g. NEVO, to any number of food items.
+
+    Food item i copies template i modulo the number of templates. The first copy of every template
+    keeps its label, later copies append a variant word and the copy number, so labels stay
+    realistic and mostly distinct. The nutrient amounts of a copy are those of its template scaled
+    by a seeded log-normal factor, so health scores differ between copies. The output is the same
+    for the same templates, size and seed.
+
+    Attributes
+    ----------
+    food_item_count: int
+        The number of food items to generate
+    seed: int
+        The seed of the nutrient amount jitter
+    """
+
+    def __init__(self, template_catalog: Catalog, food_item_count: int, seed: int = SYNTHETIC_SEED):
+        """Create a SyntheticCatalog, nothing is generated before `write`.
+
+        Parameters
+        ----------
+        template_catalog: Catalog
+            The Catalog the food items are copied from
+        food_item_count: int
+            The number of food items to generate
+        seed: int
+            The seed of the nutrient amount jitter
+        """
+        self.food_item_count = food_item_count
+        self.seed = seed
+        self.__template_labels = [food_item.label for food_item in template_catalog.food_items_by_food_item_uri.values()]
+        nutrient_matrix = template_catalog.nutrient_matrix
+        self.__nutrient_matrix = nutrient_matrix
+        self.__template_rows = [nutrient_matrix.row_by_food_item_uri.get(food_item_uri, -1)
+                                for food_item_uri in template_catalog.food_items_by_food_item_uri]
+
+    def get_label(self, index: int) -> str:
+        """Get the label of a synthetic food item.
+
+        Parameters
+        ----------
+        index: int
+            The index of the food item
+
+        Returns
+        -------
+        str
+            The label of its template, followed by a variant word and the copy number for all but the first copy
+        """
+        copy_number, template_index = divmod(index, len(self.__template_labels))
+        if copy_number == 0:
+            return self.__template_labels[template_index]
+        return '{} {} {}'.format(self.__template_labels[template_index],
+                                 VARIANT_WORDS[(copy_number - 1) % len(VARIANT_WORDS)], copy_number)
+
+    def write(self, data_dir_path: str) -> list[str]:
+        """Write the synthetic food items as JSON sources, in the format of the NEVO files.
+
+        The labels are split into shards of FOOD_ITEMS_PER_LABELS_FILE food items and the
+        nutrient file is written one food item at a time, so memory does not grow with the size.
+
+        Parameters
+        ----------
+        data_dir_path: str
+            The directory the sources are written to, e.g. the data directory of a benchmark run
+
+        Returns
+        -------
+        list[str]
+            The paths of the written files
+        """
+        os.makedirs(data_dir_path, exist_ok=True)
+        data_file_paths = []
+        for start in range(0, self.food_item_count, FOOD_ITEMS_PER_LABELS_FILE):
+            end = min(start + FOOD_ITEMS_PER_LABELS_FILE, self.food_item_count)
+            data_file_path = os.path.join(data_dir_path, FOOD_ITEM_LABELS_FILE_NAME.format(start, end - 1))
+            with open(data_file_path, FILE_MODE_WRITE) as data_file:
+                json.dump({KEY_DATA: [{KEY_PREFLABELS: [{KEY_LABEL: self.get_label(index), KEY_LANGUAGE: LANGUAGE_EN}],
+                                       KEY_URI: SYNTHETIC_FOOD_ITEM_URI.format(index)} for index in range(start, end)]},
+                          data_file)
+            data_file_paths.append(data_file_path)
+
+        data_file_path = os.path.join(data_dir_path, NUTRIENT_AMOUNTS_FILE_NAME)
+        with open(data_file_path, FILE_MODE_WRITE) as data_file:
+            data_file.write('{{"{}": [{{"{}": ['.format(KEY_DATA, KEY_FOODITEMS_WITH_NUTRIENTS))
+            for position, food_item_with_nutrients in enumerate(self.__generate_food_items_with_nutrients()):
+                data_file.write((', ' if position else '') + json.dumps(food_item_with_nutrients))
+            data_file.write(']}]}')
+        data_file_paths.append(data_file_path)
+        return data_file_paths
+
+    def __generate_food_items_with_nutrients(self) -> Iterator[dict[str, Any]]:
+        """Generate the nutrient amounts of the synthetic food items whose template has any.
+
+        Returns
+        -------
+        Iterator[dict[str, Any]]
+            The food items with their nutrient amounts, in the format of the NEVO nutrient file
+        """
+        nutrient_matrix = self.__nutrient_matrix
+        random_generator = np.random.default_rng(self.seed)
+        for index in range(self.food_item_count):
+            template_row = self.__template_rows[index % len(self.__template_rows)]
+            if template_row < 0:
+                continue
+            food_item_uri = SYNTHETIC_FOOD_ITEM_URI.format(index)
+            columns = np.flatnonzero(nutrient_matrix.present[template_row])
+            values = nutrient_matrix.values[template_row, columns]
+            if index >= len(self.__template_rows):
+                values = values * random_generator.lognormal(0.0, NUTRIENT_AMOUNT_JITTER, len(columns))
+            yield {KEY_FOODITEM_URI: food_item_uri,
+                   KEY_NUTRIENTS: [{KEY_FOODITEM_URI: food_item_uri,
+                                    KEY_URI: nutrient_matrix.nutrient_uris[column],
+                                    KEY_LABEL_EN: nutrient_matrix.nutrient_labels[column],
+                                    KEY_UNIT: nutrient_matrix.units[column],
+                                    KEY_VALUE: round(float(value), 3)} for column, value in zip(columns, values)]}
@@ -0,0 +1,14 @@
+# Pre-forking deployment: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+from services.preload_service import prepare_for_fork
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# import app.py once in the master, so the catalog, the model and the embeddings are built once
+# and shared by all workers instead of being rebuilt by every worker
+preload_app = True
+
+
+def pre_fork(server, worker):
+    prepare_for_fork()
@@ -0,0 +1,49 @@
+from types import MappingProxyType
+from typing import Mapping
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+
+class Catalog:
+    """Represents an immutable snapshot of the food items and their nutrient amounts.
+
+    A Catalog is never modified after creation. Reloading the data creates a new Catalog,
+    so holders of a snapshot keep a consistent view for as long as they use it.
+
+    Attributes
+    ----------
+    version: str
+        A fingerprint of the data the snapshot was loaded from.
+    food_items_by_food_item_uri: Mapping[str, FoodItem]
+        The food items by URI, see https://nl.wikipedia.org/wiki/Uniform_resource_identifier
+    nutrient_matrix: NutrientMatrix
+        The nutrient amounts of all food items.
+    sorted_food_item_uris: tuple[str, ...]
+        The food item URIs in sorted order, the index pages of the food item listing are cut from
+    sorted_nutrient_food_item_uris: tuple[str, ...]
+        The URIs of the food items with nutrient amounts in sorted order
+    """
+    version: str
+    food_items_by_food_item_uri: Mapping[str, FoodItem]
+    nutrient_matrix: NutrientMatrix
+    sorted_food_item_uris: tuple[str, ...]
+    sorted_nutrient_food_item_uris: tuple[str, ...]
+
+    def __init__(self, version: str, food_items_by_food_item_uri: dict[str, FoodItem],
+                 nutrient_matrix: NutrientMatrix):
+        """Create a Catalog.
+
+        Parameters
+        ----------
+        version: str
+            A fingerprint of the data the snapshot was loaded from.
+        food_items_by_food_item_uri: dict[str, FoodItem]
+            The food items by URI.
+        nutrient_matrix: NutrientMatrix
+            The nutrient amounts of all food items.
+        """
+        self.version = version
+        self.food_items_by_food_item_uri = MappingProxyType(food_items_by_food_item_uri)
+        self.nutrient_matrix = nutrient_matrix
+        # sorted once per snapshot, so listing requests only slice
+        self.sorted_food_item_uris = tuple(sorted(food_items_by_food_item_uri))
+        self.sorted_nutrient_food_item_uris = tuple(sorted(nutrient_matrix.food_item_uris))
@@ -0,0 +1,71 @@
+from typing import Any, Optional
+from models.food_item import FoodItem
+import numpy as np
+
+class CatalogUpdate:
+    """Represents a set of changes to the food items of a Catalog.
+
+    Attributes
+    ----------
+    upserted_food_items: list[FoodItem]
+        The food items to add, or to update when their URI is already in the Catalog.
+    nutrient_amounts_by_food_item_uri: dict[str, list[dict[str, Any]]]
+        The raw nutrient amounts (uri, label_en, unit, value) that replace those of a food item,
+        food items without an entry keep their nutrient amounts.
+    removed_food_item_uris: list[str]
+        The URIs of the food items to remove.
+    """
+    upserted_food_items: list[FoodItem]
+    nutrient_amounts_by_food_item_uri: dict[str, list[dict[str, Any]]]
+    removed_food_item_uris: list[str]
+
+    def __init__(self, upserted_food_items: list[FoodItem],
+                 nutrient_amounts_by_food_item_uri: Optional[dict[str, list[dict[str, Any]]]] = None,
+                 removed_food_item_uris: Optional[list[str]] = None):
+        """Create a CatalogUpdate.
+
+        Parameters
+        ----------
+        upserted_food_items: list[FoodItem]
+            The food items to add or update.
+        nutrient_amounts_by_food_item_uri: Optional[dict[str, list[dict[str, Any]]]]
+            The raw nutrient amounts that replace those of a food item.
+        removed_food_item_uris: Optional[list[str]]
+            The URIs of the food items to remove.
+        """
+        self.upserted_food_items = upserted_food_items
+        self.nutrient_amounts_by_food_item_uri = nutrient_amounts_by_food_item_uri or {}
+        self.removed_food_item_uris = removed_food_item_uris or []
+
+    def serialize(self) -> dict[str, Any]:
+        """Serialize the CatalogUpdate to a dictionary, e.g. to fingerprint it.
+
+        Returns
+        ----------
+        dict[str, Any]
+            The serialized CatalogUpdate
+        """
+        return {'upserted_food_items': [{**food_item.serialize(), 'labels': list(food_item.labels)}
+                                        for food_item in self.upserted_food_items],
+                'nutrient_amounts_by_food_item_uri': self.nutrient_amounts_by_food_item_uri,
+                'removed_food_item_uris': self.removed_food_item_uris}
+
+
+def get_kept_rows(previous_row_by_uri: dict[str, int], uris: list[str], changed_uris: set[str]) -> np.ndarray:
+    """Map the rows of an updated list of URIs to the rows of the previous list they can be reused from.
+
+    Parameters
+    ----------
+    previous_row_by_uri: dict[str, int]
+        The row of every URI in the previous list
+    uris: list[str]
+        The updated list of URIs
+    changed_uris: set[str]
+        The URIs whose data changed
+
+    Returns
+    -------
+    np.ndarray
+        The previous row of every updated row, -1 for rows that are new or changed
+    """
+    return np.array([-1 if uri in changed_uris else previous_row_by_uri.get(uri, -1) for uri in uris], dtype=np.int64)
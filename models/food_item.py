@@ -1,19 +1,26 @@
-from typing import Any
+from typing import Any, Optional
 
 class FoodItem:
     """Represents a FoodItem as found in the ontology.
 
+    FoodItems are slotted, a catalog holds one per food item and services hand out those same
+    objects instead of creating new ones per result.
+
     Attributes
     ----------
     uri: str
         A Uniform Resource Identifier, see https://nl.wikipedia.org/wiki/Uniform_resource_identifier
     label: str
         A common name for the FoodItem.
+    labels: tuple[str, ...]
+        All preferred labels of the FoodItem, e.g. in other languages, starting with label.
     """
+    __slots__ = ('uri', 'label', 'labels')
     uri: str
     label: str
+    labels: tuple[str, ...]
 
-    def __init__(self, uri: str, label: str):
+    def __init__(self, uri: str, label: str, labels: Optional[tuple[str, ...]] = None):
         """Create a FoodItem.
         
         Parameters
@@ -22,9 +29,12 @@ class FoodItem:
             A Uniform Resource Identifier, see https://nl.wikipedia.org/wiki/Uniform_resource_identifier
         label: str
             A common name for the FoodItem.
+        labels: Optional[tuple[str, ...]]
+            The other preferred labels, with or without label, in order of preference.
         """
         self.uri = uri
         self.label = label
+        self.labels = tuple(dict.fromkeys((label,) + tuple(labels or ())))
 
     def serialize(self) -> dict[str, Any]:
         """Serialize the FoodItem to a dictionary mapping the attributes -> value
@@ -34,4 +44,4 @@ class FoodItem:
         dict[str, Any]
             The serialized FoodItem
         """
-        return self.__dict__
+        return {'uri': self.uri, 'label': self.label}
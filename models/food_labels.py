@@ -0,0 +1,99 @@
+from models.food_item import FoodItem
+import numpy as np
+
+class FoodLabels:
+    """Represents every preferred label of a list of food items, one row per label.
+
+    The first label of every food item comes first, in food item order, so row i is the label of
+    food item i; the other labels follow, grouped by food item. A similarity search over the rows
+    is grouped per food item by its most similar label (max-sim).
+
+    Attributes
+    ----------
+    labels: list[str]
+        The label of every row
+    food_item_indexes: np.ndarray
+        The index of the food item of every row
+    other_label_offsets: np.ndarray
+        The other labels of food item i are on rows len(food_items) + other_label_offsets[i] up to
+        len(food_items) + other_label_offsets[i + 1]
+    max_label_count: int
+        The largest number of labels of one food item
+    """
+    labels: list[str]
+    food_item_indexes: np.ndarray
+    other_label_offsets: np.ndarray
+    max_label_count: int
+
+    def __init__(self, food_items: list[FoodItem]):
+        """Create the FoodLabels of a list of food items.
+
+        Parameters
+        ----------
+        food_items: list[FoodItem]
+            The food items, in the order their indexes refer to
+        """
+        other_label_counts = np.array([len(food_item.labels) - 1 for food_item in food_items], dtype=np.int64)
+        self.labels = [food_item.label for food_item in food_items] \
+            + [other_label for food_item in food_items for other_label in food_item.labels[1:]]
+        self.food_item_indexes = np.concatenate([np.arange(len(food_items), dtype=np.int64),
+                                                 np.repeat(np.arange(len(food_items), dtype=np.int64), other_label_counts)])
+        self.other_label_offsets = np.concatenate([[0], np.cumsum(other_label_counts)]).astype(np.int64)
+        self.max_label_count = 1 + int(other_label_counts.max(initial=0))
+
+    def get_rows(self, food_item_indexes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Get the rows of every label of some food items.
+
+        Parameters
+        ----------
+        food_item_indexes: np.ndarray
+            The food item indexes
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The rows, and the position in food_item_indexes of the food item of every row
+        """
+        food_item_indexes = np.asarray(food_item_indexes, dtype=np.int64)
+        starts = self.other_label_offsets[food_item_indexes]
+        counts = self.other_label_offsets[food_item_indexes + 1] - starts
+        positions = np.repeat(np.arange(len(food_item_indexes)), counts)
+        # the rank of every other label within its food item
+        ranks = np.arange(len(positions)) - np.repeat(np.cumsum(counts) - counts, counts)
+        other_rows = len(self.other_label_offsets) - 1 + starts[positions] + ranks
+        return np.concatenate([food_item_indexes, other_rows]), np.concatenate([np.arange(len(food_item_indexes)), positions])
+
+    def group_top_k(self, scores: np.ndarray, rows: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Turn the most similar rows of every query into its most similar distinct food items.
+
+        A food item scores as its most similar label, so among the top top_k * max_label_count rows
+        of a query the first occurrence of every food item is its best row, and at least top_k
+        distinct food items occur when that many exist.
+
+        Parameters
+        ----------
+        scores: np.ndarray
+            The (queries x candidates) similarities of the candidate rows, most similar first
+        rows: np.ndarray
+            The (queries x candidates) candidate rows, -1 for padding
+        top_k: int
+            The number of food items to return per query
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The (queries x k) similarities and food item indexes, most similar first, padded with
+            -inf and -1 where a query has fewer than top_k candidate food items
+        """
+        if self.max_label_count == 1:
+            # every row is its own food item
+            return scores[:, :top_k], rows[:, :top_k]
+        top_scores = np.full((scores.shape[0], top_k), -np.inf, dtype=np.float32)
+        top_indexes = np.full((scores.shape[0], top_k), -1, dtype=np.int64)
+        for query_index in range(scores.shape[0]):
+            valid_positions = np.flatnonzero(rows[query_index] >= 0)
+            food_item_indexes = self.food_item_indexes[rows[query_index, valid_positions]]
+            first_positions = np.sort(np.unique(food_item_indexes, return_index=True)[1])[:top_k]
+            top_scores[query_index, :len(first_positions)] = scores[query_index, valid_positions[first_positions]]
+            top_indexes[query_index, :len(first_positions)] = food_item_indexes[first_positions]
+        return top_scores, top_indexes
@@ -15,6 +15,7 @@ class NutrientAmount:
         The amount of this nutrient.
     """
 
+    __slots__ = ('food_item_uri', 'nutrient_uri', 'nutrient_label', 'unit', 'value')
     food_item_uri: str # TODO: Why not FoodItem instance?
     nutrient_uri: str
     nutrient_label: str
@@ -51,4 +52,5 @@ class NutrientAmount:
         dict[str, Any]
             The serialized NutrientAmount
         """
-        return self.__dict__
+        return {'food_item_uri': self.food_item_uri, 'nutrient_uri': self.nutrient_uri,
+                'nutrient_label': self.nutrient_label, 'unit': self.unit, 'value': self.value}
@@ -0,0 +1,155 @@
+from typing import Optional
+from models.nutrient_amount import NutrientAmount
+import numpy as np
+
+class NutrientMatrix:
+    """Represents the nutrient amounts of all food items as a food item x nutrient matrix.
+
+    Missing nutrient amounts are stored as 0 and flagged in a presence mask, so weighted sums
+    need no masking. The matrix is read-only, NutrientAmount objects are only created when a
+    caller asks for them.
+
+    Attributes
+    ----------
+    food_item_uris: list[str]
+        The Food Item URI of every row.
+    nutrient_uris: list[str]
+        The Nutrient URI of every column.
+    nutrient_labels: list[str]
+        The common name of the nutrient of every column.
+    units: list[str]
+        The unit of measurement of every column, as found in https://foodvoc.org/page/om-2.
+    values: np.ndarray
+        The float64 matrix of nutrient amounts, 0 where a food item has no amount for a nutrient.
+    present: np.ndarray
+        The boolean matrix telling which nutrient amounts are given.
+    row_by_food_item_uri: dict[str, int]
+        The row index of every Food Item URI.
+    column_by_nutrient_uri: dict[str, int]
+        The column index of every Nutrient URI.
+    columns_by_nutrient_label: dict[str, list[int]]
+        The column indexes of every nutrient label, a label may be shared by several nutrients.
+    """
+    food_item_uris: list[str]
+    nutrient_uris: list[str]
+    nutrient_labels: list[str]
+    units: list[str]
+    values: np.ndarray
+    present: np.ndarray
+    row_by_food_item_uri: dict[str, int]
+    column_by_nutrient_uri: dict[str, int]
+    columns_by_nutrient_label: dict[str, list[int]]
+
+    def __init__(self, food_item_uris: list[str], nutrient_uris: list[str], nutrient_labels: list[str],
+                 units: list[str], values: np.ndarray, present: np.ndarray):
+        """Create a NutrientMatrix.
+
+        Parameters
+        ----------
+        food_item_uris: list[str]
+            The Food Item URI of every row.
+        nutrient_uris: list[str]
+            The Nutrient URI of every column.
+        nutrient_labels: list[str]
+            The common name of the nutrient of every column.
+        units: list[str]
+            The unit of measurement of every column.
+        values: np.ndarray
+            The matrix of nutrient amounts, 0 where a food item has no amount for a nutrient.
+        present: np.ndarray
+            The boolean matrix telling which nutrient amounts are given.
+        """
+        self.food_item_uris = food_item_uris
+        self.nutrient_uris = nutrient_uris
+        self.nutrient_labels = nutrient_labels
+        self.units = units
+        self.values = np.asarray(values, dtype=np.float64)
+        self.values.flags.writeable = False
+        self.present = np.asarray(present, dtype=np.bool_)
+        self.present.flags.writeable = False
+        self.row_by_food_item_uri = {food_item_uri: row for row, food_item_uri in enumerate(food_item_uris)}
+        self.column_by_nutrient_uri = {nutrient_uri: column for column, nutrient_uri in enumerate(nutrient_uris)}
+        self.columns_by_nutrient_label = {}
+        for column, nutrient_label in enumerate(nutrient_labels):
+            self.columns_by_nutrient_label.setdefault(nutrient_label, []).append(column)
+
+    def get_value(self, food_item_uri: str, nutrient_uri: str) -> Optional[float]:
+        """Get a single nutrient amount in constant time.
+
+        Parameters
+        ----------
+        food_item_uri: str
+            The Food Item URI
+        nutrient_uri: str
+            The Nutrient URI
+
+        Returns
+        -------
+        Optional[float]
+            The amount of the nutrient, None if the food item has no amount for it
+        """
+        row = self.row_by_food_item_uri.get(food_item_uri)
+        column = self.column_by_nutrient_uri.get(nutrient_uri)
+        if row is None or column is None:
+            return None
+        if not self.present[row, column]:
+            return None
+        return float(self.values[row, column])
+
+    def get_nutrient_amounts(self, food_item_uri: str) -> list[NutrientAmount]:
+        """Materialize the NutrientAmounts of a food item.
+
+        Parameters
+        ----------
+        food_item_uri: str
+            The Food Item URI
+
+        Returns
+        -------
+        list[NutrientAmount]
+            The NutrientAmounts of the food item in column order, empty if the food item is unknown
+        """
+        row = self.row_by_food_item_uri.get(food_item_uri)
+        if row is None:
+            return []
+        row_values = self.values[row]
+        return [NutrientAmount(food_item_uri=food_item_uri, nutrient_uri=self.nutrient_uris[column],
+                               nutrient_label=self.nutrient_labels[column], unit=self.units[column],
+                               value=float(row_values[column]))
+                for column in np.flatnonzero(self.present[row]).tolist()]
+
+    def get_weight_vector(self, weights_by_nutrient_label: dict[str, float]) -> np.ndarray:
+        """Spread per nutrient label weights over the matrix columns.
+
+        Parameters
+        ----------
+        weights_by_nutrient_label: dict[str, float]
+            The weight of each nutrient label, labels that are not given get weight 0. Labels the matrix does not have
+            are skipped, the default weights name nutrients some catalogs lack, custom weights are checked by
+            `services.nutrient_profiles.get_nutrient_weights`
+
+        Returns
+        -------
+        np.ndarray
+            The float64 weight of every column
+        """
+        weight_vector = np.zeros(len(self.nutrient_uris), dtype=np.float64)
+        for nutrient_label, weight in weights_by_nutrient_label.items():
+            for column in self.columns_by_nutrient_label.get(nutrient_label, []):
+                weight_vector[column] = weight
+        return weight_vector
+
+    def compute_weighted_sums(self, weight_vector: np.ndarray) -> np.ndarray:
+        """Compute the weighted sum of the nutrient amounts of every food item.
+
+        Parameters
+        ----------
+        weight_vector: np.ndarray
+            The weight of every column, see get_weight_vector
+
+        Returns
+        -------
+        np.ndarray
+            The weighted sum of every row, missing amounts count as 0
+        """
+        return self.values @ weight_vector
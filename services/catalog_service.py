@@ -0,0 +1,483 @@
+from array import array
+from typing import Any, Callable, Iterable, Optional, Union, cast
+from models.catalog import Catalog
+from models.catalog_update import CatalogUpdate
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+from services.catalog_store import CatalogStore, SourceStamps
+from services.json_stream import JsonArrayStream, JsonStreamException
+from services.constants import FILE_MODE_READ, KEY_DATA, KEY_FOODITEM_URI, KEY_FOODITEMS_WITH_NUTRIENTS, KEY_LABEL, KEY_LABEL_EN, KEY_NUTRIENTS, KEY_PREFLABELS, KEY_UNIT, KEY_URI, KEY_VALUE
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# Type hints
+PrefLabelData = dict[str, str]
+PrefLabelsData = list[PrefLabelData]
+FoodItemLabelData = dict[str, Union[str, PrefLabelsData]]
+FoodItemsLabelData = list[FoodItemLabelData]
+NutrientAmountData = list[dict[str, Union[str, float]]]
+FoodItemWithNutrientsData = dict[str, Union[str, NutrientAmountData]]
+
+# Constants
+CATALOG_RELOAD_CHECK_INTERVAL_SECONDS: float = 1.0
+FILE_MODE_READ_BINARY: str = 'rb'
+CATALOG_SOURCES_MANIFEST_FILE_PATH: str = 'data/catalog_sources.json'
+FOOD_ITEMS_DATA_FILE_PATTERN: str = 'data/food_item_labels_*.json'
+KEY_FOOD_ITEMS_DATA_FILES: str = 'food_items_data_files'
+KEY_NUTRIENT_AMOUNTS_DATA_FILE: str = 'nutrient_amounts_data_file'
+NUTRIENT_AMOUNTS_FOR_FOOD_ITEMS_DATA_FILE_PATH: str = 'data/nutrient_amounts_for_food_items.json'
+ERROR_MESSAGE_INVALID_NUTRIENT_AMOUNT: str = 'Invalid nutrient amount of food item {}.'
+
+
+class CatalogServiceException(Exception):
+    """An Exception in the Catalog service, do nothing.
+    """
+    pass
+
+
+def discover_data_file_paths() -> tuple[list[str], str]:
+    """Find the JSON sources, listed in the sources manifest if there is one, matched by pattern otherwise.
+
+    Returns
+    -------
+    tuple[list[str], str]
+        The food item label files, in the order of the numbers in their names, and the nutrient amounts file
+    """
+    if os.path.exists(CATALOG_SOURCES_MANIFEST_FILE_PATH):
+        try:
+            with open(CATALOG_SOURCES_MANIFEST_FILE_PATH, FILE_MODE_READ) as manifest_file:
+                manifest = json.load(manifest_file)
+            return list(manifest[KEY_FOOD_ITEMS_DATA_FILES]), str(manifest.get(
+                KEY_NUTRIENT_AMOUNTS_DATA_FILE, NUTRIENT_AMOUNTS_FOR_FOOD_ITEMS_DATA_FILE_PATH))
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            raise CatalogServiceException(str(error)) from error
+    food_items_data_file_paths = sorted(glob.glob(FOOD_ITEMS_DATA_FILE_PATTERN), key=lambda data_file_path: [
+        int(part) if part.isdigit() else part for part in re.split(r'(\d+)', data_file_path)])
+    return food_items_data_file_paths, NUTRIENT_AMOUNTS_FOR_FOOD_ITEMS_DATA_FILE_PATH
+
+
+class CatalogService:
+    """The Catalog Service loads the food item and nutrient json files into a shared Catalog snapshot.
+
+    The snapshot is loaded once and handed out read-only to every caller. When one of the data
+    files changes, the next call to `get_catalog` loads a new snapshot and swaps it in atomically.
+    Callers that still hold the previous snapshot keep using it undisturbed. A compiled catalog
+    (see `services.catalog_store`) is loaded instead of the JSON sources when it is up to date.
+
+    Attributes
+    ----------
+    reload_check_interval_seconds: float
+        The minimum time between two checks of the data files for changes.
+    catalog_store: CatalogStore
+        The compiled catalog
+    load_duration_seconds: Optional[float]
+        How long the last load of the Catalog took, None before the first load
+    """
+
+    def __init__(self, reload_check_interval_seconds: float = CATALOG_RELOAD_CHECK_INTERVAL_SECONDS,
+                 catalog_store: Optional[CatalogStore] = None):
+        """Create the Catalog service, the Catalog is loaded on first use.
+
+        Parameters
+        ----------
+        reload_check_interval_seconds: float
+            The minimum time between two checks of the data files for changes.
+        catalog_store: Optional[CatalogStore]
+            The compiled catalog, defaults to the one in BINARY_CATALOG_DIR_PATH
+        """
+        self.reload_check_interval_seconds = reload_check_interval_seconds
+        self.catalog_store = catalog_store if catalog_store is not None else CatalogStore()
+        self.load_duration_seconds: Optional[float] = None
+        self.__catalog: Optional[Catalog] = None
+        self.__data_file_stamps: SourceStamps = ()
+        self.__last_checked_at: float = 0.0
+        self.__reload_lock = threading.Lock()
+        self.__reload_listeners: list[Callable[[Catalog], None]] = []
+
+    def add_reload_listener(self, reload_listener: Callable[[Catalog], None]) -> None:
+        """Call a function with the new snapshot every time the data files changed and the Catalog was reloaded.
+
+        Listeners are called on the thread that noticed the change, after the new snapshot was swapped in,
+        they are not called for the first load nor for snapshots published by `apply_update`.
+
+        Parameters
+        ----------
+        reload_listener: Callable[[Catalog], None]
+            The function to call with the reloaded Catalog
+        """
+        self.__reload_listeners.append(reload_listener)
+
+    def get_catalog(self) -> Catalog:
+        """Get the current Catalog snapshot, reloading it first if the data files changed.
+
+        Returns
+        -------
+        Catalog
+            The current Catalog snapshot
+        """
+        catalog = self.__catalog
+        if catalog is not None and time.monotonic() - self.__last_checked_at < self.reload_check_interval_seconds:
+            return catalog
+
+        # Only the first load makes callers wait, during a reload the previous snapshot is served
+        if not self.__reload_lock.acquire(blocking=catalog is None):
+            return cast(Catalog, catalog)
+        reloaded = False
+        try:
+            data_file_stamps = self.__stamp_data_files()
+            if self.__catalog is None or data_file_stamps != self.__data_file_stamps:
+                reloaded = self.__catalog is not None
+                started_at = time.perf_counter()
+                self.__catalog = self.__load_catalog()
+                self.load_duration_seconds = time.perf_counter() - started_at
+                self.__data_file_stamps = data_file_stamps
+            self.__last_checked_at = time.monotonic()
+            catalog = self.__catalog
+        finally:
+            self.__reload_lock.release()
+        if reloaded:
+            for reload_listener in self.__reload_listeners:
+                reload_listener(catalog)
+        return catalog
+
+    def apply_update(self, catalog_update: CatalogUpdate, persist: bool = False) -> Catalog:
+        """Publish a new Catalog snapshot with the changes of a CatalogUpdate applied.
+
+        The current snapshot is not modified, the new one is swapped in atomically, so readers
+        never wait for the update and always see either the previous or the new snapshot.
+        An update that is not persisted is lost when the JSON sources change or the process restarts.
+
+        Parameters
+        ----------
+        catalog_update: CatalogUpdate
+            The food items to add, update or remove
+        persist: bool
+            Whether to also write the new snapshot to the compiled catalog
+
+        Returns
+        -------
+        Catalog
+            The new Catalog snapshot
+        """
+        catalog = self.get_catalog()
+        with self.__reload_lock:
+            catalog = self.__catalog if self.__catalog is not None else catalog
+            food_items_by_food_item_uri = dict(catalog.food_items_by_food_item_uri)
+            for food_item_uri in catalog_update.removed_food_item_uris:
+                food_items_by_food_item_uri.pop(food_item_uri, None)
+            for food_item in catalog_update.upserted_food_items:
+                food_items_by_food_item_uri[food_item.uri] = food_item
+            version_hash = hashlib.sha1(catalog.version.encode('utf-8'))
+            version_hash.update(json.dumps(catalog_update.serialize(), sort_keys=True).encode('utf-8'))
+            self.__catalog = Catalog(version=version_hash.hexdigest()[:16],
+                                     food_items_by_food_item_uri=food_items_by_food_item_uri,
+                                     nutrient_matrix=self.__update_nutrient_matrix(catalog.nutrient_matrix, catalog_update))
+            if persist:
+                self.catalog_store.save(self.__catalog, self.stamp_source_files())
+                # the new manifest must not trigger a reload of the snapshot that was just published
+                self.__data_file_stamps = self.__stamp_data_files()
+            return self.__catalog
+
+    def stamp_source_files(self) -> SourceStamps:
+        """Stamp the JSON sources with their modification time and size.
+
+        Returns
+        -------
+        SourceStamps
+            The path, modification time and size of every JSON source, -1 for a missing source
+        """
+        food_items_data_file_paths, nutrient_amounts_data_file_path = discover_data_file_paths()
+        data_file_stamps = []
+        for data_file_path in food_items_data_file_paths + [nutrient_amounts_data_file_path]:
+            try:
+                data_file_stat = os.stat(data_file_path)
+                data_file_stamps.append((data_file_path, data_file_stat.st_mtime_ns, data_file_stat.st_size))
+            except OSError:
+                data_file_stamps.append((data_file_path, -1, -1))
+        return tuple(data_file_stamps)
+
+    def load_catalog_from_sources(self) -> Catalog:
+        """Load a new Catalog from the JSON sources.
+
+        Returns
+        -------
+        Catalog
+            The Catalog loaded from the JSON sources
+        """
+        food_items_data_file_paths, nutrient_amounts_data_file_path = discover_data_file_paths()
+        version_hash = hashlib.sha1()
+        food_items_label_data: FoodItemsLabelData = []
+        for food_items_data_file_path in food_items_data_file_paths:
+            data_file_content = self.__read_data_file(food_items_data_file_path)
+            version_hash.update(data_file_content)
+            food_items_label_data.extend(json.loads(data_file_content)[KEY_DATA])
+        food_items_by_food_item_uri: dict[str, FoodItem] = {str(food_item_label_data[KEY_URI]): self.__load_food_item(
+            food_item_label_data) for food_item_label_data in food_items_label_data}
+
+        # the nutrient file is streamed one food item at a time, it is hashed in the same pass
+        food_items_with_nutrients_data = JsonArrayStream(nutrient_amounts_data_file_path, KEY_FOODITEMS_WITH_NUTRIENTS, version_hash)
+        try:
+            nutrient_matrix: NutrientMatrix = self.__load_nutrient_matrix(food_items_with_nutrients_data)
+        except (OSError, JsonStreamException) as error:
+            raise CatalogServiceException(str(error)) from error
+        return Catalog(version=version_hash.hexdigest()[:16],
+                       food_items_by_food_item_uri=food_items_by_food_item_uri,
+                       nutrient_matrix=nutrient_matrix)
+
+    def __stamp_data_files(self) -> SourceStamps:
+        """Stamp the JSON sources and the manifest of the compiled catalog.
+
+        Returns
+        -------
+        SourceStamps
+            The path, modification time and size of every data file
+        """
+        data_file_stamps = list(self.stamp_source_files())
+        try:
+            manifest_stat = os.stat(self.catalog_store.manifest_file_path)
+            data_file_stamps.append((self.catalog_store.manifest_file_path, manifest_stat.st_mtime_ns, manifest_stat.st_size))
+        except OSError:
+            data_file_stamps.append((self.catalog_store.manifest_file_path, -1, -1))
+        return tuple(data_file_stamps)
+
+    def __load_catalog(self) -> Catalog:
+        """Load a new Catalog, from the compiled catalog when it is up to date, from the JSON sources otherwise.
+
+        Returns
+        -------
+        Catalog
+            The loaded Catalog
+        """
+        catalog = self.catalog_store.load(self.stamp_source_files())
+        return catalog if catalog is not None else self.load_catalog_from_sources()
+
+    def __read_data_file(self, data_file_path: str) -> bytes:
+        """Read the raw content of a data file.
+
+        Parameters
+        ----------
+        data_file_path: str
+            The path of the data file
+
+        Returns
+        -------
+        bytes
+            The content of the data file
+        """
+        try:
+            with open(data_file_path, FILE_MODE_READ_BINARY) as data_file:
+                return data_file.read()
+        except OSError as error:
+            raise CatalogServiceException(str(error)) from error
+
+    def __load_food_item(self, food_item_label_data: FoodItemLabelData) -> FoodItem:
+        """Load a FoodItem from data loaded by JSON.
+
+        Parameters
+        ----------
+        food_item_label_data: FoodItemLabelData
+            LabelData loaded from JSON
+
+        Returns
+        -------
+        FoodItem
+            The FoodItem loaded from FoodItemLabelData
+        """
+        pref_labels: PrefLabelsData = cast(
+            PrefLabelsData, food_item_label_data[KEY_PREFLABELS])
+        food_item_uri: str = str(food_item_label_data[KEY_URI])
+        # the first preferred label is the label, the others, e.g. in other languages, are kept for search
+        food_item_labels: tuple[str, ...] = tuple(str(pref_label[KEY_LABEL]) for pref_label in pref_labels)
+        food_item = FoodItem(uri=food_item_uri, label=food_item_labels[0], labels=food_item_labels)
+        return food_item
+
+    def __load_nutrient_matrix(self, food_items_with_nutrients_data: Iterable[FoodItemWithNutrientsData]) -> NutrientMatrix:
+        """Transform the raw nutrient data of all food items to a NutrientMatrix.
+
+        The raw data is consumed one food item at a time and only its (row, column, value)
+        triples are kept, in compact typed arrays.
+
+        Parameters
+        ----------
+        food_items_with_nutrients_data: Iterable[FoodItemWithNutrientsData]
+            The raw nutrient data of every food item, e.g. streamed from the nutrient file
+
+        Returns
+        -------
+        NutrientMatrix
+            The nutrient amounts of all food items
+        """
+        food_item_uris: list[str] = []
+        row_by_food_item_uri: dict[str, int] = {}
+        nutrient_uris: list[str] = []
+        nutrient_labels: list[str] = []
+        units: list[str] = []
+        column_by_nutrient_uri: dict[str, int] = {}
+        rows = array('i')
+        columns = array('i')
+        values = array('d')
+        for food_item_with_nutrients in food_items_with_nutrients_data:
+            food_item_uri: str = str(food_item_with_nutrients[KEY_FOODITEM_URI])
+            if food_item_uri not in row_by_food_item_uri:
+                row_by_food_item_uri[food_item_uri] = len(food_item_uris)
+                food_item_uris.append(food_item_uri)
+            row = row_by_food_item_uri[food_item_uri]
+            for raw_nutrient_amount in cast(NutrientAmountData, food_item_with_nutrients[KEY_NUTRIENTS]):
+                nutrient_uri: str = str(raw_nutrient_amount[KEY_URI])
+                if nutrient_uri not in column_by_nutrient_uri:
+                    column_by_nutrient_uri[nutrient_uri] = len(nutrient_uris)
+                    nutrient_uris.append(nutrient_uri)
+                    nutrient_labels.append(str(raw_nutrient_amount[KEY_LABEL_EN]))
+                    units.append(str(raw_nutrient_amount[KEY_UNIT]))
+                rows.append(row)
+                columns.append(column_by_nutrient_uri[nutrient_uri])
+                values.append(float(raw_nutrient_amount[KEY_VALUE]))
+
+        value_matrix = np.zeros((len(food_item_uris), len(nutrient_uris)), dtype=np.float64)
+        present_matrix = np.zeros((len(food_item_uris), len(nutrient_uris)), dtype=np.bool_)
+        row_indexes = np.frombuffer(rows, dtype=np.intc)
+        column_indexes = np.frombuffer(columns, dtype=np.intc)
+        value_matrix[row_indexes, column_indexes] = np.frombuffer(values, dtype=np.float64)
+        present_matrix[row_indexes, column_indexes] = True
+        return NutrientMatrix(food_item_uris=food_item_uris, nutrient_uris=nutrient_uris,
+                              nutrient_labels=nutrient_labels, units=units,
+                              values=value_matrix, present=present_matrix)
+
+    def __update_nutrient_matrix(self, nutrient_matrix: NutrientMatrix, catalog_update: CatalogUpdate) -> NutrientMatrix:
+        """Create a NutrientMatrix with the nutrient amounts of a CatalogUpdate applied.
+
+        Rows of removed food items are dropped, replaced rows keep their position and rows of
+        new food items are appended, as are columns of nutrients the matrix does not know yet.
+
+        Parameters
+        ----------
+        nutrient_matrix: NutrientMatrix
+            The current nutrient amounts
+        catalog_update: CatalogUpdate
+            The changes to apply
+
+        Returns
+        -------
+        NutrientMatrix
+            The updated nutrient amounts
+        """
+        # a food item that is removed and upserted in the same update is kept
+        removed_food_item_uris = set(catalog_update.removed_food_item_uris) - set(catalog_update.nutrient_amounts_by_food_item_uri) \
+            - {food_item.uri for food_item in catalog_update.upserted_food_items}
+        food_item_uris = [food_item_uri for food_item_uri in nutrient_matrix.food_item_uris if food_item_uri not in removed_food_item_uris]
+        food_item_uris += [food_item_uri for food_item_uri in catalog_update.nutrient_amounts_by_food_item_uri
+                           if food_item_uri not in nutrient_matrix.row_by_food_item_uri]
+        nutrient_uris = list(nutrient_matrix.nutrient_uris)
+        nutrient_labels = list(nutrient_matrix.nutrient_labels)
+        units = list(nutrient_matrix.units)
+        column_by_nutrient_uri = dict(nutrient_matrix.column_by_nutrient_uri)
+        for food_item_uri, raw_nutrient_amounts in catalog_update.nutrient_amounts_by_food_item_uri.items():
+            for raw_nutrient_amount in raw_nutrient_amounts:
+                try:
+                    nutrient_uri: str = str(raw_nutrient_amount[KEY_URI])
+                    float(raw_nutrient_amount[KEY_VALUE])
+                    if nutrient_uri not in column_by_nutrient_uri:
+                        column_by_nutrient_uri[nutrient_uri] = len(nutrient_uris)
+                        nutrient_uris.append(nutrient_uri)
+                        nutrient_labels.append(str(raw_nutrient_amount[KEY_LABEL_EN]))
+                        units.append(str(raw_nutrient_amount[KEY_UNIT]))
+                except (KeyError, TypeError, ValueError) as error:
+                    raise CatalogServiceException(ERROR_MESSAGE_INVALID_NUTRIENT_AMOUNT.format(food_item_uri)) from error
+
+        kept_rows = np.array([-1 if food_item_uri in catalog_update.nutrient_amounts_by_food_item_uri
+                              else nutrient_matrix.row_by_food_item_uri[food_item_uri] for food_item_uri in food_item_uris], dtype=np.int64)
+        kept = kept_rows >= 0
+        value_matrix = np.zeros((len(food_item_uris), len(nutrient_uris)), dtype=np.float64)
+        present_matrix = np.zeros((len(food_item_uris), len(nutrient_uris)), dtype=np.bool_)
+        value_matrix[kept, :len(nutrient_matrix.nutrient_uris)] = nutrient_matrix.values[kept_rows[kept]]
+        present_matrix[kept, :len(nutrient_matrix.nutrient_uris)] = nutrient_matrix.present[kept_rows[kept]]
+        for row in np.flatnonzero(~kept):
+            for raw_nutrient_amount in catalog_update.nutrient_amounts_by_food_item_uri[food_item_uris[row]]:
+                column = column_by_nutrient_uri[str(raw_nutrient_amount[KEY_URI])]
+                value_matrix[row, column] = float(raw_nutrient_amount[KEY_VALUE])
+                present_matrix[row, column] = True
+        return NutrientMatrix(food_item_uris=food_item_uris, nutrient_uris=nutrient_uris,
+                              nutrient_labels=nutrient_labels, units=units,
+                              values=value_matrix, present=present_matrix)
+
+def get_catalog_diff(previous_catalog: Catalog, catalog: Catalog) -> CatalogUpdate:
+    """Describe the changes between two Catalog snapshots as a CatalogUpdate, e.g. after a reload.
+
+    Food items are upserted when they are new or their labels changed, nutrient amounts are given
+    for every food item whose amounts, or the labels and units of its nutrients, changed.
+
+    Parameters
+    ----------
+    previous_catalog: Catalog
+        The Catalog snapshot before the changes
+    catalog: Catalog
+        The Catalog snapshot after the changes
+
+    Returns
+    -------
+    CatalogUpdate
+        The update that turns the previous snapshot into the new one
+    """
+    previous_food_items_by_food_item_uri = previous_catalog.food_items_by_food_item_uri
+    upserted_food_items = [food_item for food_item_uri, food_item in catalog.food_items_by_food_item_uri.items()
+                           if food_item_uri not in previous_food_items_by_food_item_uri
+                           or previous_food_items_by_food_item_uri[food_item_uri].labels != food_item.labels]
+
+    previous_nutrient_matrix = previous_catalog.nutrient_matrix
+    nutrient_matrix = catalog.nutrient_matrix
+    nutrient_amounts_by_food_item_uri: dict[str, list[dict[str, Any]]] = {}
+    for food_item_uri in dict.fromkeys(nutrient_matrix.food_item_uris + previous_nutrient_matrix.food_item_uris):
+        if food_item_uri not in nutrient_matrix.row_by_food_item_uri and food_item_uri not in catalog.food_items_by_food_item_uri:
+            continue
+        raw_nutrient_amounts = [{KEY_URI: nutrient_amount.nutrient_uri, KEY_LABEL_EN: nutrient_amount.nutrient_label,
+                                 KEY_UNIT: nutrient_amount.unit, KEY_VALUE: nutrient_amount.value}
+                                for nutrient_amount in nutrient_matrix.get_nutrient_amounts(food_item_uri)]
+        # the column order may differ between two loads, the amounts are compared per nutrient
+        previous_nutrient_amounts = {(nutrient_amount.nutrient_uri, nutrient_amount.nutrient_label, nutrient_amount.unit, nutrient_amount.value)
+                                     for nutrient_amount in previous_nutrient_matrix.get_nutrient_amounts(food_item_uri)}
+        if {tuple(raw_nutrient_amount.values()) for raw_nutrient_amount in raw_nutrient_amounts} != previous_nutrient_amounts:
+            nutrient_amounts_by_food_item_uri[food_item_uri] = raw_nutrient_amounts
+
+    removed_food_item_uris = [food_item_uri for food_item_uri in dict.fromkeys(
+        list(previous_food_items_by_food_item_uri) + previous_nutrient_matrix.food_item_uris)
+        if food_item_uri not in catalog.food_items_by_food_item_uri and food_item_uri not in nutrient_matrix.row_by_food_item_uri]
+    return CatalogUpdate(upserted_food_items, nutrient_amounts_by_food_item_uri, removed_food_item_uris)
+
+
+catalog_service = CatalogService() # process-wide, every service reads from the same snapshot
+
+
+def get_catalog() -> Catalog:
+    """Get the current process-wide Catalog snapshot.
+
+    Returns
+    -------
+    Catalog
+        The current Catalog snapshot
+    """
+    return catalog_service.get_catalog()
+
+
+def update_catalog(catalog_update: CatalogUpdate, persist: bool = False) -> Catalog:
+    """Apply a CatalogUpdate to the process-wide Catalog.
+
+    Parameters
+    ----------
+    catalog_update: CatalogUpdate
+        The food items to add, update or remove
+    persist: bool
+        Whether to also write the new snapshot to the compiled catalog
+
+    Returns
+    -------
+    Catalog
+        The new Catalog snapshot
+    """
+    return catalog_service.apply_update(catalog_update, persist)
@@ -0,0 +1,182 @@
+from typing import Optional
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+from services.constants import BINARY_CATALOG_DIR_PATH, FILE_MODE_READ
+import json
+import os
+import uuid
+
+import numpy as np
+
+# Type hints
+SourceStamps = tuple[tuple[str, int, int], ...]
+
+# Constants
+CATALOG_STORE_FORMAT_VERSION: int = 2
+FILE_MODE_WRITE: str = 'w'
+KEY_FILES: str = 'files'
+KEY_FORMAT_VERSION: str = 'format_version'
+KEY_OTHER_LABEL_COUNTS_FILE: str = 'other_label_counts_file'
+KEY_PRESENT_FILE: str = 'present_file'
+KEY_SOURCE_STAMPS: str = 'source_stamps'
+KEY_STRING_OFFSETS_FILE: str = 'string_offsets_file'
+KEY_STRINGS_FILE: str = 'strings_file'
+KEY_TABLE_SIZES: str = 'table_sizes'
+KEY_VALUES_FILE: str = 'values_file'
+KEY_VERSION: str = 'version'
+MANIFEST_FILE_NAME: str = 'manifest.json'
+STRING_TABLES: list[str] = ['food_item_uris', 'food_item_labels', 'nutrient_uris', 'nutrient_labels', 'units', 'food_item_other_labels']
+
+
+class CatalogStore:
+    """The CatalogStore keeps a compiled, memory-mappable copy of the Catalog on disk.
+
+    All strings (URIs, labels and units) are stored in one UTF-8 blob with an offset table, the
+    nutrient amounts as the value and presence matrices. The other preferred labels of the food
+    items follow each other in one table, with the number of them per food item. A manifest records the version of the
+    Catalog and the stamps of the JSON sources it was compiled from, and points at the current
+    generation of files, so a new build is published atomically by replacing the manifest.
+
+    Attributes
+    ----------
+    store_dir_path: str
+        The directory holding the compiled catalog
+    """
+
+    def __init__(self, store_dir_path: str = BINARY_CATALOG_DIR_PATH):
+        """Create a CatalogStore.
+
+        Parameters
+        ----------
+        store_dir_path: str
+            The directory holding the compiled catalog
+        """
+        self.store_dir_path = store_dir_path
+        self.manifest_file_path = os.path.join(store_dir_path, MANIFEST_FILE_NAME)
+
+    def load(self, source_stamps: SourceStamps) -> Optional[Catalog]:
+        """Load the compiled Catalog, if it was compiled from the current JSON sources.
+
+        Parameters
+        ----------
+        source_stamps: SourceStamps
+            The path, modification time and size of the JSON sources, missing sources are stamped -1
+
+        Returns
+        -------
+        Optional[Catalog]
+            The Catalog, None if nothing usable is stored or the sources changed since the build
+        """
+        try:
+            with open(self.manifest_file_path, FILE_MODE_READ) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get(KEY_FORMAT_VERSION) != CATALOG_STORE_FORMAT_VERSION:
+                return None
+            # a deployment may ship the compiled catalog without its sources
+            sources_missing = all(modified_at == -1 for _, modified_at, _ in source_stamps)
+            if not sources_missing and tuple(tuple(stamp) for stamp in manifest[KEY_SOURCE_STAMPS]) != source_stamps:
+                return None
+            files = manifest[KEY_FILES]
+            strings = np.load(os.path.join(self.store_dir_path, files[KEY_STRINGS_FILE]), mmap_mode='r')
+            string_offsets = np.load(os.path.join(self.store_dir_path, files[KEY_STRING_OFFSETS_FILE])).tolist()
+            values = np.load(os.path.join(self.store_dir_path, files[KEY_VALUES_FILE]), mmap_mode='r')
+            present = np.load(os.path.join(self.store_dir_path, files[KEY_PRESENT_FILE]), mmap_mode='r')
+            other_label_counts = np.load(os.path.join(self.store_dir_path, files[KEY_OTHER_LABEL_COUNTS_FILE])).tolist()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        blob = strings.tobytes()
+        string_tables: dict[str, list[str]] = {}
+        start = 0
+        for table_name, table_size in zip(STRING_TABLES, manifest[KEY_TABLE_SIZES]):
+            string_tables[table_name] = [blob[string_offsets[index]:string_offsets[index + 1]].decode('utf-8')
+                                         for index in range(start, start + table_size)]
+            start += table_size
+        other_labels = string_tables['food_item_other_labels']
+        other_label_offsets = np.concatenate([[0], np.cumsum(other_label_counts, dtype=np.int64)]).tolist()
+        food_items_by_food_item_uri = {food_item_uri: FoodItem(uri=food_item_uri, label=food_item_label, labels=tuple(
+            other_labels[other_label_offsets[index]:other_label_offsets[index + 1]]))
+            for index, (food_item_uri, food_item_label) in enumerate(zip(string_tables['food_item_uris'], string_tables['food_item_labels']))}
+        nutrient_matrix = NutrientMatrix(food_item_uris=string_tables['food_item_uris'][len(food_items_by_food_item_uri):],
+                                         nutrient_uris=string_tables['nutrient_uris'],
+                                         nutrient_labels=string_tables['nutrient_labels'],
+                                         units=string_tables['units'], values=values, present=present)
+        return Catalog(version=manifest[KEY_VERSION], food_items_by_food_item_uri=food_items_by_food_item_uri,
+                       nutrient_matrix=nutrient_matrix)
+
+    def save(self, catalog: Catalog, source_stamps: SourceStamps) -> None:
+        """Compile a Catalog and publish it.
+
+        Parameters
+        ----------
+        catalog: Catalog
+            The Catalog loaded from the JSON sources
+        source_stamps: SourceStamps
+            The stamps of the JSON sources the Catalog was loaded from
+        """
+        food_items = list(catalog.food_items_by_food_item_uri.values())
+        nutrient_matrix = catalog.nutrient_matrix
+        # the food item uris table holds the catalog items followed by the rows of the nutrient matrix
+        string_tables = [[food_item.uri for food_item in food_items] + list(nutrient_matrix.food_item_uris),
+                         [food_item.label for food_item in food_items],
+                         list(nutrient_matrix.nutrient_uris),
+                         list(nutrient_matrix.nutrient_labels),
+                         list(nutrient_matrix.units),
+                         [other_label for food_item in food_items for other_label in food_item.labels[1:]]]
+        encoded_strings = [string.encode('utf-8') for string_table in string_tables for string in string_table]
+        string_offsets = np.zeros(len(encoded_strings) + 1, dtype=np.int64)
+        string_offsets[1:] = np.cumsum([len(encoded_string) for encoded_string in encoded_strings])
+
+        os.makedirs(self.store_dir_path, exist_ok=True)
+        previous_file_names: list[str] = []
+        try:
+            with open(self.manifest_file_path, FILE_MODE_READ) as manifest_file:
+                previous_file_names = list(json.load(manifest_file)[KEY_FILES].values())
+        except (OSError, ValueError, KeyError):
+            pass
+
+        generation = uuid.uuid4().hex
+        files = {KEY_STRINGS_FILE: 'strings-{}.npy'.format(generation),
+                 KEY_STRING_OFFSETS_FILE: 'string_offsets-{}.npy'.format(generation),
+                 KEY_VALUES_FILE: 'values-{}.npy'.format(generation),
+                 KEY_PRESENT_FILE: 'present-{}.npy'.format(generation),
+                 KEY_OTHER_LABEL_COUNTS_FILE: 'other_label_counts-{}.npy'.format(generation)}
+        np.save(os.path.join(self.store_dir_path, files[KEY_STRINGS_FILE]), np.frombuffer(b''.join(encoded_strings), dtype=np.uint8))
+        np.save(os.path.join(self.store_dir_path, files[KEY_STRING_OFFSETS_FILE]), string_offsets)
+        np.save(os.path.join(self.store_dir_path, files[KEY_VALUES_FILE]), np.asarray(nutrient_matrix.values, dtype=np.float64))
+        np.save(os.path.join(self.store_dir_path, files[KEY_PRESENT_FILE]), np.asarray(nutrient_matrix.present, dtype=np.bool_))
+        np.save(os.path.join(self.store_dir_path, files[KEY_OTHER_LABEL_COUNTS_FILE]),
+                np.array([len(food_item.labels) - 1 for food_item in food_items], dtype=np.int32))
+        manifest = {KEY_FORMAT_VERSION: CATALOG_STORE_FORMAT_VERSION,
+                    KEY_VERSION: catalog.version,
+                    KEY_SOURCE_STAMPS: [list(stamp) for stamp in source_stamps],
+                    KEY_TABLE_SIZES: [len(string_table) for string_table in string_tables],
+                    KEY_FILES: files}
+        temporary_manifest_file_path = '{}.{}'.format(self.manifest_file_path, generation)
+        with open(temporary_manifest_file_path, FILE_MODE_WRITE) as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_manifest_file_path, self.manifest_file_path)
+
+        # Readers holding a memory map of the previous generation keep working after the unlink
+        for previous_file_name in previous_file_names:
+            try:
+                os.remove(os.path.join(self.store_dir_path, previous_file_name))
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    # Compile the JSON sources into the binary catalog: python -m services.catalog_store
+    import time
+    from services.catalog_service import CatalogService
+
+    started_at = time.perf_counter()
+    source_catalog_service = CatalogService()
+    source_stamps = source_catalog_service.stamp_source_files()
+    source_catalog = source_catalog_service.load_catalog_from_sources()
+    catalog_store = CatalogStore()
+    catalog_store.save(source_catalog, source_stamps)
+    print('compiled catalog {} with {} food items in {:.3f}s to {}'.format(
+        source_catalog.version, len(source_catalog.food_items_by_food_item_uri),
+        time.perf_counter() - started_at, catalog_store.store_dir_path))
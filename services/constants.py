@@ -1,3 +1,5 @@
+import os
+
 FILE_MODE_READ: str = 'r'
 KEY_DATA: str = 'data'
 KEY_FOODITEM_URI: str = 'food_item_uri'
@@ -8,4 +10,28 @@ KEY_NUTRIENTS: str = 'nutrients'
 KEY_PREFLABELS: str = 'pref_labels'
 KEY_UNIT: str = 'unit'
 KEY_URI: str = 'uri'
-KEY_VALUE: str = 'value'
\ No newline at end of file
+KEY_VALUE: str = 'value'
+
+EMBEDDER_MODEL_NAME: str = 'Linus4Lyf/test-food'
+EMBEDDER_MODEL_REVISION: str = 'main'
+EMBEDDER_BACKEND: str = os.environ.get('EMBEDDER_BACKEND', 'torch') # 'torch', 'torch-int8', 'onnx', 'onnx-int8' or 'stub' (deterministic, for offline benchmarks)
+
+SIMILARITY_INDEX_BACKEND: str = os.environ.get('SIMILARITY_INDEX_BACKEND', 'exact') # 'exact', 'ivf' or 'quantized'
+EMBEDDING_PRECISION: str = os.environ.get('EMBEDDING_PRECISION', 'int8') # precision the 'quantized' backend scans: 'float32', 'float16' or 'int8'
+EMBEDDING_PCA_DIMENSION: int = int(os.environ.get('EMBEDDING_PCA_DIMENSION', 0)) # principal directions the 'quantized' backend scans, 0 keeps every dimension
+USE_NEIGHBOR_TABLE: bool = os.environ.get('USE_NEIGHBOR_TABLE', '1') == '1'
+NEIGHBOR_TABLE_TOP_K: int = int(os.environ.get('NEIGHBOR_TABLE_TOP_K', 256)) # neighbours kept per food item, enough that 10 of them are healthier for most food items
+QUERY_EMBEDDING_CACHE_SIZE: int = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 10000))
+QUERY_RESULT_CACHE_SIZE: int = int(os.environ.get('QUERY_RESULT_CACHE_SIZE', 10000))
+QUERY_CACHE_PATH: str = os.environ.get('QUERY_CACHE_PATH', '') # e.g. data/cache/query_embeddings.sqlite, '' disables the shared tier
+EMBEDDER_MAX_BATCH_SIZE: int = int(os.environ.get('EMBEDDER_MAX_BATCH_SIZE', 32))
+EMBEDDER_MAX_WAIT_MS: float = float(os.environ.get('EMBEDDER_MAX_WAIT_MS', 2.0))
+WARMUP_WAIT_TIMEOUT_SECONDS: float = float(os.environ.get('WARMUP_WAIT_TIMEOUT_SECONDS', 10.0)) # how long model-backed requests wait for warmup before a 503
+RESPONSE_CACHE_SIZE: int = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000)) # rendered responses kept per catalog version, 0 disables the cache
+RESPONSE_CACHE_MAX_AGE_SECONDS: int = int(os.environ.get('RESPONSE_CACHE_MAX_AGE_SECONDS', 300))
+BINARY_CATALOG_DIR_PATH: str = os.environ.get('BINARY_CATALOG_DIR_PATH', 'data/catalog') # compiled by python -m services.catalog_store
+ADMIN_API_TOKEN: str = os.environ.get('ADMIN_API_TOKEN', '') # bearer token of the /admin endpoints, '' disables them
+NUTRIENT_PROFILE_CACHE_SIZE: int = int(os.environ.get('NUTRIENT_PROFILE_CACHE_SIZE', 64)) # health score vectors kept per recommender, one per profile or custom weights
+SEARCH_MODE: str = os.environ.get('SEARCH_MODE', 'semantic') # default of /search: 'semantic' or 'hybrid'
+METRICS_ENABLED: bool = os.environ.get('METRICS_ENABLED', '1') == '1' # per-stage latency histograms, /metrics and the Server-Timing header
+NUTRIENT_FRAGMENT_CACHE_SIZE: int = int(os.environ.get('NUTRIENT_FRAGMENT_CACHE_SIZE', 10000)) # encoded nutrient amount blocks of /detail kept per catalog version
@@ -0,0 +1,217 @@
+from concurrent.futures import Future
+from typing import Any, Optional, Union
+from services.constants import EMBEDDER_BACKEND, EMBEDDER_MAX_BATCH_SIZE, EMBEDDER_MAX_WAIT_MS, EMBEDDER_MODEL_NAME, EMBEDDER_MODEL_REVISION
+from services.inference_backend import INFERENCE_BACKEND_TORCH, load_embedder_model
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Constants
+BATCH_SIZE_HISTOGRAM_BUCKETS: list[int] = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class BatchingEmbedder:
+    """The BatchingEmbedder schedules single-text encode calls of concurrent requests into batches.
+
+    Callers block until their embedding is ready. A scheduler thread collects pending texts until
+    max_batch_size texts are waiting or the oldest one waited max_wait_ms, then runs one batched
+    encode and routes every embedding back to its caller. Lists of texts are already batched and
+    are encoded directly.
+
+    Attributes
+    ----------
+    embedder: Any
+        The wrapped model, it must provide `encode(texts, convert_to_numpy=True)`
+    max_batch_size: int
+        The maximum number of texts per batched encode
+    max_wait_ms: float
+        The maximum time a text waits for other texts to join its batch
+    """
+
+    def __init__(self, embedder: Any, max_batch_size: int = EMBEDDER_MAX_BATCH_SIZE, max_wait_ms: float = EMBEDDER_MAX_WAIT_MS):
+        """Create a BatchingEmbedder, its scheduler thread is started on first use.
+
+        Parameters
+        ----------
+        embedder: Any
+            The model to wrap
+        max_batch_size: int
+            The maximum number of texts per batched encode
+        max_wait_ms: float
+            The maximum time a text waits for other texts to join its batch
+        """
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.__pending: queue.Queue = queue.Queue()
+        self.__scheduler_pid: Optional[int] = None
+        self.__scheduler_lock = threading.Lock()
+        self.__stats_lock = threading.Lock()
+        self.__batches = 0
+        self.__texts = 0
+        self.__batch_size_histogram = {bucket: 0 for bucket in [str(bucket) for bucket in BATCH_SIZE_HISTOGRAM_BUCKETS] + ['+Inf']}
+        self.__total_queue_delay_ms = 0.0
+        self.__max_queue_delay_ms = 0.0
+
+    def encode(self, sentences: Union[str, list[str]], convert_to_numpy: bool = True, **kwargs: Any) -> np.ndarray:
+        """Encode a text through the scheduler, or a list of texts directly.
+
+        Parameters
+        ----------
+        sentences: Union[str, list[str]]
+            A single text or a list of texts
+        convert_to_numpy: bool
+            Kept for compatibility with SentenceTransformer.encode, embeddings are always numpy arrays
+
+        Returns
+        -------
+        np.ndarray
+            The embedding vector of a single text, or the embedding matrix of a list of texts
+        """
+        if not isinstance(sentences, str):
+            return self.embedder.encode(sentences, convert_to_numpy=True, **kwargs)
+        self.__ensure_scheduler()
+        future: Future = Future()
+        self.__pending.put((sentences, time.perf_counter(), future))
+        return future.result()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get the batch size and queueing delay statistics.
+
+        Returns
+        -------
+        dict[str, Any]
+            The number of batches and texts, the mean batch size, a histogram of batch sizes
+            keyed by upper bound, and the mean and max queueing delay in milliseconds
+        """
+        with self.__stats_lock:
+            return {'batches': self.__batches,
+                    'texts': self.__texts,
+                    'mean_batch_size': self.__texts / self.__batches if self.__batches else 0.0,
+                    'batch_size_histogram': dict(self.__batch_size_histogram),
+                    'mean_queue_delay_ms': self.__total_queue_delay_ms / self.__texts if self.__texts else 0.0,
+                    'max_queue_delay_ms': self.__max_queue_delay_ms,
+                    'max_batch_size': self.max_batch_size,
+                    'max_wait_ms': self.max_wait_ms}
+
+    def __ensure_scheduler(self) -> None:
+        """Start the scheduler thread, again in a forked child since threads do not survive a fork.
+        """
+        if self.__scheduler_pid == os.getpid():
+            return
+        with self.__scheduler_lock:
+            if self.__scheduler_pid == os.getpid():
+                return
+            self.__pending = queue.Queue()
+            threading.Thread(target=self.__schedule, args=(self.__pending,), daemon=True).start()
+            self.__scheduler_pid = os.getpid()
+
+    def __schedule(self, pending: queue.Queue) -> None:
+        """Collect pending texts into batches forever.
+
+        Parameters
+        ----------
+        pending: queue.Queue
+            The queue of (text, enqueued at, future) requests
+        """
+        while True:
+            batch = [pending.get()]
+            deadline = batch[0][1] + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+            self.__run_batch(batch)
+
+    def __run_batch(self, batch: list[tuple[str, float, Future]]) -> None:
+        """Encode a batch of texts once and resolve the futures of their callers.
+
+        Parameters
+        ----------
+        batch: list[tuple[str, float, Future]]
+            The (text, enqueued at, future) requests of the batch
+        """
+        started_at = time.perf_counter()
+        # identical concurrent queries are encoded once
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            embeddings = np.asarray(self.embedder.encode(unique_texts, convert_to_numpy=True))
+        except Exception as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        row_by_text = {text: row for row, text in enumerate(unique_texts)}
+        for text, _, future in batch:
+            future.set_result(embeddings[row_by_text[text]])
+
+        queue_delays_ms = [(started_at - enqueued_at) * 1000 for _, enqueued_at, _ in batch]
+        with self.__stats_lock:
+            self.__batches += 1
+            self.__texts += len(batch)
+            bucket = next((str(bucket) for bucket in BATCH_SIZE_HISTOGRAM_BUCKETS if len(batch) <= bucket), '+Inf')
+            self.__batch_size_histogram[bucket] += 1
+            self.__total_queue_delay_ms += sum(queue_delays_ms)
+            self.__max_queue_delay_ms = max([self.__max_queue_delay_ms] + queue_delays_ms)
+
+
+embedder: Optional[BatchingEmbedder] = None
+embedder_backend: str = INFERENCE_BACKEND_TORCH
+embedder_parity_report: Optional[dict[str, Any]] = None
+embedder_lock = threading.Lock()
+
+
+def get_embedder() -> BatchingEmbedder:
+    """Get the process-wide embedder, loading the model of the configured backend on first use.
+
+    Returns
+    -------
+    BatchingEmbedder
+        The embedder shared by the SearchService and the RecommenderService
+    """
+    global embedder, embedder_backend, embedder_parity_report
+    if embedder is None:
+        with embedder_lock:
+            if embedder is None:
+                parity_texts = []
+                if EMBEDDER_BACKEND != INFERENCE_BACKEND_TORCH:
+                    from services.catalog_service import get_catalog
+                    parity_texts = [food_item.label for food_item in get_catalog().food_items_by_food_item_uri.values()]
+                model, embedder_backend, embedder_parity_report = load_embedder_model(
+                    EMBEDDER_BACKEND, EMBEDDER_MODEL_NAME, EMBEDDER_MODEL_REVISION, parity_texts)
+                embedder = BatchingEmbedder(model)
+    return embedder
+
+
+def get_embedder_revision() -> str:
+    """Get the revision embeddings of the shared embedder are stored and cached under.
+
+    Returns
+    -------
+    str
+        The model revision, suffixed with the backend unless it is the PyTorch backend,
+        since optimized backends compute slightly different embeddings
+    """
+    get_embedder()
+    if embedder_backend == INFERENCE_BACKEND_TORCH:
+        return EMBEDDER_MODEL_REVISION
+    return '{}+{}'.format(EMBEDDER_MODEL_REVISION, embedder_backend)
+
+
+def get_embedder_stats() -> dict[str, Any]:
+    """Get the batching statistics, the backend and the parity report of the shared embedder.
+
+    Returns
+    -------
+    dict[str, Any]
+        The statistics of `BatchingEmbedder.get_stats` plus the backend in use and its parity report
+    """
+    stats = get_embedder().get_stats()
+    stats['backend'] = embedder_backend
+    stats['configured_backend'] = EMBEDDER_BACKEND
+    stats['parity'] = embedder_parity_report
+    return stats
@@ -0,0 +1,235 @@
+from typing import Any, Optional
+from services.constants import FILE_MODE_READ
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+# Constants
+EMBEDDING_STORE_DIR_PATH: str = 'data/embeddings'
+EMBEDDING_STORE_FORMAT_VERSION: int = 1
+ERROR_MESSAGE_EMBEDDING_SHAPE_MISMATCH: str = 'Embedder returned an unexpected number of embeddings.'
+FILE_MODE_WRITE: str = 'w'
+KEY_EMBEDDINGS_FILE: str = 'embeddings_file'
+KEY_FORMAT_VERSION: str = 'format_version'
+KEY_LABEL_HASHES_FILE: str = 'label_hashes_file'
+KEY_MODEL_NAME: str = 'model_name'
+KEY_MODEL_REVISION: str = 'model_revision'
+LABEL_HASH_DTYPE: str = 'S20'
+MANIFEST_FILE_NAME: str = 'manifest.json'
+
+
+class EmbeddingStoreException(Exception):
+    """An Exception in the EmbeddingStore, do nothing.
+    """
+    pass
+
+
+def hash_label(label: str) -> bytes:
+    """Hash a label to the key it is stored under.
+
+    Parameters
+    ----------
+    label: str
+        The label to hash
+
+    Returns
+    -------
+    bytes
+        The 20 byte SHA-1 digest of the UTF-8 encoded label
+    """
+    return hashlib.sha1(label.encode('utf-8')).digest()
+
+
+def update_embeddings(embeddings: np.ndarray, kept_rows: np.ndarray, labels: list[str], embedder: Any) -> np.ndarray:
+    """Compose the embeddings of an updated list of labels, only encoding the new and changed labels.
+
+    Parameters
+    ----------
+    embeddings: np.ndarray
+        The current embedding matrix
+    kept_rows: np.ndarray
+        The row of every updated label in the current embeddings, -1 for new or changed labels
+    labels: list[str]
+        The updated labels
+    embedder: Any
+        The model to encode new and changed labels with
+
+    Returns
+    -------
+    np.ndarray
+        A float32 matrix with the embedding of labels[i] on row i
+    """
+    kept = kept_rows >= 0
+    changed_rows = np.flatnonzero(~kept)
+    updated_embeddings = np.empty((len(labels), embeddings.shape[1]), dtype=np.float32)
+    updated_embeddings[kept] = embeddings[kept_rows[kept]]
+    if len(changed_rows):
+        changed_embeddings = np.asarray(embedder.encode([labels[row] for row in changed_rows], convert_to_numpy=True), dtype=np.float32)
+        if changed_embeddings.shape != (len(changed_rows), embeddings.shape[1]):
+            raise EmbeddingStoreException(ERROR_MESSAGE_EMBEDDING_SHAPE_MISMATCH)
+        updated_embeddings[changed_rows] = changed_embeddings
+    return updated_embeddings
+
+
+class EmbeddingStore:
+    """The EmbeddingStore persists label embeddings on disk so they are only computed once per model.
+
+    Embeddings are stored per model name and revision as a pair of `.npy` files: the embedding
+    matrix and the SHA-1 hashes of the labels its rows belong to. A small manifest points at the
+    current pair, so a new pair can be published atomically by replacing the manifest.
+    Stored embeddings are loaded memory-mapped (copy-on-write), so a warm start neither
+    touches the transformer model nor copies the matrix into memory.
+
+    Attributes
+    ----------
+    model_name: str
+        The name of the model the embeddings were computed with
+    model_revision: str
+        The revision of the model the embeddings were computed with
+    store_dir_path: str
+        The directory holding the embeddings of this model name and revision
+    """
+
+    def __init__(self, model_name: str, model_revision: str, store_dir_path: str = EMBEDDING_STORE_DIR_PATH):
+        """Create an EmbeddingStore for a specific model.
+
+        Parameters
+        ----------
+        model_name: str
+            The name of the model the embeddings are computed with, e.g. 'Linus4Lyf/test-food'
+        model_revision: str
+            The revision of the model, bump it whenever the model weights change
+        store_dir_path: str
+            The root directory of the store
+        """
+        self.model_name = model_name
+        self.model_revision = model_revision
+        model_dir_name = '{}@{}'.format(model_name.replace('/', '--'), model_revision)
+        self.store_dir_path = os.path.join(store_dir_path, model_dir_name)
+
+    def get_embeddings(self, labels: list[str], embedder: Any) -> np.ndarray:
+        """Get the embeddings for the given labels, only encoding labels that are not stored yet.
+
+        Parameters
+        ----------
+        labels: list[str]
+            The labels to get the embeddings for
+        embedder: Any
+            The model to encode missing labels with, it must provide `encode(labels, convert_to_numpy=True)`
+
+        Returns
+        -------
+        np.ndarray
+            A float32 matrix with the embedding of labels[i] on row i
+        """
+        label_hashes = np.array([hash_label(label) for label in labels], dtype=LABEL_HASH_DTYPE)
+        stored = self.__load()
+        if stored is not None and np.array_equal(stored[0], label_hashes):
+            return stored[1]
+
+        row_by_label_hash: dict[bytes, int] = {}
+        if stored is not None:
+            row_by_label_hash = {label_hash: row for row, label_hash in enumerate(stored[0].tolist())}
+        missing_labels: dict[bytes, str] = {}
+        for label_hash, label in zip(label_hashes.tolist(), labels):
+            if label_hash not in row_by_label_hash:
+                missing_labels[label_hash] = label
+
+        missing_embeddings: Optional[np.ndarray] = None
+        if missing_labels:
+            missing_embeddings = np.asarray(embedder.encode(
+                list(missing_labels.values()), convert_to_numpy=True), dtype=np.float32)
+            if missing_embeddings.shape[0] != len(missing_labels):
+                raise EmbeddingStoreException(ERROR_MESSAGE_EMBEDDING_SHAPE_MISMATCH)
+        missing_row_by_label_hash = {label_hash: row for row, label_hash in enumerate(missing_labels.keys())}
+
+        dimension = 0
+        if stored is not None:
+            dimension = stored[1].shape[1]
+        elif missing_embeddings is not None:
+            dimension = missing_embeddings.shape[1]
+        embeddings = np.empty((len(labels), dimension), dtype=np.float32)
+        for row, label_hash in enumerate(label_hashes.tolist()):
+            if label_hash in missing_row_by_label_hash:
+                embeddings[row] = missing_embeddings[missing_row_by_label_hash[label_hash]]
+            else:
+                embeddings[row] = stored[1][row_by_label_hash[label_hash]]
+
+        try:
+            self.__save(label_hashes, embeddings)
+        except OSError:
+            # A read-only store still serves the freshly computed embeddings
+            return embeddings
+        stored = self.__load()
+        return stored[1] if stored is not None else embeddings
+
+    def __load(self) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """Load the stored label hashes and embeddings.
+
+        Returns
+        -------
+        Optional[tuple[np.ndarray, np.ndarray]]
+            The label hashes and the memory-mapped embeddings, None if nothing usable is stored
+        """
+        manifest_file_path = os.path.join(self.store_dir_path, MANIFEST_FILE_NAME)
+        try:
+            with open(manifest_file_path, FILE_MODE_READ) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get(KEY_FORMAT_VERSION) != EMBEDDING_STORE_FORMAT_VERSION \
+                    or manifest.get(KEY_MODEL_NAME) != self.model_name \
+                    or manifest.get(KEY_MODEL_REVISION) != self.model_revision:
+                return None
+            label_hashes = np.load(os.path.join(self.store_dir_path, manifest[KEY_LABEL_HASHES_FILE]))
+            embeddings = np.load(os.path.join(self.store_dir_path, manifest[KEY_EMBEDDINGS_FILE]), mmap_mode='c')
+        except (OSError, ValueError, KeyError):
+            return None
+        if embeddings.ndim != 2 or label_hashes.shape[0] != embeddings.shape[0]:
+            return None
+        return label_hashes, embeddings
+
+    def __save(self, label_hashes: np.ndarray, embeddings: np.ndarray) -> None:
+        """Publish a new pair of label hashes and embeddings.
+
+        The arrays are written under unique file names first, the manifest is replaced last,
+        so concurrent readers always see a consistent pair.
+
+        Parameters
+        ----------
+        label_hashes: np.ndarray
+            The label hashes, one per row of embeddings
+        embeddings: np.ndarray
+            The embedding matrix
+        """
+        os.makedirs(self.store_dir_path, exist_ok=True)
+        manifest_file_path = os.path.join(self.store_dir_path, MANIFEST_FILE_NAME)
+        previous_file_names: list[str] = []
+        try:
+            with open(manifest_file_path, FILE_MODE_READ) as manifest_file:
+                previous_manifest = json.load(manifest_file)
+            previous_file_names = [previous_manifest[KEY_LABEL_HASHES_FILE], previous_manifest[KEY_EMBEDDINGS_FILE]]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        generation = uuid.uuid4().hex
+        manifest = {KEY_FORMAT_VERSION: EMBEDDING_STORE_FORMAT_VERSION,
+                    KEY_MODEL_NAME: self.model_name,
+                    KEY_MODEL_REVISION: self.model_revision,
+                    KEY_LABEL_HASHES_FILE: 'label_hashes-{}.npy'.format(generation),
+                    KEY_EMBEDDINGS_FILE: 'embeddings-{}.npy'.format(generation)}
+        np.save(os.path.join(self.store_dir_path, manifest[KEY_LABEL_HASHES_FILE]), label_hashes)
+        np.save(os.path.join(self.store_dir_path, manifest[KEY_EMBEDDINGS_FILE]), embeddings)
+        temporary_manifest_file_path = '{}.{}'.format(manifest_file_path, generation)
+        with open(temporary_manifest_file_path, FILE_MODE_WRITE) as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_manifest_file_path, manifest_file_path)
+
+        # Readers holding a memory map of the previous pair keep working after the unlink
+        for previous_file_name in previous_file_names:
+            try:
+                os.remove(os.path.join(self.store_dir_path, previous_file_name))
+            except OSError:
+                pass
+
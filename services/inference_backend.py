@@ -0,0 +1,486 @@
+from typing import Any, Optional, Union
+from services.constants import FILE_MODE_READ
+from services.similarity_index import compute_norms, select_top_k
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Constants
+INFERENCE_BACKENDS: list[str] = ['torch', 'torch-int8', 'onnx', 'onnx-int8', 'stub']
+INFERENCE_BACKEND_STUB: str = 'stub'
+INFERENCE_BACKEND_TORCH: str = 'torch'
+INFERENCE_MODEL_DIR_PATH: str = 'data/models'
+ERROR_MESSAGE_UNKNOWN_BACKEND: str = 'Unknown inference backend.'
+ERROR_MESSAGE_UNSUPPORTED_MODEL: str = 'Only a transformer followed by mean or cls pooling and an optional normalization can be exported.'
+EXPORT_CONFIG_FILE_NAME: str = 'export-config.json'
+FILE_MODE_WRITE: str = 'w'
+KEY_BACKEND: str = 'backend'
+KEY_ERROR: str = 'error'
+KEY_MAX_SEQ_LENGTH: str = 'max_seq_length'
+KEY_NORMALIZE: str = 'normalize'
+KEY_PASSED: str = 'passed'
+KEY_POOLING_MODE: str = 'pooling_mode'
+ONNX_FILE_NAMES: dict[str, str] = {'onnx': 'model.onnx', 'onnx-int8': 'model-int8.onnx'}
+ONNX_OPSET_VERSION: int = 13
+PARITY_MIN_MEAN_COSINE: float = 0.99
+PARITY_MIN_TOP_K_OVERLAP: float = 0.9
+PARITY_SAMPLE_SIZE: int = 1000
+PARITY_TOP_K: int = 10
+STUB_EMBEDDING_DIMENSION: int = 384
+TOKENIZER_DIR_NAME: str = 'tokenizer'
+
+
+class InferenceBackendException(Exception):
+    """An Exception in an inference backend, do nothing.
+    """
+    pass
+
+
+class StubEmbedder:
+    """The StubEmbedder is a deterministic stand-in for the transformer model, e.g. for offline benchmarks.
+
+    Every word is mapped to a fixed pseudo-random vector seeded by its hash, a text is the
+    normalized sum of its word vectors. Texts sharing words are similar, the embeddings are the
+    same in every process and no model has to be downloaded.
+
+    Attributes
+    ----------
+    dimension: int
+        The size of the embeddings
+    """
+
+    def __init__(self, dimension: int = STUB_EMBEDDING_DIMENSION):
+        """Create a StubEmbedder.
+
+        Parameters
+        ----------
+        dimension: int
+            The size of the embeddings
+        """
+        self.dimension = dimension
+        self.__vector_by_word: dict[str, np.ndarray] = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Get the size of the embeddings, like SentenceTransformer.get_sentence_embedding_dimension.
+
+        Returns
+        -------
+        int
+            The size of the embeddings
+        """
+        return self.dimension
+
+    def encode(self, sentences: Union[str, list[str]], convert_to_numpy: bool = True, **kwargs: Any) -> np.ndarray:
+        """Encode texts the way SentenceTransformer.encode does.
+
+        Parameters
+        ----------
+        sentences: Union[str, list[str]]
+            A single text or a list of texts
+        convert_to_numpy: bool
+            Kept for compatibility with SentenceTransformer.encode, embeddings are always numpy arrays
+
+        Returns
+        -------
+        np.ndarray
+            The embedding vector of a single text, or the (texts x dimension) float32 embedding matrix
+        """
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row] += self.__get_word_vector(word)
+        embeddings /= compute_norms(embeddings)[:, None]
+        return embeddings[0] if isinstance(sentences, str) else embeddings
+
+    def __get_word_vector(self, word: str) -> np.ndarray:
+        """Get the fixed vector of a word.
+
+        Parameters
+        ----------
+        word: str
+            The lower cased word
+
+        Returns
+        -------
+        np.ndarray
+            The float32 vector seeded by the hash of the word
+        """
+        vector = self.__vector_by_word.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha1(word.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self.__vector_by_word[word] = vector
+        return vector
+
+
+class OnnxEmbedder:
+    """The OnnxEmbedder encodes texts with an ONNX Runtime export of a SentenceTransformer.
+
+    The transformer runs in ONNX Runtime, tokenization, pooling and normalization are done
+    the way the exported SentenceTransformer does them.
+
+    Attributes
+    ----------
+    tokenizer: Any
+        The tokenizer of the exported model
+    max_seq_length: int
+        The number of tokens texts are truncated to
+    pooling_mode: str
+        'mean' or 'cls'
+    normalize: bool
+        Whether embeddings are scaled to unit length
+    """
+
+    def __init__(self, onnx_file_path: str, tokenizer: Any, max_seq_length: int, pooling_mode: str, normalize: bool):
+        """Create an OnnxEmbedder.
+
+        Parameters
+        ----------
+        onnx_file_path: str
+            The exported transformer
+        tokenizer: Any
+            The tokenizer of the exported model
+        max_seq_length: int
+            The number of tokens texts are truncated to
+        pooling_mode: str
+            'mean' or 'cls'
+        normalize: bool
+            Whether embeddings are scaled to unit length
+        """
+        import onnxruntime
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self.pooling_mode = pooling_mode
+        self.normalize = normalize
+        self.__session = onnxruntime.InferenceSession(onnx_file_path, providers=['CPUExecutionProvider'])
+        self.__input_names = [session_input.name for session_input in self.__session.get_inputs()]
+
+    def encode(self, sentences: Union[str, list[str]], convert_to_numpy: bool = True, batch_size: int = 32, **kwargs: Any) -> np.ndarray:
+        """Encode a text or a list of texts.
+
+        Parameters
+        ----------
+        sentences: Union[str, list[str]]
+            A single text or a list of texts
+        convert_to_numpy: bool
+            Kept for compatibility with SentenceTransformer.encode, embeddings are always numpy arrays
+        batch_size: int
+            The number of texts per forward pass
+
+        Returns
+        -------
+        np.ndarray
+            The embedding vector of a single text, or the embedding matrix of a list of texts
+        """
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size=batch_size)[0]
+        batches = [self.__encode_batch(sentences[start:start + batch_size]) for start in range(0, len(sentences), batch_size)]
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def __encode_batch(self, texts: list[str]) -> np.ndarray:
+        """Encode one batch of texts.
+
+        Parameters
+        ----------
+        texts: list[str]
+            The texts of the batch
+
+        Returns
+        -------
+        np.ndarray
+            The (texts x dimension) float32 embeddings
+        """
+        features = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors='np')
+        token_embeddings = self.__session.run(None, {name: np.asarray(features[name], dtype=np.int64)
+                                                     for name in self.__input_names})[0]
+        if self.pooling_mode == 'cls':
+            embeddings = token_embeddings[:, 0]
+        else:
+            attention_mask = np.asarray(features['attention_mask'], dtype=np.float32)[:, :, None]
+            embeddings = (token_embeddings * attention_mask).sum(axis=1) / np.maximum(attention_mask.sum(axis=1), 1e-9)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / compute_norms(embeddings)[:, None] if self.normalize else embeddings
+
+
+def get_model_dir_path(model_name: str, model_revision: str, model_dir_path: str = INFERENCE_MODEL_DIR_PATH) -> str:
+    """Get the directory the exported models and parity reports of a model are kept in.
+
+    Parameters
+    ----------
+    model_name: str
+        The name of the model, e.g. 'Linus4Lyf/test-food'
+    model_revision: str
+        The revision of the model
+    model_dir_path: str
+        The root directory of exported models
+
+    Returns
+    -------
+    str
+        The directory of this model name and revision
+    """
+    return os.path.join(model_dir_path, '{}@{}'.format(model_name.replace('/', '--'), model_revision))
+
+
+def get_pooling_mode(model: Any) -> tuple[str, bool]:
+    """Check that a SentenceTransformer can be exported and get how it pools token embeddings.
+
+    Parameters
+    ----------
+    model: Any
+        The SentenceTransformer
+
+    Returns
+    -------
+    tuple[str, bool]
+        The pooling mode, 'mean' or 'cls', and whether embeddings are normalized
+    """
+    modules = list(model)
+    module_names = [type(module).__name__ for module in modules]
+    if module_names[:2] != ['Transformer', 'Pooling'] or module_names[2:] not in ([], ['Normalize']):
+        raise InferenceBackendException(ERROR_MESSAGE_UNSUPPORTED_MODEL)
+    pooling = modules[1]
+    if pooling.pooling_mode_mean_tokens and not (pooling.pooling_mode_cls_token or pooling.pooling_mode_max_tokens or pooling.pooling_mode_mean_sqrt_len_tokens):
+        return 'mean', len(modules) == 3
+    if pooling.pooling_mode_cls_token and not (pooling.pooling_mode_mean_tokens or pooling.pooling_mode_max_tokens or pooling.pooling_mode_mean_sqrt_len_tokens):
+        return 'cls', len(modules) == 3
+    raise InferenceBackendException(ERROR_MESSAGE_UNSUPPORTED_MODEL)
+
+
+def export_onnx_model(model: Any, onnx_file_path: str, quantize: bool) -> None:
+    """Export the transformer of a SentenceTransformer to ONNX, optionally with dynamic int8 quantization.
+
+    Parameters
+    ----------
+    model: Any
+        The SentenceTransformer
+    onnx_file_path: str
+        The file to export to
+    quantize: bool
+        Whether to quantize the weights of the exported model to int8
+    """
+    import torch
+    get_pooling_mode(model)
+    transformer = model[0]
+    features = transformer.tokenizer(['food item'], padding=True, return_tensors='pt')
+    input_names = [name for name in ['input_ids', 'attention_mask', 'token_type_ids'] if name in features]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+    os.makedirs(os.path.dirname(onnx_file_path), exist_ok=True)
+    float_file_path = onnx_file_path + '.float' if quantize else onnx_file_path
+    transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(transformer.auto_model, tuple(features[name] for name in input_names), float_file_path,
+                          input_names=input_names, output_names=['token_embeddings'], dynamic_axes=dynamic_axes,
+                          opset_version=ONNX_OPSET_VERSION)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_file_path, onnx_file_path, weight_type=QuantType.QInt8)
+        os.remove(float_file_path)
+
+
+def load_backend_model(backend: str, model: Any, model_dir_path: str) -> Any:
+    """Get the model of an optimized backend, exporting it on first use.
+
+    Parameters
+    ----------
+    backend: str
+        'torch-int8', 'onnx' or 'onnx-int8'
+    model: Any
+        The PyTorch SentenceTransformer the backend model is derived from
+    model_dir_path: str
+        The directory exported models are kept in
+
+    Returns
+    -------
+    Any
+        A model with a SentenceTransformer compatible `encode`
+    """
+    if backend == 'torch-int8':
+        import torch
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend not in ONNX_FILE_NAMES:
+        raise InferenceBackendException(ERROR_MESSAGE_UNKNOWN_BACKEND)
+    onnx_file_path = os.path.join(model_dir_path, ONNX_FILE_NAMES[backend])
+    if not os.path.exists(onnx_file_path):
+        export_onnx_model(model, onnx_file_path, quantize=backend == 'onnx-int8')
+    pooling_mode, normalize = get_pooling_mode(model)
+    export_config_file_path = os.path.join(model_dir_path, EXPORT_CONFIG_FILE_NAME)
+    if not os.path.exists(export_config_file_path):
+        # the tokenizer and the pooling are saved next to the export, so later starts do not need the PyTorch model
+        model[0].tokenizer.save_pretrained(os.path.join(model_dir_path, TOKENIZER_DIR_NAME))
+        with open(export_config_file_path, FILE_MODE_WRITE) as export_config_file:
+            json.dump({KEY_MAX_SEQ_LENGTH: model[0].max_seq_length, KEY_POOLING_MODE: pooling_mode, KEY_NORMALIZE: normalize},
+                      export_config_file)
+    return OnnxEmbedder(onnx_file_path, model[0].tokenizer, model[0].max_seq_length, pooling_mode, normalize)
+
+
+def load_verified_backend_model(backend: str, model_name: str, model_revision: str, model_dir_path: str) -> Optional[Any]:
+    """Load the model of a backend that passed its parity check, without loading the PyTorch reference model.
+
+    Parameters
+    ----------
+    backend: str
+        'torch-int8', 'onnx' or 'onnx-int8'
+    model_name: str
+        The name of the SentenceTransformer
+    model_revision: str
+        The revision of the model
+    model_dir_path: str
+        The directory exported models are kept in
+
+    Returns
+    -------
+    Optional[Any]
+        A model with a SentenceTransformer compatible `encode`, None when the export misses its
+        tokenizer or configuration, e.g. when it was exported by an older version
+    """
+    if backend == 'torch-int8':
+        import torch
+        from sentence_transformers import SentenceTransformer
+        # quantized in place, so the float model is not kept next to the quantized one
+        return torch.quantization.quantize_dynamic(SentenceTransformer(model_name, revision=model_revision),
+                                                   {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if backend not in ONNX_FILE_NAMES:
+        raise InferenceBackendException(ERROR_MESSAGE_UNKNOWN_BACKEND)
+    onnx_file_path = os.path.join(model_dir_path, ONNX_FILE_NAMES[backend])
+    export_config_file_path = os.path.join(model_dir_path, EXPORT_CONFIG_FILE_NAME)
+    tokenizer_dir_path = os.path.join(model_dir_path, TOKENIZER_DIR_NAME)
+    if not (os.path.exists(onnx_file_path) and os.path.exists(export_config_file_path) and os.path.isdir(tokenizer_dir_path)):
+        return None
+    from transformers import AutoTokenizer
+    with open(export_config_file_path, FILE_MODE_READ) as export_config_file:
+        export_config = json.load(export_config_file)
+    return OnnxEmbedder(onnx_file_path, AutoTokenizer.from_pretrained(tokenizer_dir_path), export_config[KEY_MAX_SEQ_LENGTH],
+                        export_config[KEY_POOLING_MODE], export_config[KEY_NORMALIZE])
+
+
+def check_parity(reference_model: Any, candidate_model: Any, texts: list[str], top_k: int = PARITY_TOP_K) -> dict[str, Any]:
+    """Compare the embeddings of a candidate model with the embeddings of the reference model.
+
+    Parameters
+    ----------
+    reference_model: Any
+        The PyTorch model
+    candidate_model: Any
+        The model of the optimized backend
+    texts: list[str]
+        The texts to compare on, a sample of the catalog labels
+    top_k: int
+        The number of neighbors compared per text, the texts are searched among each other
+
+    Returns
+    -------
+    dict[str, Any]
+        The mean and min cosine similarity of the embedding pairs, the mean top-k overlap of
+        the neighbors and whether both meet the parity thresholds
+    """
+    reference = np.asarray(reference_model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    candidate = np.asarray(candidate_model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    reference /= compute_norms(reference)[:, None]
+    candidate /= compute_norms(candidate)[:, None]
+    cosines = np.sum(reference * candidate, axis=1)
+    top_k = min(top_k, len(texts))
+    reference_neighbors = select_top_k(reference @ reference.T, top_k)
+    candidate_neighbors = select_top_k(candidate @ candidate.T, top_k)
+    overlaps = [len(set(reference_row.tolist()) & set(candidate_row.tolist())) / top_k
+                for reference_row, candidate_row in zip(reference_neighbors, candidate_neighbors)]
+    report = {'texts': len(texts),
+              'top_k': top_k,
+              'mean_cosine': float(np.mean(cosines)) if len(texts) else 1.0,
+              'min_cosine': float(np.min(cosines)) if len(texts) else 1.0,
+              'top_k_overlap': float(np.mean(overlaps)) if overlaps else 1.0}
+    report[KEY_PASSED] = report['mean_cosine'] >= PARITY_MIN_MEAN_COSINE and report['top_k_overlap'] >= PARITY_MIN_TOP_K_OVERLAP
+    return report
+
+
+def sample_texts(texts: list[str], sample_size: int = PARITY_SAMPLE_SIZE) -> list[str]:
+    """Pick evenly spaced texts, so the parity sample covers the whole catalog.
+
+    Parameters
+    ----------
+    texts: list[str]
+        The catalog labels
+    sample_size: int
+        The maximum number of texts
+
+    Returns
+    -------
+    list[str]
+        The sample
+    """
+    if len(texts) <= sample_size:
+        return list(texts)
+    return [texts[row] for row in np.linspace(0, len(texts) - 1, sample_size).astype(int)]
+
+
+def load_embedder_model(backend: str, model_name: str, model_revision: str, parity_texts: list[str],
+                        model_dir_path: str = INFERENCE_MODEL_DIR_PATH) -> tuple[Any, str, Optional[dict[str, Any]]]:
+    """Load the model of the selected backend, falling back to PyTorch when it fails or misses parity.
+
+    The parity report of a backend is saved next to its exported model, together with the
+    tokenizer and pooling of the export. Once a backend has passed, later starts load only its
+    model, the check and the PyTorch reference model are only needed on the first start.
+
+    Parameters
+    ----------
+    backend: str
+        One of INFERENCE_BACKENDS
+    model_name: str
+        The name of the SentenceTransformer
+    model_revision: str
+        The revision of the model
+    parity_texts: list[str]
+        The texts the parity check compares embeddings on
+    model_dir_path: str
+        The root directory of exported models
+
+    Returns
+    -------
+    tuple[Any, str, Optional[dict[str, Any]]]
+        The model, the backend actually used and the parity report, None for the torch backend
+    """
+    if backend == INFERENCE_BACKEND_STUB:
+        return StubEmbedder(), INFERENCE_BACKEND_STUB, None
+    from sentence_transformers import SentenceTransformer
+    if backend == INFERENCE_BACKEND_TORCH:
+        return SentenceTransformer(model_name, revision=model_revision), INFERENCE_BACKEND_TORCH, None
+    model_dir_path = get_model_dir_path(model_name, model_revision, model_dir_path)
+    report_file_path = os.path.join(model_dir_path, 'parity-{}.json'.format(backend))
+    report = None
+    if os.path.exists(report_file_path):
+        with open(report_file_path, FILE_MODE_READ) as report_file:
+            report = json.load(report_file)
+    if report is not None and not report[KEY_PASSED]:
+        return SentenceTransformer(model_name, revision=model_revision), INFERENCE_BACKEND_TORCH, report
+    if report is not None:
+        try:
+            candidate_model = load_verified_backend_model(backend, model_name, model_revision, model_dir_path)
+        except Exception:
+            # e.g. a removed optional dependency, the full load below falls back to PyTorch
+            candidate_model = None
+        if candidate_model is not None:
+            return candidate_model, backend, report
+
+    reference_model = SentenceTransformer(model_name, revision=model_revision)
+    try:
+        candidate_model = load_backend_model(backend, reference_model, model_dir_path)
+        if report is None:
+            report = check_parity(reference_model, candidate_model, sample_texts(parity_texts))
+    except Exception as error:
+        # a missing optional dependency or a model that cannot be exported, keep serving with PyTorch
+        candidate_model, report = None, {KEY_PASSED: False, KEY_ERROR: '{}: {}'.format(type(error).__name__, error)}
+    report[KEY_BACKEND] = backend
+    if KEY_ERROR not in report:
+        # errors are not saved, installing a missing dependency is picked up on the next start
+        try:
+            os.makedirs(model_dir_path, exist_ok=True)
+            with open(report_file_path, FILE_MODE_WRITE) as report_file:
+                json.dump(report, report_file)
+        except OSError:
+            pass
+    if not report[KEY_PASSED]:
+        return reference_model, INFERENCE_BACKEND_TORCH, report
+    return candidate_model, backend, report
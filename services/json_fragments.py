@@ -0,0 +1,165 @@
+from typing import Any
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from services.constants import NUTRIENT_FRAGMENT_CACHE_SIZE
+from services.lru_cache import LruCache
+import json
+import threading
+
+# Constants
+JSON_SEPARATORS: tuple[str, str] = (',', ':')
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode a value the way Flask's jsonify does: sorted keys, ASCII only and without whitespace.
+
+    Parameters
+    ----------
+    value: Any
+        A value made of dicts, lists, strings, numbers, booleans and None
+
+    Returns
+    -------
+    bytes
+        The JSON encoding
+    """
+    return json.dumps(value, sort_keys=True, ensure_ascii=True, separators=JSON_SEPARATORS).encode('ascii')
+
+
+def render_json(value: Any) -> bytes:
+    """Encode a value in which pre-encoded fragments stand for parts of the document.
+
+    Lists and dicts are assembled around the fragments, bytes are spliced in unchanged and every
+    other value is encoded by `encode_json`, so the result equals the JSON of the value with the
+    fragments decoded.
+
+    Parameters
+    ----------
+    value: Any
+        A value whose lists and dict values may be pre-encoded bytes
+
+    Returns
+    -------
+    bytes
+        The JSON encoding
+    """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, list):
+        return b'[' + b','.join([render_json(item) for item in value]) + b']'
+    if isinstance(value, dict):
+        return b'{' + b','.join([encode_json(str(key)) + b':' + render_json(value[key]) for key in sorted(value)]) + b'}'
+    return encode_json(value)
+
+
+class JsonFragments:
+    """The JsonFragments keep the encoded JSON of the food items and nutrient amounts of one Catalog snapshot.
+
+    A food item is encoded the first time it is served, later responses splice the stored bytes
+    instead of serializing it again. Food item fragments are small and kept for the life of the
+    snapshot; the nutrient amounts of a food item are a larger block, the most recently used
+    NUTRIENT_FRAGMENT_CACHE_SIZE blocks are kept.
+
+    Attributes
+    ----------
+    catalog: Catalog
+        The Catalog snapshot the fragments are encoded from
+    """
+
+    def __init__(self, catalog: Catalog):
+        """Create empty JsonFragments for a Catalog snapshot.
+
+        Parameters
+        ----------
+        catalog: Catalog
+            The Catalog snapshot
+        """
+        self.catalog = catalog
+        self.__food_item_fragments: dict[str, tuple[str, bytes]] = {}
+        self.__nutrient_amount_fragments = LruCache(NUTRIENT_FRAGMENT_CACHE_SIZE)
+
+    def get_food_item(self, food_item: FoodItem) -> bytes:
+        """Get the encoded JSON of a food item, equal to the JSON of `food_item.serialize()`.
+
+        Parameters
+        ----------
+        food_item: FoodItem
+            The food item
+
+        Returns
+        -------
+        bytes
+            The encoded food item
+        """
+        fragment = self.__food_item_fragments.get(food_item.uri)
+        # a service may still serve a relabelled food item of the previous snapshot
+        if fragment is None or fragment[0] != food_item.label:
+            fragment = (food_item.label, encode_json(food_item.serialize()))
+            catalog_food_item = self.catalog.food_items_by_food_item_uri.get(food_item.uri)
+            if catalog_food_item is not None and catalog_food_item.label == food_item.label:
+                self.__food_item_fragments[food_item.uri] = fragment
+        return fragment[1]
+
+    def get_food_items(self, food_items: list[FoodItem]) -> bytes:
+        """Get the encoded JSON array of food items.
+
+        Parameters
+        ----------
+        food_items: list[FoodItem]
+            The food items
+
+        Returns
+        -------
+        bytes
+            The encoded array
+        """
+        return b'[' + b','.join([self.get_food_item(food_item) for food_item in food_items]) + b']'
+
+    def get_nutrient_amounts(self, food_item_uri: str) -> bytes:
+        """Get the encoded JSON array of the nutrient amounts of a food item, in column order.
+
+        Parameters
+        ----------
+        food_item_uri: str
+            The Food Item URI
+
+        Returns
+        -------
+        bytes
+            The encoded nutrient amounts, an empty array for a food item without nutrient amounts
+        """
+        fragment = self.__nutrient_amount_fragments.get(food_item_uri)
+        if fragment is None:
+            fragment = encode_json([nutrient_amount.serialize() for nutrient_amount
+                                    in self.catalog.nutrient_matrix.get_nutrient_amounts(food_item_uri)])
+            self.__nutrient_amount_fragments.put(food_item_uri, fragment)
+        return fragment
+
+
+json_fragments_lock = threading.Lock()
+json_fragments_by_version: dict[str, JsonFragments] = {}
+
+
+def get_json_fragments(catalog: Catalog) -> JsonFragments:
+    """Get the JsonFragments of a Catalog snapshot, created once per catalog version.
+
+    Parameters
+    ----------
+    catalog: Catalog
+        The Catalog snapshot
+
+    Returns
+    -------
+    JsonFragments
+        The JsonFragments
+    """
+    json_fragments = json_fragments_by_version.get(catalog.version)
+    if json_fragments is None:
+        with json_fragments_lock:
+            json_fragments = json_fragments_by_version.get(catalog.version)
+            if json_fragments is None:
+                json_fragments = JsonFragments(catalog)
+                # only the current version is kept, a reload or an update replaces it
+                json_fragments_by_version.clear()
+                json_fragments_by_version[catalog.version] = json_fragments
+    return json_fragments
@@ -0,0 +1,185 @@
+from typing import Any, Iterator, Optional
+import codecs
+import json
+
+# Constants
+ERROR_MESSAGE_ARRAY_NOT_FOUND: str = 'No array "{}" found.'
+ERROR_MESSAGE_TRUNCATED: str = 'The JSON document ends inside the array "{}".'
+FILE_MODE_READ_BINARY: str = 'rb'
+JSON_STREAM_CHUNK_SIZE: int = 1 << 16
+JSON_WHITESPACE: str = ' \t\n\r'
+
+
+class JsonStreamException(Exception):
+    """An Exception while streaming a JSON document, do nothing.
+    """
+    pass
+
+
+class JsonArrayStream:
+    """The JsonArrayStream walks the items of one array in a large JSON document, one item at a time.
+
+    The document is read in fixed size chunks and every item is decoded on its own, so memory is
+    bounded by one chunk plus one item instead of the whole parsed document. The first array stored
+    under the given key is streamed. All bytes of the file are fed to an optional hash, e.g. to
+    fingerprint the document in the same pass.
+
+    Attributes
+    ----------
+    data_file_path: str
+        The JSON document
+    array_key: str
+        The key the array is stored under
+    """
+
+    def __init__(self, data_file_path: str, array_key: str, content_hash: Optional[Any] = None,
+                 chunk_size: int = JSON_STREAM_CHUNK_SIZE):
+        """Create a JsonArrayStream, the file is opened when the items are iterated.
+
+        Parameters
+        ----------
+        data_file_path: str
+            The JSON document
+        array_key: str
+            The key the array is stored under
+        content_hash: Optional[Any]
+            A hashlib hash updated with every byte of the file
+        chunk_size: int
+            The number of bytes read at once
+        """
+        self.data_file_path = data_file_path
+        self.array_key = array_key
+        self.__content_hash = content_hash
+        self.__chunk_size = chunk_size
+        self.__decoder = json.JSONDecoder()
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate the decoded items of the array.
+
+        Returns
+        -------
+        Iterator[Any]
+            The items, in document order
+        """
+        with open(self.data_file_path, FILE_MODE_READ_BINARY) as data_file:
+            text_decoder = codecs.getincrementaldecoder('utf-8')()
+            chunks = self.__read_chunks(data_file, text_decoder)
+            buffer, position = self.__find_array(chunks)
+            while True:
+                buffer, position = self.__skip(buffer, position, chunks, JSON_WHITESPACE + ',')
+                if position >= len(buffer):
+                    raise JsonStreamException(ERROR_MESSAGE_TRUNCATED.format(self.array_key))
+                if buffer[position] == ']':
+                    break
+                while True:
+                    decode_error: Optional[json.JSONDecodeError] = None
+                    try:
+                        item, end = self.__decoder.raw_decode(buffer, position)
+                        if end < len(buffer):
+                            break
+                    except json.JSONDecodeError as error:
+                        decode_error = error
+                    # the item may continue in the next chunk, e.g. a number cut at the end of the buffer
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        if decode_error is not None:
+                            raise JsonStreamException(str(decode_error)) from decode_error
+                        break
+                    buffer, position = buffer[position:] + chunk, 0
+                position = end
+                yield item
+            for _ in chunks:
+                # the rest of the document still goes into the hash
+                pass
+
+    def __read_chunks(self, data_file: Any, text_decoder: Any) -> Iterator[str]:
+        """Read and decode the file chunk by chunk.
+
+        Parameters
+        ----------
+        data_file: Any
+            The opened binary file
+        text_decoder: Any
+            The incremental UTF-8 decoder, characters split across chunks are completed by the next chunk
+
+        Returns
+        -------
+        Iterator[str]
+            The decoded chunks
+        """
+        while True:
+            raw_chunk = data_file.read(self.__chunk_size)
+            if self.__content_hash is not None:
+                self.__content_hash.update(raw_chunk)
+            if not raw_chunk:
+                tail = text_decoder.decode(b'', final=True)
+                if tail:
+                    yield tail
+                return
+            yield text_decoder.decode(raw_chunk)
+
+    def __find_array(self, chunks: Iterator[str]) -> tuple[str, int]:
+        """Read up to the opening bracket of the array.
+
+        Parameters
+        ----------
+        chunks: Iterator[str]
+            The decoded chunks
+
+        Returns
+        -------
+        tuple[str, int]
+            The buffer and the position right after the opening bracket
+        """
+        quoted_key = json.dumps(self.array_key)
+        buffer = ''
+        search_from = 0
+        for chunk in chunks:
+            buffer += chunk
+            while True:
+                key_position = buffer.find(quoted_key, search_from)
+                if key_position < 0:
+                    # keep the tail, the key may be split across two chunks
+                    buffer = buffer[-len(quoted_key):]
+                    search_from = 0
+                    break
+                position = key_position + len(quoted_key)
+                buffer, position = self.__skip(buffer, position, chunks, JSON_WHITESPACE)
+                if buffer[position:position + 1] == ':':
+                    buffer, position = self.__skip(buffer, position + 1, chunks, JSON_WHITESPACE)
+                    if buffer[position:position + 1] == '[':
+                        return buffer, position + 1
+                # not the key of an array, the buffer now starts after this occurrence
+                search_from = 0
+        raise JsonStreamException(ERROR_MESSAGE_ARRAY_NOT_FOUND.format(self.array_key))
+
+    def __skip(self, buffer: str, position: int, chunks: Iterator[str], characters: str) -> tuple[str, int]:
+        """Skip characters, reading more chunks when the buffer runs out.
+
+        Parameters
+        ----------
+        buffer: str
+            The decoded text read so far
+        position: int
+            The position to skip from
+        chunks: Iterator[str]
+            The decoded chunks
+        characters: str
+            The characters to skip
+
+        Returns
+        -------
+        tuple[str, int]
+            The buffer, trimmed to start at the current position, and the position of the first
+            other character, or the end of the buffer at the end of the document
+        """
+        buffer, position = buffer[position:], 0
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer):
+                return buffer, position
+            chunk = next(chunks, None)
+            if chunk is None:
+                return buffer, position
+            buffer, position = chunk, 0
@@ -0,0 +1,259 @@
+from bisect import bisect_left
+from typing import Optional
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from services.query_cache import normalize_query
+import threading
+
+import numpy as np
+
+# Constants
+DEFAULT_AUTOCOMPLETE_LIMIT: int = 10
+MAX_AUTOCOMPLETE_LIMIT: int = 100
+PREFIX_RANGE_END: str = '\U0010ffff'
+TRIGRAM_PADDING: str = ' '
+
+
+def get_trigrams(text: str) -> list[str]:
+    """Split a normalized text into its distinct character trigrams, words are padded so short words count too.
+
+    Parameters
+    ----------
+    text: str
+        The normalized text
+
+    Returns
+    -------
+    list[str]
+        The distinct trigrams, in order of first occurrence
+    """
+    padded_text = TRIGRAM_PADDING + text + TRIGRAM_PADDING
+    return list(dict.fromkeys(padded_text[start:start + 3] for start in range(len(padded_text) - 2)))
+
+
+class LexicalIndex:
+    """The LexicalIndex answers prefix and fuzzy lookups on the food labels without the transformer model.
+
+    Every preferred label of a food item gets a row. The normalized labels are kept sorted, so the
+    labels starting with a prefix are a contiguous range found by binary search. Every word and every
+    character trigram has a posting list of the labels containing it, stored as one flat array with
+    offsets (CSR), so a lookup slices arrays instead of walking Python objects. Lookups map the rows
+    back to the food items, a food item is returned once for its best label.
+
+    Attributes
+    ----------
+    food_items: list[FoodItem]
+        The food items, lookups return positions in this list
+    labels: list[str]
+        The normalized label of every row
+    food_item_positions: np.ndarray
+        The position in food_items of the food item of every row
+    """
+
+    def __init__(self, food_items: list[FoodItem]):
+        """Build the index.
+
+        Parameters
+        ----------
+        food_items: list[FoodItem]
+            The food items, a lookup returns the positions in this list
+        """
+        self.food_items = food_items
+        self.labels = [normalize_query(label) for food_item in food_items for label in food_item.labels]
+        self.food_item_positions = np.repeat(np.arange(len(food_items), dtype=np.int64),
+                                             [len(food_item.labels) for food_item in food_items])
+        # the first row of every food item, its labels are consecutive rows
+        self.food_item_offsets = np.searchsorted(self.food_item_positions, np.arange(len(food_items)))
+        self.label_lengths = np.array([len(label) for label in self.labels], dtype=np.int64)
+        self.sorted_label_rows = np.array(sorted(range(len(self.labels)), key=self.labels.__getitem__), dtype=np.int64)
+        self.sorted_labels = [self.labels[row] for row in self.sorted_label_rows]
+        # the position of every row in the sorted labels, ties in length are broken alphabetically
+        self.label_ranks = np.empty(len(self.labels), dtype=np.int64)
+        self.label_ranks[self.sorted_label_rows] = np.arange(len(self.labels))
+
+        rows_by_token: dict[str, list[int]] = {}
+        rows_by_trigram: dict[str, list[int]] = {}
+        self.trigram_counts = np.zeros(len(self.labels), dtype=np.float32)
+        for row, label in enumerate(self.labels):
+            for token in dict.fromkeys(label.split()):
+                rows_by_token.setdefault(token, []).append(row)
+            trigrams = get_trigrams(label)
+            self.trigram_counts[row] = len(trigrams)
+            for trigram in trigrams:
+                rows_by_trigram.setdefault(trigram, []).append(row)
+        self.tokens = sorted(rows_by_token)
+        self.token_offsets, self.token_rows = self.__build_postings([rows_by_token[token] for token in self.tokens])
+        self.trigram_ids = {trigram: trigram_id for trigram_id, trigram in enumerate(rows_by_trigram)}
+        self.trigram_offsets, self.trigram_rows = self.__build_postings(list(rows_by_trigram.values()))
+
+    def complete(self, prefix: str, limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list[int]:
+        """Find the food items with a label matching a prefix typed in a search box.
+
+        Labels starting with the whole prefix come first, then labels in which every word of the
+        prefix starts a word, e.g. 'bread rye' for 'rye br'. Shorter labels come first within both.
+
+        Parameters
+        ----------
+        prefix: str
+            The text typed so far
+        limit: int
+            The maximum number of food items
+
+        Returns
+        -------
+        list[int]
+            The positions of the matching food items, best first
+        """
+        query = normalize_query(prefix)
+        if not query or limit <= 0:
+            return []
+        start, end = self.__get_prefix_range(self.sorted_labels, query)
+        positions = self.__get_food_item_positions(self.__order_rows(self.sorted_label_rows[start:end]))[:limit]
+        if len(positions) < limit:
+            word_rows: Optional[np.ndarray] = None
+            for token in query.split():
+                token_start, token_end = self.__get_prefix_range(self.tokens, token)
+                token_rows = np.unique(self.token_rows[self.token_offsets[token_start]:self.token_offsets[token_end]])
+                word_rows = token_rows if word_rows is None else np.intersect1d(word_rows, token_rows, assume_unique=True)
+            word_rows = word_rows[np.isin(self.food_item_positions[word_rows], positions, invert=True)]
+            positions = np.concatenate([positions, self.__get_food_item_positions(self.__order_rows(word_rows))[:limit - len(positions)]])
+        return positions.tolist()
+
+    def find_exact(self, text: str) -> list[int]:
+        """Find the food items with a label equal to a text, after normalization.
+
+        Parameters
+        ----------
+        text: str
+            The text to look up
+
+        Returns
+        -------
+        list[int]
+            The positions of the food items with an equal label
+        """
+        query = normalize_query(text)
+        start = bisect_left(self.sorted_labels, query)
+        end = start
+        while end < len(self.sorted_labels) and self.sorted_labels[end] == query:
+            end += 1
+        return self.__get_food_item_positions(self.sorted_label_rows[start:end]).tolist()
+
+    def score(self, text: str) -> np.ndarray:
+        """Score every food item by the trigram similarity of its best label to a text.
+
+        Parameters
+        ----------
+        text: str
+            The text to compare to
+
+        Returns
+        -------
+        np.ndarray
+            The float32 Dice coefficient of the trigram sets of the text and the best label of every food item, 1 for equal sets
+        """
+        query_trigrams = get_trigrams(normalize_query(text))
+        trigram_ids = [self.trigram_ids[trigram] for trigram in query_trigrams if trigram in self.trigram_ids]
+        if not trigram_ids:
+            return np.zeros(len(self.food_items), dtype=np.float32)
+        matched_rows = np.concatenate([self.trigram_rows[self.trigram_offsets[trigram_id]:self.trigram_offsets[trigram_id + 1]]
+                                       for trigram_id in trigram_ids])
+        overlaps = np.bincount(matched_rows, minlength=len(self.labels)).astype(np.float32)
+        label_scores = 2 * overlaps / (len(query_trigrams) + self.trigram_counts)
+        return np.maximum.reduceat(label_scores, self.food_item_offsets) if len(label_scores) else label_scores
+
+    def __get_food_item_positions(self, rows: np.ndarray) -> np.ndarray:
+        """Map ordered rows to the positions of their food items, keeping the first row of every food item.
+
+        Parameters
+        ----------
+        rows: np.ndarray
+            The rows, best first
+
+        Returns
+        -------
+        np.ndarray
+            The distinct food item positions, in the order of their best row
+        """
+        positions = self.food_item_positions[rows]
+        _, first_indices = np.unique(positions, return_index=True)
+        return positions[np.sort(first_indices)]
+
+    def __order_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Order rows by label length, then alphabetically.
+
+        Parameters
+        ----------
+        rows: np.ndarray
+            The rows to order
+
+        Returns
+        -------
+        np.ndarray
+            The ordered rows
+        """
+        return rows[np.lexsort((self.label_ranks[rows], self.label_lengths[rows]))]
+
+    def __get_prefix_range(self, sorted_texts: list[str], prefix: str) -> tuple[int, int]:
+        """Find the range of sorted texts starting with a prefix.
+
+        Parameters
+        ----------
+        sorted_texts: list[str]
+            The texts in sorted order
+        prefix: str
+            The prefix
+
+        Returns
+        -------
+        tuple[int, int]
+            The start and the end of the range
+        """
+        return bisect_left(sorted_texts, prefix), bisect_left(sorted_texts, prefix + PREFIX_RANGE_END)
+
+    def __build_postings(self, posting_lists: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+        """Flatten posting lists into one array of rows and the offsets of every list.
+
+        Parameters
+        ----------
+        posting_lists: list[list[int]]
+            The rows of every key, in key order
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The offsets, list i is rows[offsets[i]:offsets[i + 1]], and the rows
+        """
+        offsets = np.zeros(len(posting_lists) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(posting_list) for posting_list in posting_lists])
+        rows = np.fromiter((row for posting_list in posting_lists for row in posting_list), dtype=np.int64, count=int(offsets[-1]))
+        return offsets, rows
+
+
+lexical_index_lock = threading.Lock()
+lexical_index_by_version: dict[str, LexicalIndex] = {}
+
+
+def get_lexical_index(catalog: Catalog) -> LexicalIndex:
+    """Get the LexicalIndex over the labels of a Catalog snapshot, built once per catalog version.
+
+    Parameters
+    ----------
+    catalog: Catalog
+        The Catalog snapshot, the rows of the index follow the order of its food items
+
+    Returns
+    -------
+    LexicalIndex
+        The LexicalIndex
+    """
+    lexical_index = lexical_index_by_version.get(catalog.version)
+    if lexical_index is None:
+        with lexical_index_lock:
+            lexical_index = lexical_index_by_version.get(catalog.version)
+            if lexical_index is None:
+                lexical_index = LexicalIndex(list(catalog.food_items_by_food_item_uri.values()))
+                # only the current version is kept, a reload or an update replaces it
+                lexical_index_by_version.clear()
+                lexical_index_by_version[catalog.version] = lexical_index
+    return lexical_index
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+
+
+class LruCache:
+    """A thread-safe, size-bounded least recently used cache that counts its hits and misses.
+
+    Attributes
+    ----------
+    max_size: int
+        The maximum number of entries, the least recently used entry is evicted first
+    hits: int
+        The number of lookups that found an entry
+    misses: int
+        The number of lookups that found nothing
+    """
+
+    def __init__(self, max_size: int):
+        """Create an empty LruCache.
+
+        Parameters
+        ----------
+        max_size: int
+            The maximum number of entries, 0 disables the cache
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Look up an entry and mark it as most recently used.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key of the entry
+
+        Returns
+        -------
+        Optional[Any]
+            The cached value, None if there is no entry for the key
+        """
+        with self.__lock:
+            if key not in self.__entries:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return self.__entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Add or replace an entry, evicting the least recently used entries beyond max_size.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key of the entry
+        value: Any
+            The value to cache
+        """
+        if self.max_size <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries, the hit and miss counts are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
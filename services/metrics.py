@@ -0,0 +1,285 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Optional
+from services.constants import METRICS_ENABLED
+import threading
+import time
+
+# Type hints
+Labels = tuple[str, ...]
+MetricSample = tuple[str, dict[str, str], float] # name suffix, e.g. '_bucket', labels and value
+MetricFamily = tuple[str, str, str, list[MetricSample]] # name, type, help and samples
+
+# Constants
+LATENCY_BUCKETS_SECONDS: list[float] = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                                        0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+METRIC_TYPE_COUNTER: str = 'counter'
+METRIC_TYPE_GAUGE: str = 'gauge'
+METRIC_TYPE_HISTOGRAM: str = 'histogram'
+PROMETHEUS_CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+SERVER_TIMING_TOTAL: str = 'total'
+
+
+class Histogram:
+    """A Histogram counts observations, e.g. latencies, in cumulative buckets per combination of label values.
+
+    Attributes
+    ----------
+    name: str
+        The metric name
+    documentation: str
+        The help text of the metric
+    label_names: Labels
+        The names of the labels every observation is made with
+    buckets: list[float]
+        The upper bounds of the buckets, in increasing order
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Labels,
+                 buckets: list[float] = LATENCY_BUCKETS_SECONDS):
+        """Create an empty Histogram.
+
+        Parameters
+        ----------
+        name: str
+            The metric name
+        documentation: str
+            The help text of the metric
+        label_names: Labels
+            The names of the labels every observation is made with
+        buckets: list[float]
+            The upper bounds of the buckets, in increasing order
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # per combination of label values: the count of every bucket (the last one is +Inf) and the sum
+        self.__counts: dict[Labels, list[int]] = {}
+        self.__sums: dict[Labels, float] = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, label_values: Labels, value: float) -> None:
+        """Count an observation in the first bucket it fits in.
+
+        Parameters
+        ----------
+        label_values: Labels
+            The value of every label, in the order of label_names
+        value: float
+            The observed value
+        """
+        bucket = bisect_left(self.buckets, value)
+        with self.__lock:
+            counts = self.__counts.get(label_values)
+            if counts is None:
+                counts = self.__counts[label_values] = [0] * (len(self.buckets) + 1)
+                self.__sums[label_values] = 0.0
+            counts[bucket] += 1
+            self.__sums[label_values] += value
+
+    def collect(self) -> MetricFamily:
+        """Get the cumulative bucket counts, the sum and the count of every combination of label values.
+
+        Returns
+        -------
+        MetricFamily
+            The name, type, help text and samples of the buckets, the sum and the count
+        """
+        with self.__lock:
+            snapshot = [(label_values, list(counts), self.__sums[label_values]) for label_values, counts in self.__counts.items()]
+        samples: list[MetricSample] = []
+        for label_values, counts, total in sorted(snapshot):
+            labels = dict(zip(self.label_names, label_values))
+            cumulative_count = 0
+            for upper_bound, count in zip([str(bucket) for bucket in self.buckets] + ['+Inf'], counts):
+                cumulative_count += count
+                samples.append(('_bucket', {**labels, 'le': upper_bound}, cumulative_count))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative_count))
+        return self.name, METRIC_TYPE_HISTOGRAM, self.documentation, samples
+
+
+class RequestTimings:
+    """The RequestTimings collect the time spent in every stage of one request, e.g. for the Server-Timing header.
+
+    Attributes
+    ----------
+    endpoint: str
+        The endpoint of the request, stages are reported under it
+    started_at: float
+        The perf_counter time the request started at
+    durations_seconds: dict[str, float]
+        The total duration of every stage, a stage entered several times is summed
+    """
+
+    def __init__(self, endpoint: str):
+        """Start timing a request.
+
+        Parameters
+        ----------
+        endpoint: str
+            The endpoint of the request
+        """
+        self.endpoint = endpoint
+        self.started_at = time.perf_counter()
+        self.durations_seconds: dict[str, float] = {}
+
+
+class StageTimer:
+    """A context manager that records the duration of a stage of the hot path.
+    """
+
+    def __init__(self, stage: str):
+        """Create a StageTimer, the clock starts when the block is entered.
+
+        Parameters
+        ----------
+        stage: str
+            The name of the stage, e.g. 'encode'
+        """
+        self.stage = stage
+        self.started_at = 0.0
+
+    def __enter__(self) -> 'StageTimer':
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception_info: Any) -> None:
+        record_stage(self.stage, time.perf_counter() - self.started_at)
+
+
+class NullStageTimer:
+    """A context manager that does nothing, handed out instead of a StageTimer when metrics are disabled.
+    """
+
+    def __enter__(self) -> 'NullStageTimer':
+        return self
+
+    def __exit__(self, *exception_info: Any) -> None:
+        pass
+
+
+null_stage_timer = NullStageTimer()
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+stage_duration_histogram = Histogram('food_retriever_stage_duration_seconds',
+                                     'Latency of the stages of the hot path, by endpoint and stage.', ('endpoint', 'stage'))
+request_duration_histogram = Histogram('food_retriever_request_duration_seconds',
+                                       'Latency of the requests, by endpoint and status code.', ('endpoint', 'status'))
+collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+
+def measure_stage(stage: str) -> Any:
+    """Time a block as a stage of the hot path: `with measure_stage('encode'): ...`.
+
+    Parameters
+    ----------
+    stage: str
+        The name of the stage
+
+    Returns
+    -------
+    Any
+        A StageTimer, or a shared no-op context manager when metrics are disabled
+    """
+    return StageTimer(stage) if METRICS_ENABLED else null_stage_timer
+
+
+def record_stage(stage: str, duration_seconds: float) -> None:
+    """Record the duration of a stage in the stage histogram and in the timings of the current request.
+
+    Parameters
+    ----------
+    stage: str
+        The name of the stage
+    duration_seconds: float
+        How long the stage took
+    """
+    timings = request_timings.get()
+    stage_duration_histogram.observe((timings.endpoint if timings is not None else '', stage), duration_seconds)
+    if timings is not None:
+        timings.durations_seconds[stage] = timings.durations_seconds.get(stage, 0.0) + duration_seconds
+
+
+def start_request_timing(endpoint: str) -> None:
+    """Start collecting the stage timings of the request handled in the current context.
+
+    Parameters
+    ----------
+    endpoint: str
+        The endpoint of the request
+    """
+    request_timings.set(RequestTimings(endpoint))
+
+
+def finish_request_timing(status_code: int) -> Optional[str]:
+    """Record the duration of the request handled in the current context and stop collecting its timings.
+
+    Parameters
+    ----------
+    status_code: int
+        The HTTP status code of the response
+
+    Returns
+    -------
+    Optional[str]
+        The value of the Server-Timing header, the stages and the total in milliseconds,
+        None when no request timing was started
+    """
+    timings = request_timings.get()
+    if timings is None:
+        return None
+    request_timings.set(None)
+    duration_seconds = time.perf_counter() - timings.started_at
+    request_duration_histogram.observe((timings.endpoint, str(status_code)), duration_seconds)
+    return ', '.join('{};dur={:.3f}'.format(stage, stage_duration_seconds * 1000) for stage, stage_duration_seconds
+                     in list(timings.durations_seconds.items()) + [(SERVER_TIMING_TOTAL, duration_seconds)])
+
+
+def register_collector(collector: Callable[[], Iterable[MetricFamily]]) -> None:
+    """Add a function that reports metrics when they are rendered, e.g. counters a service already keeps.
+
+    Parameters
+    ----------
+    collector: Callable[[], Iterable[MetricFamily]]
+        Returns the name, type ('counter' or 'gauge'), help text and samples of every metric
+    """
+    collectors.append(collector)
+
+
+def escape_label_value(label_value: str) -> str:
+    """Escape a label value for the Prometheus text format.
+
+    Parameters
+    ----------
+    label_value: str
+        The label value
+
+    Returns
+    -------
+    str
+        The value with backslashes, double quotes and line feeds escaped
+    """
+    return label_value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics() -> str:
+    """Render the histograms and the metrics of all registered collectors in the Prometheus text format.
+
+    Returns
+    -------
+    str
+        The metrics, see https://prometheus.io/docs/instrumenting/exposition_formats/
+    """
+    metric_families: list[MetricFamily] = [stage_duration_histogram.collect(), request_duration_histogram.collect()]
+    for collector in collectors:
+        metric_families.extend(collector())
+    lines = []
+    for name, metric_type, documentation, samples in metric_families:
+        lines.append('# HELP {} {}'.format(name, documentation))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for suffix, labels, value in samples:
+            rendered_labels = ','.join('{}="{}"'.format(label_name, escape_label_value(str(label_value)))
+                                       for label_name, label_value in labels.items())
+            lines.append('{}{}{} {}'.format(name, suffix, '{' + rendered_labels + '}' if rendered_labels else '', repr(float(value))))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,211 @@
+from services.similarity_index import SIMILARITY_INDEX_DIR_PATH, compute_norms, fingerprint_embeddings, select_top_k
+import copy
+import os
+
+import numpy as np
+
+# Constants
+NEIGHBOR_TABLE_BLOCK_SIZE: int = 1024
+
+
+class NeighborTable:
+    """The NeighborTable holds the exact top-k most cosine similar catalog items of every catalog item.
+
+    The table is computed with blocked matrix multiplies, so looking up the neighbors of a
+    catalog item is an array lookup instead of a model forward pass and a similarity scan.
+
+    Attributes
+    ----------
+    top_k: int
+        The number of neighbors per item, the item itself included
+    indices: np.ndarray
+        The (items x top_k) int32 neighbor indexes, most similar first
+    scores: np.ndarray
+        The (items x top_k) float32 cosine similarities of the neighbors
+    """
+
+    def __init__(self, top_k: int):
+        """Create an empty NeighborTable.
+
+        Parameters
+        ----------
+        top_k: int
+            The number of neighbors per item, the item itself included
+        """
+        self.top_k = top_k
+        self.indices: np.ndarray = np.zeros((0, top_k), dtype=np.int32)
+        self.scores: np.ndarray = np.zeros((0, top_k), dtype=np.float32)
+
+    def build(self, embeddings: np.ndarray, block_size: int = NEIGHBOR_TABLE_BLOCK_SIZE) -> None:
+        """Compute the neighbors of every item, one block of rows at a time.
+
+        Parameters
+        ----------
+        embeddings: np.ndarray
+            The (items x dimension) embedding matrix
+        block_size: int
+            The number of rows scored per matrix multiply, bounds the memory to block_size x items scores
+        """
+        item_count = embeddings.shape[0]
+        top_k = min(self.top_k, item_count)
+        norms = compute_norms(embeddings)
+        self.indices = np.zeros((item_count, top_k), dtype=np.int32)
+        self.scores = np.zeros((item_count, top_k), dtype=np.float32)
+        for start in range(0, item_count, block_size):
+            block = np.asarray(embeddings[start:start + block_size], dtype=np.float32) / norms[start:start + block_size, None]
+            block_scores = (block @ embeddings.T) / norms
+            block_indices = select_top_k(block_scores, top_k)
+            self.indices[start:start + block_size] = block_indices
+            self.scores[start:start + block_size] = np.take_along_axis(block_scores, block_indices, axis=1)
+
+    def update(self, embeddings: np.ndarray, kept_rows: np.ndarray, block_size: int = NEIGHBOR_TABLE_BLOCK_SIZE) -> 'NeighborTable':
+        """Create a table for an updated embedding matrix, only recomputing what the update affects.
+
+        New and changed items, and items that lose a neighbor, are recomputed with a full scan.
+        Every other item keeps its neighbors, merged with the new and changed items that beat them,
+        so the work is proportional to the number of changed items. The table itself is not modified.
+
+        Parameters
+        ----------
+        embeddings: np.ndarray
+            The updated (items x dimension) embedding matrix
+        kept_rows: np.ndarray
+            The row of every updated item in the current table, -1 for new or changed items
+        block_size: int
+            The number of rows scored per matrix multiply
+
+        Returns
+        -------
+        NeighborTable
+            The updated NeighborTable
+        """
+        item_count = embeddings.shape[0]
+        top_k = min(self.top_k, item_count)
+        neighbor_table = copy.copy(self)
+        if self.indices.shape[1] != top_k:
+            neighbor_table.build(embeddings, block_size)
+            return neighbor_table
+        new_row_by_previous_row = np.full(self.indices.shape[0], -1, dtype=np.int64)
+        kept = kept_rows >= 0
+        new_row_by_previous_row[kept_rows[kept]] = np.flatnonzero(kept)
+        changed_rows = np.flatnonzero(~kept)
+
+        indices = np.zeros((item_count, top_k), dtype=np.int64)
+        scores = np.zeros((item_count, top_k), dtype=np.float32)
+        indices[kept] = new_row_by_previous_row[self.indices[kept_rows[kept]]]
+        scores[kept] = self.scores[kept_rows[kept]]
+        recomputed = ~kept | np.any(indices < 0, axis=1)
+
+        norms = compute_norms(np.asarray(embeddings, dtype=np.float32))
+        merged_rows = np.flatnonzero(~recomputed)
+        if len(changed_rows) and len(merged_rows):
+            changed_block = np.asarray(embeddings[changed_rows], dtype=np.float32) / norms[changed_rows, None]
+            for start in range(0, len(merged_rows), block_size):
+                rows = merged_rows[start:start + block_size]
+                block = np.asarray(embeddings[rows], dtype=np.float32) / norms[rows, None]
+                candidate_scores = np.concatenate([scores[rows], block @ changed_block.T], axis=1)
+                candidate_indices = np.concatenate([indices[rows], np.broadcast_to(changed_rows, (len(rows), len(changed_rows)))], axis=1)
+                positions = select_top_k(candidate_scores, top_k)
+                scores[rows] = np.take_along_axis(candidate_scores, positions, axis=1)
+                indices[rows] = np.take_along_axis(candidate_indices, positions, axis=1)
+        recomputed_rows = np.flatnonzero(recomputed)
+        for start in range(0, len(recomputed_rows), block_size):
+            rows = recomputed_rows[start:start + block_size]
+            block_scores = (np.asarray(embeddings[rows], dtype=np.float32) / norms[rows, None] @ embeddings.T) / norms
+            block_indices = select_top_k(block_scores, top_k)
+            indices[rows] = block_indices
+            scores[rows] = np.take_along_axis(block_scores, block_indices, axis=1)
+        neighbor_table.indices = indices.astype(np.int32)
+        neighbor_table.scores = scores
+        return neighbor_table
+
+    def save(self, table_file_path: str) -> None:
+        """Save the table.
+
+        Parameters
+        ----------
+        table_file_path: str
+            The `.npz` file to save to
+        """
+        np.savez(table_file_path, indices=self.indices, scores=self.scores)
+
+    def load(self, table_file_path: str) -> None:
+        """Load a table saved by `save`.
+
+        Parameters
+        ----------
+        table_file_path: str
+            The `.npz` file to load from
+        """
+        with np.load(table_file_path) as table_file:
+            self.indices = table_file['indices']
+            self.scores = table_file['scores']
+
+    def get_neighbors(self, index: int, top_k: int) -> list[int]:
+        """Get the top_k neighbors of an item.
+
+        Parameters
+        ----------
+        index: int
+            The index of the item
+        top_k: int
+            The number of neighbors, at most the top_k the table was built with
+
+        Returns
+        -------
+        list[int]
+            The indexes of the neighbors, most similar first
+        """
+        return self.indices[index, :top_k].tolist()
+
+
+def load_or_build_neighbor_table(embeddings: np.ndarray, top_k: int,
+                                 table_dir_path: str = SIMILARITY_INDEX_DIR_PATH) -> NeighborTable:
+    """Load a saved NeighborTable for these embeddings, or build and save a new one.
+
+    Parameters
+    ----------
+    embeddings: np.ndarray
+        The embedding matrix
+    top_k: int
+        The number of neighbors per item, the item itself included
+    table_dir_path: str
+        The directory saved tables are kept in
+
+    Returns
+    -------
+    NeighborTable
+        The built NeighborTable
+    """
+    neighbor_table = NeighborTable(top_k)
+    table_file_path = os.path.join(table_dir_path, 'neighbors-{}.npz'.format(
+        fingerprint_embeddings(embeddings, top_k=top_k)))
+    if os.path.exists(table_file_path):
+        try:
+            neighbor_table.load(table_file_path)
+            if neighbor_table.indices.shape[0] == embeddings.shape[0]:
+                return neighbor_table
+        except (OSError, ValueError, KeyError):
+            pass
+    neighbor_table.build(embeddings)
+    try:
+        os.makedirs(table_dir_path, exist_ok=True)
+        neighbor_table.save(table_file_path)
+    except OSError:
+        pass
+    return neighbor_table
+
+
+if __name__ == '__main__':
+    # Build the neighbor table offline, so the app loads it at startup: python -m services.neighbor_table
+    from services.catalog_service import get_catalog
+    from services.constants import EMBEDDER_MODEL_NAME, NEIGHBOR_TABLE_TOP_K
+    from services.embedder_service import get_embedder, get_embedder_revision
+    from services.embedding_store import EmbeddingStore
+    from models.food_labels import FoodLabels
+
+    food_items = list(get_catalog().food_items_by_food_item_uri.values())
+    # the store keeps one generation, embedding only the first labels would drop the other labels the services use
+    label_embeddings = EmbeddingStore(EMBEDDER_MODEL_NAME, get_embedder_revision()).get_embeddings(FoodLabels(food_items).labels, get_embedder())
+    # the first len(food_items) rows are the first labels, the ones the recommender compares food items by
+    load_or_build_neighbor_table(label_embeddings[:len(food_items)], NEIGHBOR_TABLE_TOP_K)
@@ -0,0 +1,329 @@
+from typing import Optional
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from services.pagination import DEFAULT_PAGE_SIZE, ERROR_MESSAGE_INVALID_CURSOR, ERROR_MESSAGE_INVALID_PAGE_SIZE, MAX_PAGE_SIZE, \
+    PaginationException, decode_cursor, encode_cursor
+from bisect import bisect_right
+import json
+import math
+import re
+import threading
+
+import numpy as np
+
+# Constants
+ERROR_MESSAGE_AMBIGUOUS_NUTRIENT: str = 'Ambiguous nutrient {}, expected one of {}.'
+ERROR_MESSAGE_INVALID_PREDICATE: str = 'Invalid filter {}, expected e.g. "protein, total > 20 g".'
+ERROR_MESSAGE_INVALID_UNIT: str = 'Invalid unit {} for nutrient {}, expected {}.'
+ERROR_MESSAGE_TOO_MANY_PREDICATES: str = 'Invalid filter, expected at most {} predicates.'
+ERROR_MESSAGE_UNKNOWN_NUTRIENT: str = 'Unknown nutrient {}.'
+MAX_PREDICATES: int = 20
+PREDICATE_SEPARATOR_PATTERN: re.Pattern = re.compile(r'\s+and\s+', re.IGNORECASE)
+PREDICATE_PATTERN: re.Pattern = re.compile(
+    r'^\s*(?P<nutrient>.+?)\s*(?P<operator><=|>=|<|>|=)\s*(?P<value>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(?P<unit>\S+)?\s*$')
+SORT_DESCENDING_PREFIX: str = '-'
+# every unit a predicate may be given in, with its base unit and its value in the base unit
+UNIT_FACTORS: dict[str, tuple[str, float]] = {
+    'g': ('g', 1.0),
+    'mg': ('g', 1e-3),
+    'ug': ('g', 1e-6),
+    'µg': ('g', 1e-6),
+    'mcg': ('g', 1e-6),
+    'kcal': ('kcal', 1.0),
+    'kj': ('kcal', 1 / 4.184),
+}
+
+
+class NutrientIndexException(Exception):
+    """An Exception in a nutrient filter, do nothing.
+    """
+    pass
+
+
+class NutrientPredicate:
+    """A NutrientPredicate selects the food items whose amount of a nutrient lies in a range.
+
+    Attributes
+    ----------
+    column: int
+        The column of the nutrient in the NutrientMatrix
+    operator: str
+        '<', '<=', '>', '>=' or '='
+    value: float
+        The bound, in the unit of the nutrient column
+    """
+    __slots__ = ('column', 'operator', 'value')
+
+    def __init__(self, column: int, operator: str, value: float):
+        """Create a NutrientPredicate.
+
+        Parameters
+        ----------
+        column: int
+            The column of the nutrient in the NutrientMatrix
+        operator: str
+            '<', '<=', '>', '>=' or '='
+        value: float
+            The bound, in the unit of the nutrient column
+        """
+        self.column = column
+        self.operator = operator
+        self.value = value
+
+
+class NutrientIndex:
+    """The NutrientIndex answers range filters on the nutrient amounts of a Catalog snapshot without scanning them.
+
+    Food items are identified by their position in the sorted food item URIs of the catalog. Every
+    nutrient has a sorted column: the positions of the food items with an amount of it, ordered by
+    amount. A predicate is two binary searches in its column and yields a slice of positions; the
+    slices of several predicates are intersected, smallest first, through a membership bitmap.
+
+    Attributes
+    ----------
+    catalog: Catalog
+        The Catalog snapshot the index is built from
+    values: np.ndarray
+        The (food items x nutrients) amounts by position, NaN where a food item has no amount
+    sorted_positions: list[np.ndarray]
+        Per nutrient column, the positions of the food items with an amount, by amount then URI
+    sorted_values: list[np.ndarray]
+        Per nutrient column, the amounts in the order of sorted_positions
+    """
+
+    def __init__(self, catalog: Catalog):
+        """Build the index.
+
+        Parameters
+        ----------
+        catalog: Catalog
+            The Catalog snapshot
+        """
+        self.catalog = catalog
+        nutrient_matrix = catalog.nutrient_matrix
+        rows = np.array([nutrient_matrix.row_by_food_item_uri.get(food_item_uri, -1)
+                         for food_item_uri in catalog.sorted_food_item_uris], dtype=np.int64)
+        has_row = rows >= 0
+        self.values = np.full((len(rows), len(nutrient_matrix.nutrient_uris)), np.nan, dtype=np.float64)
+        self.values[has_row] = np.where(nutrient_matrix.present[rows[has_row]], nutrient_matrix.values[rows[has_row]], np.nan)
+        self.sorted_positions: list[np.ndarray] = []
+        self.sorted_values: list[np.ndarray] = []
+        for column in range(self.values.shape[1]):
+            positions = np.flatnonzero(~np.isnan(self.values[:, column]))
+            # positions are in URI order, a stable sort breaks ties in amount by URI
+            positions = positions[np.argsort(self.values[positions, column], kind='stable')]
+            self.sorted_positions.append(positions)
+            self.sorted_values.append(self.values[positions, column])
+        self.__columns_by_nutrient_label = {}
+        for column, nutrient_label in enumerate(nutrient_matrix.nutrient_labels):
+            self.__columns_by_nutrient_label.setdefault(nutrient_label.lower(), []).append(column)
+
+    def get_column(self, nutrient_name: str) -> int:
+        """Find the column of a nutrient by URI or label, case insensitive, or by the first words of its label.
+
+        Parameters
+        ----------
+        nutrient_name: str
+            A Nutrient URI, a nutrient label, e.g. 'protein, total', or the start of a label, e.g. 'protein'
+
+        Returns
+        -------
+        int
+            The column of the nutrient
+        """
+        nutrient_matrix = self.catalog.nutrient_matrix
+        column = nutrient_matrix.column_by_nutrient_uri.get(nutrient_name)
+        if column is not None:
+            return column
+        nutrient_labels = nutrient_matrix.nutrient_labels
+        prefix = nutrient_name.strip().lower()
+        columns = self.__columns_by_nutrient_label.get(prefix) \
+            or [column for column, nutrient_label in enumerate(nutrient_labels)
+                if nutrient_label.lower().startswith(prefix) and nutrient_label[len(prefix):len(prefix) + 1] in (',', ' ')]
+        if not columns:
+            raise NutrientIndexException(ERROR_MESSAGE_UNKNOWN_NUTRIENT.format(nutrient_name))
+        if len(columns) > 1:
+            raise NutrientIndexException(ERROR_MESSAGE_AMBIGUOUS_NUTRIENT.format(
+                nutrient_name, ', '.join(nutrient_labels[column] for column in columns)))
+        return columns[0]
+
+    def parse_predicates(self, expressions: list[str]) -> list[NutrientPredicate]:
+        """Parse filter expressions like 'protein > 20 g and sugars < 5 g' into predicates.
+
+        Parameters
+        ----------
+        expressions: list[str]
+            The expressions, each one or more comparisons joined by 'and'; a comparison is a nutrient,
+            an operator ('<', '<=', '>', '>=' or '='), a number and optionally a unit, e.g. 'mg' or 'kJ'
+
+        Returns
+        -------
+        list[NutrientPredicate]
+            The predicates, bounds converted to the units of the nutrients
+        """
+        comparisons = [comparison for expression in expressions for comparison in PREDICATE_SEPARATOR_PATTERN.split(expression.strip())
+                       if comparison]
+        if len(comparisons) > MAX_PREDICATES:
+            raise NutrientIndexException(ERROR_MESSAGE_TOO_MANY_PREDICATES.format(MAX_PREDICATES))
+        predicates = []
+        for comparison in comparisons:
+            match = PREDICATE_PATTERN.match(comparison)
+            if match is None or not math.isfinite(float(match.group('value'))):
+                raise NutrientIndexException(ERROR_MESSAGE_INVALID_PREDICATE.format(comparison))
+            column = self.get_column(match.group('nutrient'))
+            value = float(match.group('value'))
+            if match.group('unit') is not None:
+                value *= self.__get_unit_factor(match.group('unit'), column)
+            predicates.append(NutrientPredicate(column, match.group('operator'), value))
+        return predicates
+
+    def filter(self, predicates: list[NutrientPredicate]) -> np.ndarray:
+        """Find the food items matching every predicate, a food item without an amount of a nutrient never matches it.
+
+        Parameters
+        ----------
+        predicates: list[NutrientPredicate]
+            The predicates
+
+        Returns
+        -------
+        np.ndarray
+            The positions of the matching food items, in URI order
+        """
+        if not predicates:
+            return np.arange(len(self.catalog.sorted_food_item_uris))
+        matches = []
+        for predicate in predicates:
+            sorted_values = self.sorted_values[predicate.column]
+            start, end = 0, len(sorted_values)
+            if predicate.operator in ('>', '>=', '='):
+                start = int(np.searchsorted(sorted_values, predicate.value, side='right' if predicate.operator == '>' else 'left'))
+            if predicate.operator in ('<', '<=', '='):
+                end = int(np.searchsorted(sorted_values, predicate.value, side='left' if predicate.operator == '<' else 'right'))
+            matches.append(self.sorted_positions[predicate.column][start:max(start, end)])
+        matches.sort(key=len)
+        positions = matches[0]
+        member = np.zeros(len(self.catalog.sorted_food_item_uris), dtype=np.bool_)
+        for other_positions in matches[1:]:
+            if len(positions) == 0:
+                break
+            member[other_positions] = True
+            positions = positions[member[positions]]
+            member[other_positions] = False
+        return np.sort(positions)
+
+    def get_page(self, predicates: list[NutrientPredicate], sort: Optional[str] = None, cursor: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_SIZE) -> tuple[list[FoodItem], int, Optional[str]]:
+        """Get a page of the food items matching every predicate.
+
+        The cursor holds the sort key of the last food item of the previous page, not a position,
+        so it stays valid when food items are added or removed by a catalog reload.
+
+        Parameters
+        ----------
+        predicates: list[NutrientPredicate]
+            The predicates
+        sort: Optional[str]
+            A nutrient to sort by, in increasing amount or decreasing with a '-' prefix, food items
+            without an amount of it come last; None sorts by URI. Ties are sorted by URI.
+        cursor: Optional[str]
+            The cursor returned with the previous page, None for the first page
+        limit: int
+            The maximum number of food items of the page
+
+        Returns
+        -------
+        tuple[list[FoodItem], int, Optional[str]]
+            The food items of the page, the number of matching food items and the cursor of the
+            next page, None after the last page
+        """
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise PaginationException(ERROR_MESSAGE_INVALID_PAGE_SIZE.format(MAX_PAGE_SIZE))
+        positions = self.filter(predicates)
+        sorted_food_item_uris = self.catalog.sorted_food_item_uris
+        # the sort key of a food item is (has no amount, signed amount, URI), the URI order is the position order
+        missing = np.zeros(len(positions), dtype=np.bool_)
+        signed_amounts = np.zeros(len(positions), dtype=np.float64)
+        if sort:
+            descending = sort.startswith(SORT_DESCENDING_PREFIX)
+            amounts = self.values[positions, self.get_column(sort[len(SORT_DESCENDING_PREFIX):] if descending else sort)]
+            missing = np.isnan(amounts)
+            signed_amounts = np.where(missing, 0.0, -amounts if descending else amounts)
+            order = np.lexsort((positions, signed_amounts, missing))
+            positions, missing, signed_amounts = positions[order], missing[order], signed_amounts[order]
+        start = 0
+        if cursor is not None:
+            try:
+                cursor_missing, cursor_amount, cursor_food_item_uri = json.loads(decode_cursor(cursor))
+                cursor_missing, cursor_amount, cursor_food_item_uri = bool(cursor_missing), float(cursor_amount), str(cursor_food_item_uri)
+            except (TypeError, ValueError):
+                raise PaginationException(ERROR_MESSAGE_INVALID_CURSOR)
+            cursor_position = bisect_right(sorted_food_item_uris, cursor_food_item_uri)
+            # the food items sorted up to the cursor, their count is where the page starts
+            same_amount = (missing == cursor_missing) & (signed_amounts == cursor_amount)
+            start = int(np.count_nonzero((missing < cursor_missing)
+                                         | ((missing == cursor_missing) & (signed_amounts < cursor_amount))
+                                         | (same_amount & (positions < cursor_position))))
+        page_positions = positions[start:start + limit]
+        next_cursor = None
+        if len(page_positions) and start + limit < len(positions):
+            last = start + limit - 1
+            next_cursor = encode_cursor(json.dumps([bool(missing[last]), float(signed_amounts[last]),
+                                                    sorted_food_item_uris[positions[last]]]))
+        food_items_by_food_item_uri = self.catalog.food_items_by_food_item_uri
+        return [food_items_by_food_item_uri[sorted_food_item_uris[position]] for position in page_positions.tolist()], \
+            len(positions), next_cursor
+
+    def __get_unit_factor(self, unit: str, column: int) -> float:
+        """Get the factor converting an amount in a unit to the unit of a nutrient column.
+
+        Parameters
+        ----------
+        unit: str
+            The unit of the amount, e.g. 'mg'
+        column: int
+            The nutrient column
+
+        Returns
+        -------
+        float
+            The factor
+        """
+        nutrient_matrix = self.catalog.nutrient_matrix
+        column_unit = nutrient_matrix.units[column]
+        if unit.lower() == column_unit.lower():
+            return 1.0
+        base_unit, factor = UNIT_FACTORS.get(unit.lower(), ('', 0.0))
+        column_base_unit, column_factor = UNIT_FACTORS.get(column_unit.lower(), (column_unit, 1.0))
+        if base_unit != column_base_unit:
+            raise NutrientIndexException(ERROR_MESSAGE_INVALID_UNIT.format(unit, nutrient_matrix.nutrient_labels[column], column_unit))
+        return factor / column_factor
+
+
+nutrient_index_lock = threading.Lock()
+nutrient_index_by_version: dict[str, NutrientIndex] = {}
+
+
+def get_nutrient_index(catalog: Catalog) -> NutrientIndex:
+    """Get the NutrientIndex of a Catalog snapshot, built once per catalog version.
+
+    Parameters
+    ----------
+    catalog: Catalog
+        The Catalog snapshot
+
+    Returns
+    -------
+    NutrientIndex
+        The NutrientIndex
+    """
+    nutrient_index = nutrient_index_by_version.get(catalog.version)
+    if nutrient_index is None:
+        with nutrient_index_lock:
+            nutrient_index = nutrient_index_by_version.get(catalog.version)
+            if nutrient_index is None:
+                nutrient_index = NutrientIndex(catalog)
+                # only the current version is kept, a reload or an update replaces it
+                nutrient_index_by_version.clear()
+                nutrient_index_by_version[catalog.version] = nutrient_index
+    return nutrient_index
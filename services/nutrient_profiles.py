@@ -0,0 +1,61 @@
+from typing import Any, Collection, Optional
+import math
+
+# Constants
+ERROR_MESSAGE_INVALID_WEIGHTS: str = 'Invalid nutrient weights, expected an object of at most {} nutrient labels and finite numbers.'
+ERROR_MESSAGE_UNKNOWN_PROFILE: str = 'Unknown nutrient profile {}, expected one of {}.'
+ERROR_MESSAGE_UNKNOWN_NUTRIENT_LABELS: str = 'Unknown nutrient labels {}, expected labels of the nutrients in the catalog.'
+MAX_NUTRIENT_WEIGHTS: int = 100
+# every profile overrides the default weights of the recommender, a weight of 0 ignores a nutrient
+NUTRIENT_PROFILES: dict[str, dict[str, float]] = {
+    'default': {},
+    'low-sugar': {'sugars, total': -3, 'carbohydrate': -2},
+    'high-protein': {'protein, total': 3},
+    'low-sodium': {'sodium': -3},
+    'low-fat': {'fat, total': -3, 'fatty acids, total saturated': -3, 'fatty acids, total trans': -3},
+    'high-fibre': {'fibre, total dietary': 3},
+    'low-energy': {'energy kcal, total metabolisable': -3},
+}
+
+
+class NutrientProfileException(Exception):
+    """An Exception for an unknown nutrient profile or invalid nutrient weights, do nothing.
+    """
+    pass
+
+
+def get_nutrient_weights(profile_name: Optional[str], weights: Optional[Any] = None,
+                         nutrient_labels: Optional[Collection[str]] = None) -> dict[str, float]:
+    """Combine a named profile and custom weights into the weights that override the default ones.
+
+    Parameters
+    ----------
+    profile_name: Optional[str]
+        The name of a profile in NUTRIENT_PROFILES, None for the default profile
+    weights: Optional[Any]
+        Custom weights by nutrient label, they take precedence over the weights of the profile
+    nutrient_labels: Optional[Collection[str]]
+        The nutrient labels of the catalog, a custom weight for any other label is rejected instead of being ignored,
+        None accepts every label
+
+    Returns
+    -------
+    dict[str, float]
+        The weight of every overridden nutrient label, empty for the default weights
+    """
+    profile_name = profile_name or 'default'
+    if not isinstance(profile_name, str) or profile_name not in NUTRIENT_PROFILES:
+        raise NutrientProfileException(ERROR_MESSAGE_UNKNOWN_PROFILE.format(profile_name, ', '.join(NUTRIENT_PROFILES)))
+    nutrient_weights = dict(NUTRIENT_PROFILES[profile_name])
+    if weights is None:
+        return nutrient_weights
+    if not isinstance(weights, dict) or len(weights) > MAX_NUTRIENT_WEIGHTS \
+            or not all(isinstance(weight, (int, float)) and not isinstance(weight, bool) and math.isfinite(weight)
+                       for weight in weights.values()):
+        raise NutrientProfileException(ERROR_MESSAGE_INVALID_WEIGHTS.format(MAX_NUTRIENT_WEIGHTS))
+    if nutrient_labels is not None:
+        unknown_nutrient_labels = [str(nutrient_label) for nutrient_label in weights if nutrient_label not in nutrient_labels]
+        if unknown_nutrient_labels:
+            raise NutrientProfileException(ERROR_MESSAGE_UNKNOWN_NUTRIENT_LABELS.format(', '.join(unknown_nutrient_labels)))
+    nutrient_weights.update({str(nutrient_label): float(weight) for nutrient_label, weight in weights.items()})
+    return nutrient_weights
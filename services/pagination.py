@@ -0,0 +1,79 @@
+from bisect import bisect_right
+from typing import Optional, Sequence
+import base64
+import binascii
+
+# Constants
+DEFAULT_PAGE_SIZE: int = 100
+ERROR_MESSAGE_INVALID_CURSOR: str = 'Invalid cursor.'
+ERROR_MESSAGE_INVALID_PAGE_SIZE: str = 'Invalid limit, expected 1 to {}.'
+MAX_PAGE_SIZE: int = 1000
+
+
+class PaginationException(Exception):
+    """An Exception in the pagination of a listing, do nothing.
+    """
+    pass
+
+
+def encode_cursor(key: str) -> str:
+    """Encode the last key of a page into an opaque cursor.
+
+    Parameters
+    ----------
+    key: str
+        The last key of the page
+
+    Returns
+    -------
+    str
+        The URL safe cursor
+    """
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    """Decode a cursor into the last key of the previous page.
+
+    Parameters
+    ----------
+    cursor: str
+        The cursor returned with the previous page
+
+    Returns
+    -------
+    str
+        The last key of the previous page
+    """
+    try:
+        return base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationException(ERROR_MESSAGE_INVALID_CURSOR)
+
+
+def get_page(sorted_keys: Sequence[str], cursor: Optional[str], limit: int = DEFAULT_PAGE_SIZE) -> tuple[Sequence[str], Optional[str]]:
+    """Cut the page after a cursor out of a sorted sequence of keys.
+
+    The cursor is the last key of the previous page, not a position, so it stays valid when
+    keys are added or removed by a catalog reload.
+
+    Parameters
+    ----------
+    sorted_keys: Sequence[str]
+        The keys in sorted order
+    cursor: Optional[str]
+        The cursor returned with the previous page, None for the first page
+    limit: int
+        The maximum number of keys of the page
+
+    Returns
+    -------
+    tuple[Sequence[str], Optional[str]]
+        The keys of the page and the cursor of the next page, None after the last page
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PaginationException(ERROR_MESSAGE_INVALID_PAGE_SIZE.format(MAX_PAGE_SIZE))
+    start = 0 if cursor is None else bisect_right(sorted_keys, decode_cursor(cursor))
+    page = sorted_keys[start:start + limit]
+    next_cursor = encode_cursor(page[-1]) if page and start + limit < len(sorted_keys) else None
+    return page, next_cursor
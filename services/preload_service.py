@@ -0,0 +1,17 @@
+from services.warmup_service import wait_for_components
+import gc
+
+
+def prepare_for_fork() -> None:
+    """Freeze everything preloaded so far, so that pre-forked workers keep sharing its memory.
+
+    The master process builds the catalog, the model and the embeddings once. Forked workers share
+    those pages copy-on-write, but every garbage collection in a worker would write to the headers
+    of all tracked objects and so copy their pages. Moving the preloaded objects to the permanent
+    generation keeps the collector away from them. The embedding matrices themselves are memory
+    mapped from the embedding store, so their pages are shared through the page cache as well.
+    The background warmup is waited for first, so workers do not load the models again.
+    """
+    wait_for_components()
+    gc.collect()
+    gc.freeze()
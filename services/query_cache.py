@@ -0,0 +1,256 @@
+from typing import Any, Optional
+from services.lru_cache import LruCache
+import copy
+import os
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+# Constants
+SQLITE_TIMEOUT_SECONDS: float = 0.05
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so that trivially different spellings share cache entries.
+
+    Parameters
+    ----------
+    query: str
+        The raw search query
+
+    Returns
+    -------
+    str
+        The NFKC normalized, case folded query with collapsed whitespace
+    """
+    return ' '.join(unicodedata.normalize('NFKC', query).casefold().split())
+
+
+class QueryCache:
+    """The QueryCache caches query embeddings and final search results.
+
+    Query embeddings are kept in a bounded in-process LRU tier and, optionally, in a persistent
+    SQLite tier that all workers share. Embeddings are keyed by model, so a model change never
+    serves stale vectors. Search results are kept in-process only and keyed by the catalog
+    version, they are dropped when the version changes.
+
+    Attributes
+    ----------
+    model_key: str
+        The name and revision of the model the embeddings are computed with
+    catalog_version: str
+        The version of the data the cached results were computed on
+    persistent_cache_path: Optional[str]
+        The SQLite file of the persistent embedding tier, None when it is disabled
+    """
+
+    def __init__(self, model_key: str, catalog_version: str, max_embeddings: int, max_results: int,
+                 persistent_cache_path: Optional[str] = None):
+        """Create a QueryCache.
+
+        Parameters
+        ----------
+        model_key: str
+            The name and revision of the model the embeddings are computed with
+        catalog_version: str
+            The version of the data the results are computed on
+        max_embeddings: int
+            The size of the in-process embedding tier
+        max_results: int
+            The size of the in-process result tier
+        persistent_cache_path: Optional[str]
+            The SQLite file of the persistent embedding tier, None or '' to disable it
+        """
+        self.model_key = model_key
+        self.catalog_version = catalog_version
+        self.persistent_cache_path = persistent_cache_path or None
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self.__embeddings = LruCache(max_embeddings)
+        self.__results = LruCache(max_results)
+        self.__connection: Optional[sqlite3.Connection] = None
+        self.__connection_pid: Optional[int] = None
+        self.__connection_lock = threading.Lock()
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Look up the embedding of a normalized query, first in memory then on disk.
+
+        Parameters
+        ----------
+        query: str
+            The normalized query
+
+        Returns
+        -------
+        Optional[np.ndarray]
+            The cached embedding, None on a miss
+        """
+        embedding = self.__embeddings.get(query)
+        if embedding is not None or self.persistent_cache_path is None:
+            return embedding
+        try:
+            with self.__connection_lock:
+                connection = self.__get_connection()
+                row = None if connection is None else connection.execute('SELECT embedding FROM query_embeddings WHERE model_key = ? AND query = ?',
+                                                (self.model_key, query)).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.persistent_misses += 1
+            return None
+        self.persistent_hits += 1
+        embedding = np.frombuffer(row[0], dtype=np.float32)
+        self.__embeddings.put(query, embedding)
+        return embedding
+
+    def put_embedding(self, query: str, embedding: np.ndarray) -> None:
+        """Cache the embedding of a normalized query in both tiers.
+
+        Parameters
+        ----------
+        query: str
+            The normalized query
+        embedding: np.ndarray
+            The embedding of the query
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.__embeddings.put(query, embedding)
+        if self.persistent_cache_path is None:
+            return
+        try:
+            with self.__connection_lock:
+                connection = self.__get_connection()
+                if connection is None:
+                    return
+                connection.execute('INSERT OR REPLACE INTO query_embeddings (model_key, query, embedding) VALUES (?, ?, ?)',
+                                   (self.model_key, query, embedding.tobytes()))
+                connection.commit()
+        except sqlite3.Error:
+            # the persistent tier is best effort, e.g. another worker may hold the write lock
+            pass
+
+    def get_results(self, query: str, top_k: int, mode: str = '') -> Optional[Any]:
+        """Look up the search results of a normalized query.
+
+        Parameters
+        ----------
+        query: str
+            The normalized query
+        top_k: int
+            The number of requested results
+        mode: str
+            The way the results were ranked, e.g. the search mode
+
+        Returns
+        -------
+        Optional[Any]
+            The cached results, None on a miss
+        """
+        return self.__results.get((self.catalog_version, query, top_k, mode))
+
+    def put_results(self, query: str, top_k: int, results: Any, mode: str = '') -> None:
+        """Cache the search results of a normalized query.
+
+        Parameters
+        ----------
+        query: str
+            The normalized query
+        top_k: int
+            The number of requested results
+        results: Any
+            The results, they must not be modified afterwards
+        mode: str
+            The way the results were ranked, e.g. the search mode
+        """
+        self.__results.put((self.catalog_version, query, top_k, mode), results)
+
+    def set_catalog_version(self, catalog_version: str) -> None:
+        """Switch to a new catalog version, dropping all cached results when it changes.
+
+        Parameters
+        ----------
+        catalog_version: str
+            The version of the data results are computed on from now on
+        """
+        if catalog_version != self.catalog_version:
+            self.catalog_version = catalog_version
+            self.__results.clear()
+
+    def with_catalog_version(self, catalog_version: str) -> 'QueryCache':
+        """Create a view of the cache for another catalog version, sharing both tiers with this one.
+
+        Unlike `set_catalog_version` nothing is dropped, so requests still running on the previous
+        version keep their results, which age out of the result tier.
+
+        Parameters
+        ----------
+        catalog_version: str
+            The version of the data the results of the view are computed on
+
+        Returns
+        -------
+        QueryCache
+            The view
+        """
+        query_cache = copy.copy(self)
+        query_cache.catalog_version = catalog_version
+        return query_cache
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get the sizes, hits, misses and hit rates of the tiers.
+
+        Returns
+        -------
+        dict[str, Any]
+            The statistics of the embedding, persistent embedding and result tiers
+        """
+        def tier_stats(hits: int, misses: int, size: Optional[int]) -> dict[str, Any]:
+            lookups = hits + misses
+            return {'size': size, 'hits': hits, 'misses': misses,
+                    'hit_rate': hits / lookups if lookups else 0.0}
+
+        return {'model_key': self.model_key,
+                'catalog_version': self.catalog_version,
+                'embeddings': tier_stats(self.__embeddings.hits, self.__embeddings.misses, len(self.__embeddings)),
+                'persistent_embeddings': tier_stats(self.persistent_hits, self.persistent_misses, None),
+                'results': tier_stats(self.__results.hits, self.__results.misses, len(self.__results))}
+
+    def __get_connection(self) -> Optional[sqlite3.Connection]:
+        """Get the connection of this process, a forked worker never reuses the connection of its parent.
+
+        Returns
+        -------
+        Optional[sqlite3.Connection]
+            The connection, None when the persistent tier cannot be opened
+        """
+        if self.__connection_pid != os.getpid() and self.persistent_cache_path is not None:
+            self.__connection = self.__connect(self.persistent_cache_path)
+            self.__connection_pid = os.getpid()
+        return self.__connection
+
+    def __connect(self, persistent_cache_path: str) -> Optional[sqlite3.Connection]:
+        """Open the persistent tier, it is disabled when the file cannot be opened.
+
+        Parameters
+        ----------
+        persistent_cache_path: str
+            The SQLite file
+
+        Returns
+        -------
+        Optional[sqlite3.Connection]
+            The connection, shared by all threads of this process
+        """
+        try:
+            if os.path.dirname(persistent_cache_path):
+                os.makedirs(os.path.dirname(persistent_cache_path), exist_ok=True)
+            connection = sqlite3.connect(persistent_cache_path, timeout=SQLITE_TIMEOUT_SECONDS, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS query_embeddings (model_key TEXT NOT NULL, query TEXT NOT NULL, '
+                               'embedding BLOB NOT NULL, PRIMARY KEY (model_key, query))')
+            connection.commit()
+            return connection
+        except (OSError, sqlite3.Error):
+            return None
@@ -1,13 +1,23 @@
+from models.catalog import Catalog
+from models.catalog_update import CatalogUpdate, get_kept_rows
 from models.food_item import FoodItem
+from models.food_labels import FoodLabels
 from models.nutrient_amount import NutrientAmount
 from services.nutrient_amount_service import NutrientAmountService
 from services.food_item_service import FoodItemService
-import math
-from operator import itemgetter
-from typing import List
+from services.catalog_service import get_catalog
+from services.embedding_store import EmbeddingStore, update_embeddings
+from services.lru_cache import LruCache
+from services.metrics import measure_stage
+from services.embedder_service import get_embedder, get_embedder_revision
+from services.constants import EMBEDDER_MODEL_NAME, NEIGHBOR_TABLE_TOP_K, NUTRIENT_PROFILE_CACHE_SIZE, SIMILARITY_INDEX_BACKEND, USE_NEIGHBOR_TABLE
+from services.neighbor_table import NeighborTable, load_or_build_neighbor_table
+from services.shared_embeddings import get_shared_embeddings, get_shared_similarity_index
+from services.similarity_index import SimilarityIndex, load_or_build_similarity_index
+from typing import List, Optional, Tuple
+import copy
 
-from sentence_transformers import SentenceTransformer, util
-import torch 
+import numpy as np
 # Transformer model to embedding food labels to compute similarity between food items
 
 
@@ -63,19 +73,34 @@ class RecommenderService:
             'energy kcal, total metabolisable': -1,
             'thiamin': 1,
             'sugars, total': -1
-            }):
+            }, similarity_index_backend: str = SIMILARITY_INDEX_BACKEND, use_neighbor_table: bool = USE_NEIGHBOR_TABLE):
+        self.use_nutrient_dict = use_nutrient_dict
         self.food_value_dict = {}
+        self.food_values = np.zeros(0)
+        self.food_rankings_cache = LruCache(NUTRIENT_PROFILE_CACHE_SIZE) # food values and rankings per set of nutrient weights
         self.food_labels = []
         self.food_uris = []
+        self.food_items = []
+        self.food_index_by_uri = {}
+        self.label_rows = FoodLabels([])
+        self.label_embeddings = []
         self.food_label_embeddings = []
-        self.food_item_service = FoodItemService()
-        self.nutrient_amount_service = NutrientAmountService()
-        self.embedder = SentenceTransformer("Linus4Lyf/test-food")
+        self.neighbor_table: Optional[NeighborTable] = None
+        self.neighbor_table_hits = 0 # catalog food items answered by the neighbor table
+        self.neighbor_table_misses = 0 # catalog food items with too few healthier neighbours in the table, answered by a scan
+        catalog = get_catalog()
+        self.food_item_service = FoodItemService(catalog)
+        self.nutrient_amount_service = NutrientAmountService(catalog)
+        self.embedder = get_embedder() # shared with the other services, concurrent encodes are batched
+        self.embedding_store = EmbeddingStore(EMBEDDER_MODEL_NAME, get_embedder_revision())
         # a transformer model to compute embeddings by using the food label
         self.__get_food_labels()
         self.__get_food_uris()
         self.__compute_nutrient_value(use_nutrient_dict)
         self.__compute_food_label_embeddings()
+        self.__build_similarity_index(similarity_index_backend)
+        if use_neighbor_table:
+            self.__build_neighbor_table()
 
     def __get_food_labels(self)->None:
         food_item_all = self.food_item_service.get_food_items()
@@ -84,54 +109,223 @@ class RecommenderService:
     def __get_food_uris(self)->None:
         food_item_all = self.food_item_service.get_food_items()
         self.food_uris = [food_item.uri for food_item in food_item_all]
+        self.food_items = food_item_all # the catalog's own FoodItems, recommendations reuse them instead of creating new ones
+        self.food_index_by_uri = {food_uri: index for index, food_uri in enumerate(self.food_uris)}
+        self.label_rows = FoodLabels(food_item_all)
 
     def __compute_nutrient_value(self, use_nutrient_dict:dict)->None:
-        food_item_all = self.food_item_service.get_food_items()
-        nutrient_amount_all = [self.nutrient_amount_service.get_nutrient_amounts_for_food_item(food_item) \
-                               for food_item in food_item_all]
-        for i, nutrient_amount in enumerate(nutrient_amount_all):
-            food_item_uri = food_item_all[i].uri
-            value = sum([use_nutrient_dict.get(nutrient_amount_i.nutrient_label, 0)*\
-                nutrient_amount_i.value for nutrient_amount_i in nutrient_amount])
-            self.food_value_dict[food_item_uri] = 1/(1+math.exp(-value*0.01))
+        self.food_values = self.__compute_food_values(use_nutrient_dict)
+        self.food_value_dict = dict(zip(self.food_uris, self.food_values.tolist()))
+
+    def __compute_food_values(self, use_nutrient_dict:dict) -> np.ndarray:
+        # one matrix-vector product over the nutrient matrix instead of a loop over NutrientAmounts
+        nutrient_matrix = self.nutrient_amount_service.nutrient_matrix
+        weighted_sums = nutrient_matrix.compute_weighted_sums(nutrient_matrix.get_weight_vector(use_nutrient_dict))
+        rows = np.array([nutrient_matrix.row_by_food_item_uri.get(food_uri, -1) for food_uri in self.food_uris], dtype=np.int64)
+        values = np.where(rows >= 0, weighted_sums[rows], 0.0) if len(weighted_sums) else np.zeros(len(rows))
+        with np.errstate(over='ignore'):
             #scale the nutrient value to the range [0, 1]
             #prevent overflow by multiplying the scalor 0.01
+            return 1/(1+np.exp(-values*0.01))
 
-    def __compute_food_label_embeddings(self):
-        self.food_label_embeddings = self.embedder.encode(self.food_labels, 
-                                      convert_to_tensor=True)
+    def get_food_ranking(self, nutrient_weights: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the food value of every catalog item for personalized nutrient weights, and the items ranked by it.
 
-    def __compute_top_k_sim_items(self, food_item:FoodItem, top_k=10) -> List[FoodItem]:
+        The food values of a set of weights are computed in one pass over the nutrient matrix and kept
+        in a bounded cache with their ranking, so a named profile costs one matrix-vector product and
+        one sort per catalog version.
+
+        Parameters
+        ----------
+        nutrient_weights: Optional[dict]
+            The weights by nutrient label that override the default weights, None or empty for the defaults
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            The food value of every item aligned with food_uris, the item indexes from the lowest
+            to the highest food value and the food values in that order
         """
-        return top 10 similar food items 
+        weights = {**self.use_nutrient_dict, **(nutrient_weights or {})}
+        cache_key = tuple(sorted(weights.items()))
+        food_ranking = self.food_rankings_cache.get(cache_key)
+        if food_ranking is None:
+            food_values = self.__compute_food_values(weights) if nutrient_weights else self.food_values
+            ranked_rows = np.argsort(food_values, kind='stable')
+            food_ranking = (food_values, ranked_rows, food_values[ranked_rows])
+            self.food_rankings_cache.put(cache_key, food_ranking)
+        return food_ranking
+
+    def get_food_values(self, nutrient_weights: Optional[dict] = None) -> np.ndarray:
+        """Get the food value of every catalog item for personalized nutrient weights, see get_food_ranking.
+
+        Parameters
+        ----------
+        nutrient_weights: Optional[dict]
+            The weights by nutrient label that override the default weights, None or empty for the defaults
+
+        Returns
+        -------
+        np.ndarray
+            The food value of every item, aligned with food_uris
         """
-        food_label = food_item.label
-        food_uri = food_item.uri 
-        food_label_embedding = self.embedder.encode(food_label, convert_to_tensor=True)
-        cos_scores = util.cos_sim(food_label_embedding, self.food_label_embeddings)[0]
-        top_results = torch.topk(cos_scores, k=top_k+1)
-        top_results_indices = top_results[1].tolist()
+        return self.get_food_ranking(nutrient_weights)[0]
+
+    def __compute_food_label_embeddings(self):
+        # known labels are read from the on-disk store, only new labels are encoded; the matrix is shared with the other services
+        self.label_embeddings = get_shared_embeddings(self.food_item_service.catalog.version, self.embedding_store,
+                                                      lambda: self.embedding_store.get_embeddings(self.label_rows.labels, self.embedder))
+        # food items are compared by their first label, the first rows of the shared matrix
+        self.food_label_embeddings = self.label_embeddings[:len(self.food_items)]
+
+    def __build_similarity_index(self, similarity_index_backend: str) -> None:
+        self.similarity_index = get_shared_similarity_index(
+            self.food_item_service.catalog.version, self.embedding_store, similarity_index_backend, len(self.food_items),
+            lambda: load_or_build_similarity_index(similarity_index_backend, self.food_label_embeddings))
 
-        top_labels = itemgetter(*top_results_indices)(self.food_labels)
-        top_uris = itemgetter(*top_results_indices)(self.food_uris)
-        top_labels_uris = list(zip(top_uris, top_labels))
-        top_food_items = [FoodItem(*label_uri) for label_uri in top_labels_uris]
+    def __build_neighbor_table(self) -> None:
+        # the neighbours of catalog items are precomputed, so recommending them needs no forward pass
+        self.neighbor_table = load_or_build_neighbor_table(self.food_label_embeddings, NEIGHBOR_TABLE_TOP_K)
 
-        return top_food_items
+    def apply_catalog_update(self, catalog: Catalog, catalog_update: CatalogUpdate) -> 'RecommenderService':
+        """Create a RecommenderService for an updated Catalog, reusing everything the update does not touch.
 
+        Only new and relabelled food items are embedded and only food items with new nutrient amounts
+        are scored, the similarity index and the neighbor table are updated incrementally.
+        The service itself is not modified, so requests running on it are not disturbed.
 
-    def recommend_alternative_food_item(self, food_item: FoodItem) -> List[FoodItem]:
-        sim_food_items = self.__compute_top_k_sim_items(food_item) 
+        Parameters
+        ----------
+        catalog: Catalog
+            The Catalog snapshot with the update applied
+        catalog_update: CatalogUpdate
+            The update that was applied
 
-        uri = food_item.uri 
-        # compute similar food items
-        nutrient_value = self.food_value_dict.get(food_item.uri, 0)
+        Returns
+        -------
+        RecommenderService
+            The updated RecommenderService
+        """
+        recommender_service = copy.copy(self)
+        recommender_service.food_item_service = FoodItemService(catalog)
+        recommender_service.nutrient_amount_service = NutrientAmountService(catalog)
+        food_items = recommender_service.food_item_service.get_food_items()
+        recommender_service.food_labels = [food_item.label for food_item in food_items]
+        recommender_service.food_uris = [food_item.uri for food_item in food_items]
+        recommender_service.food_items = food_items
+        recommender_service.food_index_by_uri = {food_uri: index for index, food_uri in enumerate(recommender_service.food_uris)}
+        recommender_service.label_rows = FoodLabels(food_items)
 
-        # filter healthier food items
-        food_item_healthier = [food_item for food_item in sim_food_items if self.food_value_dict.get(food_item.uri,0)>nutrient_value and food_item.uri!=uri]
+        # an embedding only depends on its label, every label seen before is reused
+        label_kept_rows = get_kept_rows({label: row for row, label in enumerate(self.label_rows.labels)},
+                                        recommender_service.label_rows.labels, set())
+        recommender_service.label_embeddings = get_shared_embeddings(catalog.version, self.embedding_store, lambda: update_embeddings(
+            np.asarray(self.label_embeddings), label_kept_rows, recommender_service.label_rows.labels, self.embedder))
+        recommender_service.food_label_embeddings = recommender_service.label_embeddings[:len(food_items)]
+        # the index and the table only hold first labels, a first label that was another label before is new to them
+        kept_rows = np.where(label_kept_rows[:len(food_items)] < len(self.food_items), label_kept_rows[:len(food_items)], -1)
+        recommender_service.similarity_index = get_shared_similarity_index(
+            catalog.version, self.embedding_store, self.similarity_index.backend, len(food_items),
+            lambda: self.similarity_index.update(recommender_service.food_label_embeddings, kept_rows))
+        if self.neighbor_table is not None:
+            recommender_service.neighbor_table = self.neighbor_table.update(recommender_service.food_label_embeddings, kept_rows)
 
-        #The purpose is to reduce the size of filtered dictionary to improve efficiency
-        if food_item_healthier:#if healthier options exist 
-            return food_item_healthier 
-        else:
-            return [food_item]
+        # a food value only changes with the nutrient amounts of its own food item
+        value_kept_rows = get_kept_rows(self.food_index_by_uri, recommender_service.food_uris,
+                                        set(catalog_update.nutrient_amounts_by_food_item_uri))
+        kept = value_kept_rows >= 0
+        nutrient_matrix = catalog.nutrient_matrix
+        weight_vector = nutrient_matrix.get_weight_vector(self.use_nutrient_dict)
+        rescored_rows = np.flatnonzero(~kept)
+        nutrient_rows = np.array([nutrient_matrix.row_by_food_item_uri.get(recommender_service.food_uris[row], -1)
+                                  for row in rescored_rows], dtype=np.int64)
+        values = np.zeros(len(rescored_rows))
+        values[nutrient_rows >= 0] = nutrient_matrix.values[nutrient_rows[nutrient_rows >= 0]] @ weight_vector
+        food_values = np.empty(len(recommender_service.food_uris))
+        food_values[kept] = self.food_values[value_kept_rows[kept]]
+        with np.errstate(over='ignore'):
+            food_values[rescored_rows] = 1/(1+np.exp(-values*0.01))
+        recommender_service.food_values = food_values
+        recommender_service.food_value_dict = dict(zip(recommender_service.food_uris, food_values.tolist()))
+        recommender_service.food_rankings_cache = LruCache(NUTRIENT_PROFILE_CACHE_SIZE)
+        return recommender_service
+
+    def __compute_top_k_healthier_indices(self, food_items: List[FoodItem], nutrient_values: np.ndarray,
+                                          food_ranking: Tuple[np.ndarray, np.ndarray, np.ndarray], top_k=10) -> List[List[int]]:
+        """
+        return the indices of the top k most similar food items that are healthier than every food item,
+        fewer only when fewer healthier food items exist. The neighbor table answers when it holds
+        enough healthier neighbours, the others are scored against the healthier items only,
+        found as a suffix of the food items ranked by food value, in one pass
+        """
+        food_values, ranked_rows, ranked_food_values = food_ranking
+        top_results_indices: List[List[int]] = [[] for _ in food_items]
+        scan_positions = []
+        with measure_stage('neighbor_table'):
+            for position, food_item in enumerate(food_items):
+                food_index = self.food_index_by_uri.get(food_item.uri)
+                if self.neighbor_table is not None and food_index is not None and self.food_labels[food_index] == food_item.label:
+                    # every item missing from the table is less similar than the ones it holds
+                    neighbor_indices = self.neighbor_table.indices[food_index]
+                    healthier_indices = neighbor_indices[food_values[neighbor_indices] > nutrient_values[position]]
+                    if len(healthier_indices) >= top_k:
+                        top_results_indices[position] = healthier_indices[:top_k].tolist()
+                        self.neighbor_table_hits += 1
+                        continue
+                    self.neighbor_table_misses += 1
+                scan_positions.append(position)
+
+        if scan_positions:
+            query_embeddings = self.__get_query_embeddings([food_items[position] for position in scan_positions])
+            first_positions = np.searchsorted(ranked_food_values, nutrient_values[scan_positions], side='right')
+            with measure_stage('similarity'):
+                scan_results_indices = self.similarity_index.search_ranked(query_embeddings, ranked_rows, first_positions, top_k)[1]
+            for position, indices in zip(scan_positions, scan_results_indices):
+                top_results_indices[position] = indices[indices >= 0].tolist()
+        return top_results_indices
+
+    def __get_query_embeddings(self, food_items: List[FoodItem]) -> np.ndarray:
+        """
+        return the embedding of every food item, catalog items are looked up, the others are encoded in one pass
+        """
+        food_indices = [self.food_index_by_uri.get(food_item.uri) for food_item in food_items]
+        live_positions = [position for position, (food_item, food_index) in enumerate(zip(food_items, food_indices))
+                          if food_index is None or self.food_labels[food_index] != food_item.label]
+        query_embeddings = np.empty((len(food_items), np.shape(self.food_label_embeddings)[1]), dtype=np.float32)
+        for position, food_index in enumerate(food_indices):
+            if food_index is not None:
+                query_embeddings[position] = self.food_label_embeddings[food_index]
+        if live_positions:
+            food_labels = [food_items[position].label for position in live_positions]
+            # a single label goes through the embedder's scheduler to be batched with other requests
+            with measure_stage('encode'):
+                if len(food_labels) == 1:
+                    food_label_embeddings = np.atleast_2d(self.embedder.encode(food_labels[0], convert_to_numpy=True))
+                else:
+                    food_label_embeddings = self.embedder.encode(food_labels, convert_to_numpy=True)
+            query_embeddings[live_positions] = food_label_embeddings
+        return query_embeddings
+
+    def recommend_alternative_food_item(self, food_item: FoodItem, nutrient_weights: Optional[dict] = None) -> List[FoodItem]:
+        return self.recommend_alternative_food_items([food_item], nutrient_weights)[0]
+
+    def recommend_alternative_food_items(self, food_items: List[FoodItem], nutrient_weights: Optional[dict] = None) -> List[List[FoodItem]]:
+        """
+        recommend the 10 most similar healthier food items, healthier by the default nutrient weights
+        or by personalized weights that override them, see get_food_ranking
+        """
+        with measure_stage('ranking'):
+            food_ranking = self.get_food_ranking(nutrient_weights)
+        food_values = food_ranking[0]
+        food_indices = [self.food_index_by_uri.get(food_item.uri) for food_item in food_items]
+        nutrient_values = np.array([food_values[food_index] if food_index is not None else 0 for food_index in food_indices])
+        top_results_indices = self.__compute_top_k_healthier_indices(food_items, nutrient_values, food_ranking)
+        recommendations = []
+        with measure_stage('food_items'):
+            for food_item, sim_indices in zip(food_items, top_results_indices):
+                food_item_healthier = [self.food_items[index] for index in sim_indices]
+                if food_item_healthier:#if healthier options exist 
+                    recommendations.append(food_item_healthier)
+                else:
+                    recommendations.append([food_item])
+        return recommendations
@@ -0,0 +1,110 @@
+from typing import Any, Optional
+from services.lru_cache import LruCache
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """The ResponseCache keeps rendered responses of deterministic endpoints for one data version.
+
+    Responses are keyed by the request and only valid for the version they were rendered for.
+    When the version changes, e.g. after a catalog reload, all entries are dropped at once.
+
+    Attributes
+    ----------
+    version: Optional[str]
+        The version the cached responses were rendered for
+    """
+
+    def __init__(self, max_size: int):
+        """Create an empty ResponseCache.
+
+        Parameters
+        ----------
+        max_size: int
+            The maximum number of responses, the least recently used is evicted first, 0 disables the cache
+        """
+        self.version: Optional[str] = None
+        self.__responses = LruCache(max_size)
+        self.__lock = threading.Lock()
+
+    def get(self, version: str, request_key: str) -> Optional[Any]:
+        """Look up the response to a request.
+
+        Parameters
+        ----------
+        version: str
+            The current data version
+        request_key: str
+            The normalized path and query of the request
+
+        Returns
+        -------
+        Optional[Any]
+            The cached response, None on a miss
+        """
+        self.__set_version(version)
+        return self.__responses.get(request_key)
+
+    def put(self, version: str, request_key: str, response: Any) -> None:
+        """Cache the response to a request.
+
+        Parameters
+        ----------
+        version: str
+            The data version the response was rendered for
+        request_key: str
+            The normalized path and query of the request
+        response: Any
+            The rendered response, it must not be modified afterwards
+        """
+        self.__set_version(version)
+        self.__responses.put(request_key, response)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get the size, hits and misses of the cache.
+
+        Returns
+        -------
+        dict[str, Any]
+            The version, size, hits, misses and hit rate
+        """
+        lookups = self.__responses.hits + self.__responses.misses
+        return {'version': self.version,
+                'size': len(self.__responses),
+                'hits': self.__responses.hits,
+                'misses': self.__responses.misses,
+                'hit_rate': self.__responses.hits / lookups if lookups else 0.0}
+
+    def __set_version(self, version: str) -> None:
+        """Switch to a version, dropping all responses when it changes.
+
+        Parameters
+        ----------
+        version: str
+            The current data version
+        """
+        if version == self.version:
+            return
+        with self.__lock:
+            if version != self.version:
+                self.__responses.clear()
+                self.version = version
+
+
+def compute_etag(version: str, request_key: str) -> str:
+    """Compute the entity tag of a response from the data version and the request, before rendering it.
+
+    Parameters
+    ----------
+    version: str
+        The data version
+    request_key: str
+        The normalized path and query of the request
+
+    Returns
+    -------
+    str
+        The unquoted entity tag
+    """
+    return hashlib.sha1('{}\n{}'.format(version, request_key).encode('utf-8')).hexdigest()[:20]
@@ -1,25 +1,66 @@
+from models.catalog import Catalog
+from models.catalog_update import CatalogUpdate, get_kept_rows
 from models.food_item import FoodItem
+from models.food_labels import FoodLabels
 from services.nutrient_amount_service import NutrientAmountService
 from services.food_item_service import FoodItemService
-from typing import List 
-from operator import itemgetter
-from sentence_transformers import SentenceTransformer, util
-import torch 
+from services.embedding_store import EmbeddingStore, update_embeddings
+from services.embedder_service import get_embedder, get_embedder_revision
+from services.catalog_service import get_catalog
+from services.constants import EMBEDDER_MODEL_NAME, SEARCH_MODE, QUERY_CACHE_PATH, QUERY_EMBEDDING_CACHE_SIZE, QUERY_RESULT_CACHE_SIZE, SIMILARITY_INDEX_BACKEND
+from services.lexical_index import get_lexical_index
+from services.metrics import measure_stage
+from services.query_cache import QueryCache, normalize_query
+from services.shared_embeddings import get_shared_embeddings, get_shared_similarity_index
+from services.similarity_index import SimilarityIndex, load_or_build_similarity_index, normalize_queries, select_top_k
+from typing import List, Optional
+import copy
+
+import numpy as np
+
+# Constants
+HYBRID_CANDIDATE_FACTOR: int = 2 # candidates taken from each ranking per requested result before fusing
+HYBRID_LEXICAL_WEIGHT: float = 0.3
+LEXICAL_MATCH_THRESHOLD: float = 0.9 # trigram similarity from which the lexical match answers alone
+SEARCH_MODE_HYBRID: str = 'hybrid'
+SEARCH_MODE_SEMANTIC: str = 'semantic'
+SEARCH_MODES: list[str] = [SEARCH_MODE_SEMANTIC, SEARCH_MODE_HYBRID]
+
+
+def get_food_index_by_position(food_uris: List[str]) -> np.ndarray:
+    """
+    map the position of every food item in the sorted food item URIs of a catalog to its index in food_uris
+    """
+    return np.array(sorted(range(len(food_uris)), key=food_uris.__getitem__), dtype=np.int64)
 
 
 class SearchService:
     """
       The search service retrieves relevant food items given text
     """
-    def __init__(self) -> None:
+    def __init__(self, similarity_index_backend: str = SIMILARITY_INDEX_BACKEND) -> None:
         self.food_labels = []
         self.food_uris = []
+        self.food_items = []
+        self.label_rows = FoodLabels([])
+        self.food_index_by_position = np.zeros(0, dtype=np.int64)
         self.food_label_embeddings = []
-        self.food_item_service = FoodItemService()
-        self.embedder = SentenceTransformer("Linus4Lyf/test-food")
+        self.similarity_index_backend = similarity_index_backend
+        catalog = get_catalog()
+        self.food_item_service = FoodItemService(catalog)
+        self.embedder = get_embedder() # shared with the other services, concurrent encodes are batched
+        self.embedding_store = EmbeddingStore(EMBEDDER_MODEL_NAME, get_embedder_revision())
+        # results depend on the data and the index, embeddings only on the model
+        self.query_cache = QueryCache(model_key='{}@{}'.format(EMBEDDER_MODEL_NAME, get_embedder_revision()),
+                                      catalog_version='{}:{}'.format(catalog.version, similarity_index_backend),
+                                      max_embeddings=QUERY_EMBEDDING_CACHE_SIZE,
+                                      max_results=QUERY_RESULT_CACHE_SIZE,
+                                      persistent_cache_path=QUERY_CACHE_PATH)
+        self.lexical_index = get_lexical_index(catalog)
         self.__get_food_labels()
         self.__get_food_uris()
         self.__compute_food_label_embeddings()
+        self.__build_similarity_index(similarity_index_backend)
 
     def __get_food_labels(self)->None:
         food_item_all = self.food_item_service.get_food_items()
@@ -28,19 +69,178 @@ class SearchService:
     def __get_food_uris(self)->None:
         food_item_all = self.food_item_service.get_food_items()
         self.food_uris = [food_item.uri for food_item in food_item_all]
+        self.food_items = food_item_all # the catalog's own FoodItems, results reuse them instead of creating new ones
+        # every preferred label of a food item, e.g. its Dutch name, is indexed as its own row
+        self.label_rows = FoodLabels(food_item_all)
+        self.food_index_by_position = get_food_index_by_position(self.food_uris)
 
     def __compute_food_label_embeddings(self):
-        self.food_label_embeddings = self.embedder.encode(self.food_labels, 
-                                      convert_to_tensor=True)
-
-    def compute_top_k_sim_items(self, search_text:str, topk=20) -> List[FoodItem]:
-        food_label_embedding = self.embedder.encode(search_text, convert_to_tensor=True)
-        cos_scores = util.cos_sim(food_label_embedding, self.food_label_embeddings)[0]
-        top_results = torch.topk(cos_scores, k=topk+1)
-        top_results_indices = top_results[1].tolist()
-        top_labels = itemgetter(*top_results_indices)(self.food_labels)
-        top_uris = itemgetter(*top_results_indices)(self.food_uris)
-        top_labels_uris = list(zip(top_uris, top_labels))
-        top_food_items = [FoodItem(*label_uri) for label_uri in top_labels_uris]
-
-        return top_food_items
\ No newline at end of file
+        # known labels are read from the on-disk store, only new labels are encoded; the matrix is shared with the other services
+        self.food_label_embeddings = get_shared_embeddings(self.food_item_service.catalog.version, self.embedding_store,
+                                                           lambda: self.embedding_store.get_embeddings(self.label_rows.labels, self.embedder))
+
+    def __build_similarity_index(self, similarity_index_backend: str) -> None:
+        self.similarity_index = get_shared_similarity_index(
+            self.food_item_service.catalog.version, self.embedding_store, similarity_index_backend, len(self.label_rows.labels),
+            lambda: load_or_build_similarity_index(similarity_index_backend, self.food_label_embeddings))
+
+    def apply_catalog_update(self, catalog: Catalog, catalog_update: CatalogUpdate) -> 'SearchService':
+        """Create a SearchService for an updated Catalog, only embedding new and relabelled food items.
+
+        The service itself is not modified, so requests running on it are not disturbed. Both services
+        share the query cache, cached results are keyed by the catalog version they were computed on.
+
+        Parameters
+        ----------
+        catalog: Catalog
+            The Catalog snapshot with the update applied
+        catalog_update: CatalogUpdate
+            The update that was applied
+
+        Returns
+        -------
+        SearchService
+            The updated SearchService
+        """
+        search_service = copy.copy(self)
+        search_service.food_item_service = FoodItemService(catalog)
+        food_items = search_service.food_item_service.get_food_items()
+        search_service.food_labels = [food_item.label for food_item in food_items]
+        search_service.food_uris = [food_item.uri for food_item in food_items]
+        search_service.food_items = food_items
+        search_service.label_rows = FoodLabels(food_items)
+        search_service.food_index_by_position = get_food_index_by_position(search_service.food_uris)
+        # an embedding only depends on its label, every label seen before is reused
+        kept_rows = get_kept_rows({label: row for row, label in enumerate(self.label_rows.labels)}, search_service.label_rows.labels, set())
+        search_service.food_label_embeddings = get_shared_embeddings(catalog.version, self.embedding_store, lambda: update_embeddings(
+            np.asarray(self.food_label_embeddings), kept_rows, search_service.label_rows.labels, self.embedder))
+        search_service.similarity_index = get_shared_similarity_index(
+            catalog.version, self.embedding_store, self.similarity_index.backend, len(search_service.label_rows.labels),
+            lambda: self.similarity_index.update(search_service.food_label_embeddings, kept_rows))
+        search_service.lexical_index = get_lexical_index(catalog)
+        search_service.query_cache = self.query_cache.with_catalog_version(
+            '{}:{}'.format(catalog.version, self.similarity_index_backend))
+        return search_service
+
+    def compute_top_k_sim_items(self, search_text:str, topk=20, mode: str = SEARCH_MODE) -> List[FoodItem]:
+        return self.compute_top_k_sim_items_batch([search_text], topk, mode)[0]
+
+    def compute_top_k_sim_items_batch(self, search_texts: List[str], topk=20, mode: str = SEARCH_MODE) -> List[List[FoodItem]]:
+        """
+        search relevant food items for many texts at once: uncached texts are encoded
+        in one pass and scored against the catalog in one matrix product.
+        The hybrid mode answers (near) exact label matches from the lexical index without the model
+        and fuses lexical and semantic scores for the other texts
+        """
+        queries = [normalize_query(search_text) for search_text in search_texts]
+        top_results_indices = [self.query_cache.get_results(query, topk, mode) for query in queries]
+        missing_queries = list(dict.fromkeys(query for query, indices in zip(queries, top_results_indices) if indices is None))
+        if missing_queries:
+            if mode == SEARCH_MODE_HYBRID:
+                results_indices_by_query = self.__search_hybrid(missing_queries, topk+1)
+            else:
+                query_embeddings = self.__get_query_embeddings(missing_queries)
+                with measure_stage('similarity'):
+                    missing_results_indices = [indices[indices >= 0].tolist() for indices in self.__search_food_items(query_embeddings, topk+1)]
+                results_indices_by_query = dict(zip(missing_queries, missing_results_indices))
+            for query, indices in results_indices_by_query.items():
+                self.query_cache.put_results(query, topk, indices, mode)
+            top_results_indices = [indices if indices is not None else results_indices_by_query[query]
+                                   for query, indices in zip(queries, top_results_indices)]
+
+        with measure_stage('food_items'):
+            return [[self.food_items[index] for index in indices] for indices in top_results_indices]
+
+    def compute_top_k_sim_items_among(self, search_text: str, food_item_positions: np.ndarray, topk=20,
+                                      mode: str = SEARCH_MODE) -> List[FoodItem]:
+        """
+        search relevant food items for a text among some food items, e.g. the matches of a nutrient
+        filter, given by their positions in the sorted food item URIs of the service's catalog.
+        Only the candidates are scored; results depend on the candidates and are not cached
+        """
+        candidate_indices = np.sort(self.food_index_by_position[np.asarray(food_item_positions, dtype=np.int64)])
+        query = normalize_query(search_text)
+        if mode == SEARCH_MODE_HYBRID:
+            indices = self.__search_hybrid([query], topk+1, candidate_indices)[query]
+        else:
+            query_embeddings = self.__get_query_embeddings([query])
+            with measure_stage('similarity'):
+                indices = self.__search_food_items(query_embeddings, topk+1, candidate_indices)[0]
+            indices = indices[indices >= 0].tolist()
+        with measure_stage('food_items'):
+            return [self.food_items[index] for index in indices]
+
+    def __search_hybrid(self, queries: List[str], top_k: int, candidate_indices: Optional[np.ndarray] = None) -> dict:
+        """
+        return the top k indices of every query, ranked by trigram similarity, labels equal to the query
+        first, when a label matches the query (almost) exactly, by a weighted sum of trigram and cosine similarity otherwise;
+        only candidate food items are returned when candidate_indices is given
+        """
+        with measure_stage('lexical'):
+            lexical_scores_by_query = {query: self.lexical_index.score(query) for query in queries}
+            if candidate_indices is not None:
+                is_excluded = np.ones(len(self.food_items), dtype=np.bool_)
+                is_excluded[candidate_indices] = False
+                for lexical_scores in lexical_scores_by_query.values():
+                    lexical_scores[is_excluded] = -np.inf
+        results_indices_by_query = {}
+        semantic_queries = []
+        for query, lexical_scores in lexical_scores_by_query.items():
+            if len(lexical_scores) and lexical_scores.max() >= LEXICAL_MATCH_THRESHOLD:
+                lexical_indices = select_top_k(lexical_scores[None, :], top_k)[0]
+                lexical_indices = lexical_indices[np.isfinite(lexical_scores[lexical_indices])].tolist()
+                # labels equal to the query come first, other labels may share all its trigrams and tie with them
+                exact_indices = [index for index in self.lexical_index.find_exact(query) if np.isfinite(lexical_scores[index])]
+                results_indices_by_query[query] = (exact_indices + [index for index in lexical_indices
+                                                                    if index not in exact_indices])[:top_k]
+            else:
+                semantic_queries.append(query)
+        if semantic_queries:
+            query_embeddings = self.__get_query_embeddings(semantic_queries)
+            with measure_stage('similarity'):
+                semantic_indices = self.__search_food_items(query_embeddings, top_k*HYBRID_CANDIDATE_FACTOR, candidate_indices)
+            for query, query_embedding, indices in zip(semantic_queries, normalize_queries(query_embeddings), semantic_indices):
+                lexical_scores = lexical_scores_by_query[query]
+                lexical_indices = select_top_k(lexical_scores[None, :], top_k*HYBRID_CANDIDATE_FACTOR)[0]
+                lexical_indices = lexical_indices[np.isfinite(lexical_scores[lexical_indices])]
+                candidate_rows = np.unique(np.concatenate([indices[indices >= 0], lexical_indices]))
+                # a food item is as similar as its most similar label
+                label_rows, positions = self.label_rows.get_rows(candidate_rows)
+                label_scores = (self.similarity_index.embeddings[label_rows] @ query_embedding) / self.similarity_index.norms[label_rows]
+                semantic_scores = np.full(len(candidate_rows), -np.inf, dtype=np.float32)
+                np.maximum.at(semantic_scores, positions, label_scores)
+                fused_scores = (1-HYBRID_LEXICAL_WEIGHT)*semantic_scores + HYBRID_LEXICAL_WEIGHT*lexical_scores[candidate_rows]
+                results_indices_by_query[query] = candidate_rows[select_top_k(fused_scores[None, :], top_k)[0]].tolist()
+        return results_indices_by_query
+
+    def __search_food_items(self, query_embeddings: np.ndarray, top_k: int, candidate_indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        return the top k most similar distinct food items of every query, padded with -1: the labels
+        are searched for the top k times the most labels of a food item and grouped per food item;
+        with candidate_indices only the labels of those food items are scored
+        """
+        if candidate_indices is not None:
+            candidate_rows = self.label_rows.get_rows(candidate_indices)[0]
+            scores, rows = self.similarity_index.search_ranked(query_embeddings, candidate_rows,
+                                                               np.zeros(len(query_embeddings), dtype=np.int64),
+                                                               top_k*self.label_rows.max_label_count)
+            return self.label_rows.group_top_k(scores, rows, top_k)[1]
+        scores, rows = self.similarity_index.search(query_embeddings, top_k*self.label_rows.max_label_count)
+        return self.label_rows.group_top_k(scores, rows, top_k)[1]
+
+    def __get_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        query_embeddings = [self.query_cache.get_embedding(query) for query in queries]
+        texts_to_encode = [query for query, embedding in zip(queries, query_embeddings) if embedding is None]
+        if texts_to_encode:
+            # a single text goes through the embedder's scheduler to be batched with other requests
+            with measure_stage('encode'):
+                if len(texts_to_encode) == 1:
+                    encoded_embeddings = np.atleast_2d(self.embedder.encode(texts_to_encode[0], convert_to_numpy=True))
+                else:
+                    encoded_embeddings = self.embedder.encode(texts_to_encode, convert_to_numpy=True)
+            embedding_by_query = dict(zip(texts_to_encode, encoded_embeddings))
+            for query, embedding in embedding_by_query.items():
+                self.query_cache.put_embedding(query, embedding)
+            query_embeddings = [embedding if embedding is not None else embedding_by_query[query]
+                                for query, embedding in zip(queries, query_embeddings)]
+        return np.stack(query_embeddings)
@@ -0,0 +1,89 @@
+from typing import Any, Callable
+from services.embedding_store import EmbeddingStore
+from services.similarity_index import SimilarityIndex
+import threading
+
+import numpy as np
+
+shared_objects_lock = threading.RLock()
+shared_objects_by_key: dict[tuple[str, ...], Any] = {}
+
+
+def get_shared_object(catalog_version: str, key: tuple[str, ...], create: Callable[[], Any]) -> Any:
+    """Get an object derived from a Catalog snapshot, created once per catalog version for all services.
+
+    The object is created under a lock, so a service asking for it while another one creates it
+    waits and reuses it instead of creating it a second time.
+
+    Parameters
+    ----------
+    catalog_version: str
+        The version of the Catalog snapshot
+    key: tuple[str, ...]
+        Identifies the object within the snapshot
+    create: Callable[[], Any]
+        Creates the object
+
+    Returns
+    -------
+    Any
+        The shared object
+    """
+    shared_key = (catalog_version,) + key
+    shared_object = shared_objects_by_key.get(shared_key)
+    if shared_object is None:
+        with shared_objects_lock:
+            shared_object = shared_objects_by_key.get(shared_key)
+            if shared_object is None:
+                shared_object = create()
+                # only the current version is kept, services still serving an older one hold their own references
+                for stale_key in [stale_key for stale_key in shared_objects_by_key if stale_key[0] != catalog_version]:
+                    del shared_objects_by_key[stale_key]
+                shared_objects_by_key[shared_key] = shared_object
+    return shared_object
+
+
+def get_shared_embeddings(catalog_version: str, embedding_store: EmbeddingStore,
+                          compute: Callable[[], np.ndarray]) -> np.ndarray:
+    """Get the embeddings of the food labels of a Catalog snapshot, computed once for the search and recommender services.
+
+    Parameters
+    ----------
+    catalog_version: str
+        The version of the Catalog snapshot
+    embedding_store: EmbeddingStore
+        The store of the model the embeddings are computed with
+    compute: Callable[[], np.ndarray]
+        Computes the embeddings of the rows of the FoodLabels of the catalog food items
+
+    Returns
+    -------
+    np.ndarray
+        The shared embedding matrix
+    """
+    return get_shared_object(catalog_version, ('embeddings', embedding_store.store_dir_path), compute)
+
+
+def get_shared_similarity_index(catalog_version: str, embedding_store: EmbeddingStore, backend: str, row_count: int,
+                                build: Callable[[], SimilarityIndex]) -> SimilarityIndex:
+    """Get the similarity index of a Catalog snapshot, built once per backend for the search and recommender services.
+
+    Parameters
+    ----------
+    catalog_version: str
+        The version of the Catalog snapshot
+    embedding_store: EmbeddingStore
+        The store of the model the indexed embeddings are computed with
+    backend: str
+        'exact', 'ivf' or 'quantized'
+    row_count: int
+        The number of indexed rows of the shared embeddings, e.g. only the first label of every food item
+    build: Callable[[], SimilarityIndex]
+        Builds the index over the shared embeddings
+
+    Returns
+    -------
+    SimilarityIndex
+        The shared index
+    """
+    return get_shared_object(catalog_version, ('similarity_index', embedding_store.store_dir_path, backend, str(row_count)), build)
@@ -0,0 +1,743 @@
+from abc import ABC, abstractmethod
+from typing import Any, Optional, cast
+import argparse
+import copy
+import hashlib
+import json
+import os
+import time
+
+from services.constants import EMBEDDING_PCA_DIMENSION, EMBEDDING_PRECISION
+
+import numpy as np
+
+# Constants
+EMBEDDING_PRECISION_FLOAT16: str = 'float16'
+EMBEDDING_PRECISION_FLOAT32: str = 'float32'
+EMBEDDING_PRECISION_INT8: str = 'int8'
+EMBEDDING_PRECISIONS: list[str] = [EMBEDDING_PRECISION_FLOAT32, EMBEDDING_PRECISION_FLOAT16, EMBEDDING_PRECISION_INT8]
+ERROR_MESSAGE_INDEX_NOT_BUILT: str = 'Similarity index is not built.'
+ERROR_MESSAGE_UNKNOWN_BACKEND: str = 'Unknown similarity index backend: {}.'
+ERROR_MESSAGE_UNKNOWN_PRECISION: str = 'Unknown embedding precision: {}.'
+INDEX_BUILD_BLOCK_SIZE: int = 65536
+INT8_MAX_CODE: int = 127
+IVF_DEFAULT_N_PROBE: int = 8
+IVF_KMEANS_ITERATIONS: int = 10
+IVF_KMEANS_SEED: int = 0
+QUANTIZED_RERANK_FACTOR: int = 4 # candidates re-ranked exactly per requested result
+QUANTIZED_RERANK_MIN_CANDIDATES: int = 40
+QUANTIZED_SCAN_BLOCK_SIZE: int = 4096 # rows converted to float32 at once, small enough to stay in cache
+SIMILARITY_INDEX_BACKEND_EXACT: str = 'exact'
+SIMILARITY_INDEX_BACKEND_IVF: str = 'ivf'
+SIMILARITY_INDEX_BACKEND_QUANTIZED: str = 'quantized'
+SIMILARITY_INDEX_DIR_PATH: str = 'data/indexes'
+
+
+class SimilarityIndexException(Exception):
+    """An Exception in a SimilarityIndex, do nothing.
+    """
+    pass
+
+
+def compute_norms(embeddings: np.ndarray) -> np.ndarray:
+    """Compute the L2 norm of every row, guarding against division by zero.
+
+    Parameters
+    ----------
+    embeddings: np.ndarray
+        The embedding matrix
+
+    Returns
+    -------
+    np.ndarray
+        The float32 norm of every row, at least a tiny epsilon
+    """
+    norms = np.empty(embeddings.shape[0], dtype=np.float32)
+    for start in range(0, embeddings.shape[0], INDEX_BUILD_BLOCK_SIZE):
+        norms[start:start + INDEX_BUILD_BLOCK_SIZE] = np.linalg.norm(embeddings[start:start + INDEX_BUILD_BLOCK_SIZE], axis=1)
+    return np.maximum(norms, 1e-12)
+
+
+def normalize_queries(query_embeddings: np.ndarray) -> np.ndarray:
+    """Scale query embeddings to unit length.
+
+    Parameters
+    ----------
+    query_embeddings: np.ndarray
+        A (queries x dimension) matrix or a single query vector
+
+    Returns
+    -------
+    np.ndarray
+        The float32 (queries x dimension) unit length queries
+    """
+    query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+    return query_embeddings / compute_norms(query_embeddings)[:, None]
+
+
+def select_top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Select the positions of the top_k highest scores of every row, best first.
+
+    Parameters
+    ----------
+    scores: np.ndarray
+        A (queries x candidates) score matrix
+    top_k: int
+        The number of positions to select per row
+
+    Returns
+    -------
+    np.ndarray
+        A (queries x min(top_k, candidates)) matrix of positions
+    """
+    top_k = min(top_k, scores.shape[1])
+    if top_k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if top_k < scores.shape[1]:
+        positions = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        positions = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, positions, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(positions, order, axis=1)
+
+
+def fingerprint_embeddings(embeddings: np.ndarray, **parameters: Any) -> str:
+    """Fingerprint an embedding matrix and the parameters of a structure built from it.
+
+    Parameters
+    ----------
+    embeddings: np.ndarray
+        The embedding matrix
+    **parameters: Any
+        The parameters of the structure built from the embeddings
+
+    Returns
+    -------
+    str
+        A 16 character hexadecimal fingerprint
+    """
+    fingerprint = hashlib.sha1(np.ascontiguousarray(embeddings).data)
+    fingerprint.update(repr(sorted(parameters.items())).encode('utf-8'))
+    return fingerprint.hexdigest()[:16]
+
+
+class SimilarityIndex(ABC):
+    """Base class of the cosine similarity indexes over the food label embeddings, every backend implements `search`.
+
+    Attributes
+    ----------
+    embeddings: np.ndarray
+        The indexed (items x dimension) embedding matrix, it is referenced, not copied
+    norms: np.ndarray
+        The L2 norm of every indexed embedding
+    """
+    backend: str = ''
+    scan_block_size: int = INDEX_BUILD_BLOCK_SIZE
+
+    def __init__(self):
+        self.embeddings: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.norms: np.ndarray = np.zeros(0, dtype=np.float32)
+
+    def build(self, embeddings: np.ndarray) -> None:
+        """Build the index over an embedding matrix.
+
+        Parameters
+        ----------
+        embeddings: np.ndarray
+            The (items x dimension) embedding matrix to index
+        """
+        self.embeddings = embeddings
+        self.norms = compute_norms(embeddings)
+
+    @abstractmethod
+    def search(self, query_embeddings: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Find the top_k most cosine similar indexed items of every query.
+
+        Parameters
+        ----------
+        query_embeddings: np.ndarray
+            A (queries x dimension) matrix or a single query vector
+        top_k: int
+            The number of items to return per query
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The (queries x k) cosine similarities and item indexes, most similar first
+        """
+
+    def search_ranked(self, query_embeddings: np.ndarray, ranked_rows: np.ndarray, first_positions: np.ndarray,
+                      top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Find the top_k most cosine similar items of every query among a suffix of ranked items.
+
+        The items are ranked by an attribute, e.g. a health score, so the items passing a threshold
+        on it form a suffix of the ranking. Every query is scored against the union of the suffixes
+        in one pass, blocks of the ranking are merged into a running top_k, and the result is exact
+        whatever the backend.
+
+        Parameters
+        ----------
+        query_embeddings: np.ndarray
+            A (queries x dimension) matrix or a single query vector
+        ranked_rows: np.ndarray
+            The item indexes ordered by the attribute
+        first_positions: np.ndarray
+            The position in ranked_rows of the first candidate of every query
+        top_k: int
+            The number of items to return per query
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The (queries x k) cosine similarities and item indexes, most similar first,
+            padded with -inf and -1 where a query has fewer than top_k candidates
+        """
+        query_embeddings = normalize_queries(query_embeddings)
+        first_positions = np.asarray(first_positions, dtype=np.int64)
+        top_scores = np.full((query_embeddings.shape[0], top_k), -np.inf, dtype=np.float32)
+        top_indices = np.full((query_embeddings.shape[0], top_k), -1, dtype=np.int64)
+        first_position = int(first_positions.min()) if len(first_positions) else len(ranked_rows)
+        for start in range(first_position, len(ranked_rows), self.scan_block_size):
+            candidate_rows = ranked_rows[start:start + self.scan_block_size]
+            candidate_scores = self.score_candidates(query_embeddings, candidate_rows)
+            candidate_positions = np.arange(start, start + len(candidate_rows))
+            candidate_scores[candidate_positions[None, :] < first_positions[:, None]] = -np.inf
+            merged_scores = np.concatenate([top_scores, candidate_scores], axis=1)
+            merged_indices = np.concatenate([top_indices, np.broadcast_to(candidate_rows, candidate_scores.shape)], axis=1)
+            positions = select_top_k(merged_scores, top_k)
+            top_scores = np.take_along_axis(merged_scores, positions, axis=1)
+            top_indices = np.take_along_axis(merged_indices, positions, axis=1)
+        top_indices[np.isneginf(top_scores)] = -1
+        return top_scores, top_indices
+
+    def score_candidates(self, query_embeddings: np.ndarray, candidate_rows: np.ndarray) -> np.ndarray:
+        """Score unit length queries against some indexed items, the way the index scans them.
+
+        Parameters
+        ----------
+        query_embeddings: np.ndarray
+            The (queries x dimension) unit length queries
+        candidate_rows: np.ndarray
+            The item indexes to score
+
+        Returns
+        -------
+        np.ndarray
+            The (queries x candidates) float32 cosine similarities
+        """
+        return (query_embeddings @ np.asarray(self.embeddings[candidate_rows], dtype=np.float32).T) / self.norms[candidate_rows]
+
+    def get_scan_bytes(self) -> int:
+        """Get the size of the data a search scans, e.g. to compare the memory of the backends.
+
+        Returns
+        -------
+        int
+            The number of bytes
+        """
+        return self.embeddings.shape[0] * self.embeddings.shape[1] * np.dtype(np.float32).itemsize + self.norms.nbytes
+
+    def save(self, index_file_path: str) -> None:
+        """Save the index structure, the embeddings themselves are not saved.
+
+        Parameters
+        ----------
+        index_file_path: str
+            The `.npz` file to save to
+        """
+        pass
+
+    def load(self, index_file_path: str, embeddings: np.ndarray) -> None:
+        """Load an index structure saved by `save` on top of the embeddings it was built from.
+
+        Parameters
+        ----------
+        index_file_path: str
+            The `.npz` file to load from
+        embeddings: np.ndarray
+            The embedding matrix the index was built from
+        """
+        self.build(embeddings)
+
+    def update(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> 'SimilarityIndex':
+        """Create an index over an updated embedding matrix, reusing the work done for unchanged rows.
+
+        The index itself is not modified, so searches running on it are not disturbed.
+
+        Parameters
+        ----------
+        embeddings: np.ndarray
+            The updated (items x dimension) embedding matrix
+        kept_rows: np.ndarray
+            The row of every updated item in the current embeddings, -1 for new or changed items
+
+        Returns
+        -------
+        SimilarityIndex
+            The updated index
+        """
+        similarity_index = copy.copy(self)
+        kept = kept_rows >= 0
+        norms = np.empty(embeddings.shape[0], dtype=np.float32)
+        norms[kept] = self.norms[kept_rows[kept]]
+        norms[~kept] = compute_norms(np.asarray(embeddings[~kept], dtype=np.float32))
+        similarity_index.embeddings = embeddings
+        similarity_index.norms = norms
+        return similarity_index
+
+    def get_parameters(self) -> dict[str, Any]:
+        """Get the tunable parameters of the index.
+
+        Returns
+        -------
+        dict[str, Any]
+            The parameters by name
+        """
+        return {}
+
+
+class ExactSimilarityIndex(SimilarityIndex):
+    """Brute-force cosine similarity against every indexed embedding.
+    """
+    backend: str = SIMILARITY_INDEX_BACKEND_EXACT
+
+    def search(self, query_embeddings: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        query_embeddings = normalize_queries(query_embeddings)
+        scores = (query_embeddings @ self.embeddings.T) / self.norms
+        indices = select_top_k(scores, top_k)
+        return np.take_along_axis(scores, indices, axis=1), indices
+
+
+class IvfSimilarityIndex(SimilarityIndex):
+    """Inverted file index: items are clustered by spherical k-means and a query only scans
+    the items of the n_probe clusters whose centroids are most similar to it.
+
+    Recall grows and speed drops with n_probe / n_lists, use `evaluate_recall` to pick them.
+
+    Attributes
+    ----------
+    n_lists: int
+        The number of clusters, defaults to the square root of the number of items
+    n_probe: int
+        The number of clusters scanned per query
+    centroids: np.ndarray
+        The (n_lists x dimension) unit length cluster centroids
+    list_offsets: np.ndarray
+        The start of every cluster in list_rows, plus the total length
+    list_rows: np.ndarray
+        The item indexes grouped per cluster
+    """
+    backend: str = SIMILARITY_INDEX_BACKEND_IVF
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = IVF_DEFAULT_N_PROBE):
+        super().__init__()
+        self.n_lists: Optional[int] = n_lists
+        self.n_probe = n_probe
+        self.centroids: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.list_offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+        self.list_rows: np.ndarray = np.zeros(0, dtype=np.int64)
+
+    def build(self, embeddings: np.ndarray) -> None:
+        super().build(embeddings)
+        item_count = embeddings.shape[0]
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(item_count)))
+        n_lists = max(1, min(self.n_lists, item_count))
+        random_generator = np.random.default_rng(IVF_KMEANS_SEED)
+        seed_rows = np.sort(random_generator.choice(item_count, size=n_lists, replace=False)) if item_count else np.zeros(0, dtype=np.int64)
+        centroids = np.asarray(embeddings[seed_rows], dtype=np.float32) / self.norms[seed_rows, None]
+
+        assignments = np.zeros(item_count, dtype=np.int64)
+        for _ in range(IVF_KMEANS_ITERATIONS):
+            assignments = self.__assign(centroids)
+            centroid_sums = np.zeros_like(centroids)
+            for start in range(0, item_count, INDEX_BUILD_BLOCK_SIZE):
+                block = np.asarray(embeddings[start:start + INDEX_BUILD_BLOCK_SIZE], dtype=np.float32) / self.norms[start:start + INDEX_BUILD_BLOCK_SIZE, None]
+                np.add.at(centroid_sums, assignments[start:start + INDEX_BUILD_BLOCK_SIZE], block)
+            # empty clusters keep their previous centroid
+            filled = np.linalg.norm(centroid_sums, axis=1) > 0
+            centroids[filled] = centroid_sums[filled] / np.linalg.norm(centroid_sums[filled], axis=1)[:, None]
+        assignments = self.__assign(centroids)
+
+        self.centroids = centroids
+        self.list_rows = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+
+    def search(self, query_embeddings: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.centroids.shape[0] == 0 and self.embeddings.shape[0] > 0:
+            raise SimilarityIndexException(ERROR_MESSAGE_INDEX_NOT_BUILT)
+        query_embeddings = normalize_queries(query_embeddings)
+        top_k = min(top_k, self.embeddings.shape[0])
+        if top_k <= 0:
+            return np.zeros((query_embeddings.shape[0], 0), dtype=np.float32), np.zeros((query_embeddings.shape[0], 0), dtype=np.int64)
+        list_sizes = np.diff(self.list_offsets)
+        list_order = np.argsort(-(query_embeddings @ self.centroids.T), axis=1)
+        all_scores = np.zeros((query_embeddings.shape[0], top_k), dtype=np.float32)
+        all_indices = np.zeros((query_embeddings.shape[0], top_k), dtype=np.int64)
+        for query_index, query_embedding in enumerate(query_embeddings):
+            # probe at least n_probe lists, and more when they hold fewer than top_k items
+            probe_count = min(self.n_probe, len(list_sizes))
+            while probe_count < len(list_sizes) and list_sizes[list_order[query_index, :probe_count]].sum() < top_k:
+                probe_count += 1
+            candidate_rows = np.concatenate([self.list_rows[self.list_offsets[list_index]:self.list_offsets[list_index + 1]]
+                                             for list_index in list_order[query_index, :probe_count]])
+            candidate_scores = (self.embeddings[candidate_rows] @ query_embedding) / self.norms[candidate_rows]
+            positions = select_top_k(candidate_scores[None, :], top_k)[0]
+            all_scores[query_index] = candidate_scores[positions]
+            all_indices[query_index] = candidate_rows[positions]
+        return all_scores, all_indices
+
+    def save(self, index_file_path: str) -> None:
+        np.savez(index_file_path, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+
+    def load(self, index_file_path: str, embeddings: np.ndarray) -> None:
+        SimilarityIndex.build(self, embeddings)
+        with np.load(index_file_path) as index_file:
+            self.centroids = index_file['centroids']
+            self.list_offsets = index_file['list_offsets']
+            self.list_rows = index_file['list_rows']
+        self.n_lists = self.centroids.shape[0]
+        if self.list_offsets[-1] != embeddings.shape[0]:
+            raise SimilarityIndexException(ERROR_MESSAGE_INDEX_NOT_BUILT)
+
+    def update(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> 'SimilarityIndex':
+        # the centroids are kept, only new and changed items are assigned to their nearest centroid
+        if self.centroids.shape[0] == 0:
+            similarity_index = IvfSimilarityIndex(n_lists=self.n_lists, n_probe=self.n_probe)
+            similarity_index.build(embeddings)
+            return similarity_index
+        similarity_index = cast(IvfSimilarityIndex, super().update(embeddings, kept_rows))
+        previous_assignments = np.empty(self.embeddings.shape[0], dtype=np.int64)
+        previous_assignments[self.list_rows] = np.repeat(np.arange(len(self.list_offsets) - 1), np.diff(self.list_offsets))
+        kept = kept_rows >= 0
+        assignments = np.empty(embeddings.shape[0], dtype=np.int64)
+        assignments[kept] = previous_assignments[kept_rows[kept]]
+        assignments[~kept] = np.argmax(np.asarray(embeddings[~kept], dtype=np.float32) @ self.centroids.T, axis=1)
+        similarity_index.list_rows = np.argsort(assignments, kind='stable')
+        similarity_index.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(
+            assignments, minlength=self.centroids.shape[0]))]).astype(np.int64)
+        return similarity_index
+
+    def get_parameters(self) -> dict[str, Any]:
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe}
+
+    def __assign(self, centroids: np.ndarray) -> np.ndarray:
+        """Assign every indexed embedding to its most similar centroid.
+        """
+        assignments = np.empty(self.embeddings.shape[0], dtype=np.int64)
+        for start in range(0, self.embeddings.shape[0], INDEX_BUILD_BLOCK_SIZE):
+            block = np.asarray(self.embeddings[start:start + INDEX_BUILD_BLOCK_SIZE], dtype=np.float32)
+            assignments[start:start + INDEX_BUILD_BLOCK_SIZE] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+
+class QuantizedSimilarityIndex(SimilarityIndex):
+    """Scans a compact copy of the unit length embeddings and re-ranks the best candidates exactly.
+
+    The embeddings are optionally projected on their pca_dimension principal directions and stored
+    as float16, or as int8 with one scale per dimension. A search scores every item on this copy,
+    keeps QUANTIZED_RERANK_FACTOR candidates per requested result and re-ranks them with the float32
+    embeddings, so the returned scores are exact and only the ranking of the scan is approximate.
+    The float32 embeddings stay memory mapped from the embedding store, only the re-ranked rows are read.
+
+    Use `evaluate_recall` to compare the precisions and dimensions on the catalog.
+
+    Attributes
+    ----------
+    precision: str
+        The precision of the scanned copy, 'float32', 'float16' or 'int8'
+    pca_dimension: int
+        The number of principal directions kept, 0 keeps every dimension
+    rerank_factor: int
+        The number of candidates re-ranked exactly per requested result
+    components: np.ndarray
+        The (dimension x kept dimensions) projection, the identity without PCA
+    scales: np.ndarray
+        The scale of every kept dimension, int8 codes times the scale approximate the projection
+    codes: np.ndarray
+        The (items x kept dimensions) scanned copy of the embeddings
+    """
+    backend: str = SIMILARITY_INDEX_BACKEND_QUANTIZED
+    scan_block_size: int = QUANTIZED_SCAN_BLOCK_SIZE
+
+    def __init__(self, precision: str = EMBEDDING_PRECISION, pca_dimension: int = EMBEDDING_PCA_DIMENSION,
+                 rerank_factor: int = QUANTIZED_RERANK_FACTOR):
+        super().__init__()
+        if precision not in EMBEDDING_PRECISIONS:
+            raise SimilarityIndexException(ERROR_MESSAGE_UNKNOWN_PRECISION.format(precision))
+        self.precision = precision
+        self.pca_dimension = pca_dimension
+        self.rerank_factor = rerank_factor
+        self.components: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.scales: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.codes: np.ndarray = np.zeros((0, 0), dtype=np.dtype(precision))
+
+    def build(self, embeddings: np.ndarray) -> None:
+        super().build(embeddings)
+        dimension = embeddings.shape[1]
+        if 0 < self.pca_dimension < dimension:
+            # the directions of largest variance of the unit embeddings, uncentered so dot products are kept
+            second_moments = np.zeros((dimension, dimension), dtype=np.float64)
+            for start in range(0, embeddings.shape[0], INDEX_BUILD_BLOCK_SIZE):
+                block = self.__normalize_rows(start, start + INDEX_BUILD_BLOCK_SIZE)
+                second_moments += block.T.astype(np.float64) @ block
+            eigenvalues, eigenvectors = np.linalg.eigh(second_moments)
+            self.components = np.ascontiguousarray(eigenvectors[:, np.argsort(-eigenvalues)[:self.pca_dimension]], dtype=np.float32)
+        else:
+            self.components = np.eye(dimension, dtype=np.float32)
+
+        self.scales = np.ones(self.components.shape[1], dtype=np.float32)
+        if self.precision == EMBEDDING_PRECISION_INT8:
+            maximums = np.zeros(self.components.shape[1], dtype=np.float32)
+            for start in range(0, embeddings.shape[0], INDEX_BUILD_BLOCK_SIZE):
+                projected = self.__normalize_rows(start, start + INDEX_BUILD_BLOCK_SIZE) @ self.components
+                maximums = np.maximum(maximums, np.abs(projected).max(axis=0, initial=0.0))
+            self.scales = np.maximum(maximums, 1e-12) / INT8_MAX_CODE
+        self.codes = self.__encode(np.arange(embeddings.shape[0]))
+
+    def search(self, query_embeddings: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.codes.shape[0] != self.embeddings.shape[0]:
+            raise SimilarityIndexException(ERROR_MESSAGE_INDEX_NOT_BUILT)
+        query_embeddings = normalize_queries(query_embeddings)
+        scan_queries = self.__project_queries(query_embeddings)
+        scan_scores = np.empty((query_embeddings.shape[0], self.codes.shape[0]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], self.scan_block_size):
+            scan_scores[:, start:start + self.scan_block_size] = \
+                scan_queries @ np.asarray(self.codes[start:start + self.scan_block_size], dtype=np.float32).T
+        return self.__rerank(query_embeddings, select_top_k(scan_scores, self.__get_candidate_count(top_k)), top_k)
+
+    def search_ranked(self, query_embeddings: np.ndarray, ranked_rows: np.ndarray, first_positions: np.ndarray,
+                      top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        # the scan pads missing candidates with -1, the re-rank keeps the padding
+        candidate_indices = super().search_ranked(query_embeddings, ranked_rows, first_positions, self.__get_candidate_count(top_k))[1]
+        return self.__rerank(normalize_queries(query_embeddings), candidate_indices, top_k)
+
+    def score_candidates(self, query_embeddings: np.ndarray, candidate_rows: np.ndarray) -> np.ndarray:
+        return self.__project_queries(query_embeddings) @ np.asarray(self.codes[candidate_rows], dtype=np.float32).T
+
+    def get_scan_bytes(self) -> int:
+        return self.codes.nbytes + self.components.nbytes + self.scales.nbytes
+
+    def save(self, index_file_path: str) -> None:
+        np.savez(index_file_path, components=self.components, scales=self.scales, codes=self.codes)
+
+    def load(self, index_file_path: str, embeddings: np.ndarray) -> None:
+        SimilarityIndex.build(self, embeddings)
+        with np.load(index_file_path) as index_file:
+            self.components = index_file['components']
+            self.scales = index_file['scales']
+            self.codes = index_file['codes']
+        if self.codes.shape[0] != embeddings.shape[0] or self.codes.dtype != np.dtype(self.precision):
+            raise SimilarityIndexException(ERROR_MESSAGE_INDEX_NOT_BUILT)
+
+    def update(self, embeddings: np.ndarray, kept_rows: np.ndarray) -> 'SimilarityIndex':
+        # the projection and the scales are kept, only new and changed items are encoded
+        if self.codes.shape[0] != self.embeddings.shape[0] or self.components.shape[0] == 0:
+            similarity_index = QuantizedSimilarityIndex(self.precision, self.pca_dimension, self.rerank_factor)
+            similarity_index.build(embeddings)
+            return similarity_index
+        similarity_index = cast(QuantizedSimilarityIndex, super().update(embeddings, kept_rows))
+        kept = kept_rows >= 0
+        codes = np.empty((embeddings.shape[0], self.codes.shape[1]), dtype=self.codes.dtype)
+        codes[kept] = self.codes[kept_rows[kept]]
+        codes[~kept] = similarity_index.__encode(np.flatnonzero(~kept))
+        similarity_index.codes = codes
+        return similarity_index
+
+    def get_parameters(self) -> dict[str, Any]:
+        return {'precision': self.precision, 'pca_dimension': self.pca_dimension, 'rerank_factor': self.rerank_factor}
+
+    def __normalize_rows(self, start: int, end: int) -> np.ndarray:
+        """Get a block of consecutive embeddings scaled to unit length.
+        """
+        return np.asarray(self.embeddings[start:end], dtype=np.float32) / self.norms[start:end, None]
+
+    def __encode(self, rows: np.ndarray) -> np.ndarray:
+        """Project and quantize the unit length embeddings of some items.
+        """
+        codes = np.empty((len(rows), self.components.shape[1]), dtype=np.dtype(self.precision))
+        for start in range(0, len(rows), INDEX_BUILD_BLOCK_SIZE):
+            block_rows = rows[start:start + INDEX_BUILD_BLOCK_SIZE]
+            projected = (np.asarray(self.embeddings[block_rows], dtype=np.float32) / self.norms[block_rows, None]) @ self.components
+            if self.precision == EMBEDDING_PRECISION_INT8:
+                projected = np.clip(np.rint(projected / self.scales), -INT8_MAX_CODE, INT8_MAX_CODE)
+            codes[start:start + INDEX_BUILD_BLOCK_SIZE] = projected
+        return codes
+
+    def __project_queries(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Project unit length queries so their product with the codes approximates the cosine similarity.
+        """
+        return (query_embeddings @ self.components) * self.scales
+
+    def __get_candidate_count(self, top_k: int) -> int:
+        """Get the number of scan candidates re-ranked exactly for top_k results.
+        """
+        return max(top_k * self.rerank_factor, top_k, QUANTIZED_RERANK_MIN_CANDIDATES)
+
+    def __rerank(self, query_embeddings: np.ndarray, candidate_indices: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score the scan candidates of unit length queries with the float32 embeddings and keep the top_k.
+        """
+        valid = candidate_indices >= 0
+        candidate_rows = np.where(valid, candidate_indices, 0)
+        candidate_embeddings = np.asarray(self.embeddings[candidate_rows.ravel()], dtype=np.float32).reshape(
+            candidate_rows.shape + (self.embeddings.shape[1],))
+        candidate_scores = np.einsum('qcd,qd->qc', candidate_embeddings, query_embeddings) / self.norms[candidate_rows]
+        candidate_scores[~valid] = -np.inf
+        positions = select_top_k(candidate_scores, top_k)
+        top_scores = np.take_along_axis(candidate_scores, positions, axis=1)
+        top_indices = np.take_along_axis(candidate_indices, positions, axis=1)
+        top_indices[np.isneginf(top_scores)] = -1
+        return top_scores, top_indices
+
+
+def create_similarity_index(backend: str, **parameters: Any) -> SimilarityIndex:
+    """Create an empty SimilarityIndex of the given backend.
+
+    Parameters
+    ----------
+    backend: str
+        'exact', 'ivf' or 'quantized'
+    **parameters: Any
+        The tunable parameters of the backend, e.g. n_lists and n_probe for 'ivf'
+        or precision and pca_dimension for 'quantized'
+
+    Returns
+    -------
+    SimilarityIndex
+        The unbuilt index
+    """
+    if backend == SIMILARITY_INDEX_BACKEND_EXACT:
+        return ExactSimilarityIndex()
+    if backend == SIMILARITY_INDEX_BACKEND_IVF:
+        return IvfSimilarityIndex(**parameters)
+    if backend == SIMILARITY_INDEX_BACKEND_QUANTIZED:
+        return QuantizedSimilarityIndex(**parameters)
+    raise SimilarityIndexException(ERROR_MESSAGE_UNKNOWN_BACKEND.format(backend))
+
+
+def load_or_build_similarity_index(backend: str, embeddings: np.ndarray,
+                                   index_dir_path: str = SIMILARITY_INDEX_DIR_PATH, **parameters: Any) -> SimilarityIndex:
+    """Load a saved index for these embeddings and parameters, or build and save a new one.
+
+    Parameters
+    ----------
+    backend: str
+        'exact', 'ivf' or 'quantized'
+    embeddings: np.ndarray
+        The embedding matrix to index
+    index_dir_path: str
+        The directory saved indexes are kept in
+    **parameters: Any
+        The tunable parameters of the backend
+
+    Returns
+    -------
+    SimilarityIndex
+        The built index
+    """
+    similarity_index = create_similarity_index(backend, **parameters)
+    if backend == SIMILARITY_INDEX_BACKEND_EXACT:
+        similarity_index.build(embeddings)
+        return similarity_index
+
+    # the parameters include the defaults, e.g. the configured precision
+    index_file_path = os.path.join(index_dir_path, '{}-{}.npz'.format(
+        backend, fingerprint_embeddings(embeddings, **similarity_index.get_parameters())))
+    if os.path.exists(index_file_path):
+        try:
+            similarity_index.load(index_file_path, embeddings)
+            return similarity_index
+        except (OSError, ValueError, KeyError, SimilarityIndexException):
+            similarity_index = create_similarity_index(backend, **parameters)
+    similarity_index.build(embeddings)
+    try:
+        os.makedirs(index_dir_path, exist_ok=True)
+        similarity_index.save(index_file_path)
+    except OSError:
+        pass
+    return similarity_index
+
+
+def evaluate_recall(similarity_index: SimilarityIndex, query_embeddings: np.ndarray, top_k: int = 10) -> dict[str, Any]:
+    """Compare an index against exact search on the same embeddings.
+
+    Parameters
+    ----------
+    similarity_index: SimilarityIndex
+        The built index to evaluate
+    query_embeddings: np.ndarray
+        The (queries x dimension) queries to evaluate with, e.g. a sample of the catalog embeddings
+    top_k: int
+        The number of results per query
+
+    Returns
+    -------
+    dict[str, Any]
+        The backend, its parameters, the mean recall@k against exact search (the share of the
+        exact top_k it agrees on), the mean per query latency in milliseconds and the megabytes
+        scanned per query of both
+    """
+    exact_index = ExactSimilarityIndex()
+    exact_index.build(similarity_index.embeddings)
+    query_embeddings = np.atleast_2d(query_embeddings)
+
+    started_at = time.perf_counter()
+    exact_indices = [exact_index.search(query_embedding, top_k)[1][0] for query_embedding in query_embeddings]
+    exact_latency_ms = (time.perf_counter() - started_at) * 1000 / max(len(query_embeddings), 1)
+    started_at = time.perf_counter()
+    indices = [similarity_index.search(query_embedding, top_k)[1][0] for query_embedding in query_embeddings]
+    latency_ms = (time.perf_counter() - started_at) * 1000 / max(len(query_embeddings), 1)
+
+    recalls = [len(set(found.tolist()) & set(expected.tolist())) / max(len(expected), 1)
+               for found, expected in zip(indices, exact_indices)]
+    return {'backend': similarity_index.backend,
+            'parameters': similarity_index.get_parameters(),
+            'top_k': top_k,
+            'queries': len(query_embeddings),
+            'recall': float(np.mean(recalls)) if recalls else 1.0,
+            'latency_ms': latency_ms,
+            'exact_latency_ms': exact_latency_ms,
+            'scan_mb': similarity_index.get_scan_bytes() / 2**20,
+            'exact_scan_mb': exact_index.get_scan_bytes() / 2**20}
+
+
+if __name__ == '__main__':
+    # Recall-vs-exact report on the catalog embeddings, e.g.
+    # python -m services.similarity_index --n-lists 64 --n-probe 1 2 4 8 16
+    # python -m services.similarity_index --backend quantized --precision float16 int8 --pca-dimension 0 128
+    from services.catalog_service import get_catalog
+    from services.constants import EMBEDDER_MODEL_NAME
+    from services.embedder_service import get_embedder, get_embedder_revision
+    from services.embedding_store import EmbeddingStore
+    from models.food_labels import FoodLabels
+
+    argument_parser = argparse.ArgumentParser(description='Report the recall and scanned memory of a backend against exact search.')
+    argument_parser.add_argument('--backend', choices=[SIMILARITY_INDEX_BACKEND_IVF, SIMILARITY_INDEX_BACKEND_QUANTIZED],
+                                 default=SIMILARITY_INDEX_BACKEND_IVF)
+    argument_parser.add_argument('--n-lists', type=int, default=None)
+    argument_parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    argument_parser.add_argument('--precision', choices=EMBEDDING_PRECISIONS, nargs='+',
+                                 default=[EMBEDDING_PRECISION_FLOAT16, EMBEDDING_PRECISION_INT8])
+    argument_parser.add_argument('--pca-dimension', type=int, nargs='+', default=[0])
+    argument_parser.add_argument('--rerank-factor', type=int, default=QUANTIZED_RERANK_FACTOR)
+    argument_parser.add_argument('--top-k', type=int, default=10)
+    argument_parser.add_argument('--queries', type=int, default=200)
+    arguments = argument_parser.parse_args()
+
+    # every label row the search service indexes, the store keeps one generation so the services' labels are kept
+    food_labels = FoodLabels(list(get_catalog().food_items_by_food_item_uri.values())).labels
+    catalog_embeddings = EmbeddingStore(EMBEDDER_MODEL_NAME, get_embedder_revision()).get_embeddings(food_labels, get_embedder())
+    query_rows = np.random.default_rng(IVF_KMEANS_SEED).choice(
+        len(food_labels), size=min(arguments.queries, len(food_labels)), replace=False)
+    if arguments.backend == SIMILARITY_INDEX_BACKEND_IVF:
+        ivf_index = IvfSimilarityIndex(n_lists=arguments.n_lists)
+        ivf_index.build(catalog_embeddings)
+        for n_probe in arguments.n_probe:
+            ivf_index.n_probe = n_probe
+            print(json.dumps(evaluate_recall(ivf_index, catalog_embeddings[query_rows], arguments.top_k)))
+    else:
+        for precision in arguments.precision:
+            for pca_dimension in arguments.pca_dimension:
+                quantized_index = QuantizedSimilarityIndex(precision, pca_dimension, arguments.rerank_factor)
+                quantized_index.build(catalog_embeddings)
+                print(json.dumps(evaluate_recall(quantized_index, catalog_embeddings[query_rows], arguments.top_k)))
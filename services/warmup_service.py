@@ -0,0 +1,188 @@
+from typing import Any, Callable, Optional
+from services.constants import WARMUP_WAIT_TIMEOUT_SECONDS
+import os
+import threading
+import time
+
+# Constants
+ERROR_MESSAGE_COMPONENT_FAILED: str = '{} failed to load.'
+ERROR_MESSAGE_COMPONENT_NOT_READY: str = '{} is still loading, retry later.'
+STATE_FAILED: str = 'failed'
+STATE_LOADING: str = 'loading'
+STATE_PENDING: str = 'pending'
+STATE_READY: str = 'ready'
+
+
+class ComponentNotReadyException(Exception):
+    """An Exception for a component that is not loaded yet or failed to load, do nothing.
+    """
+    pass
+
+
+class LazyComponent:
+    """A LazyComponent builds an expensive object, e.g. a model-backed service, in a background thread.
+
+    Requests that need the object wait for it up to a timeout, so the server accepts connections
+    and serves everything else while the object loads. Threads do not survive a fork, so a forked
+    worker restarts a load its parent had not finished.
+
+    Attributes
+    ----------
+    name: str
+        The name the component is reported under
+    state: str
+        'pending', 'loading', 'ready' or 'failed'
+    load_duration_seconds: Optional[float]
+        How long the last load took, None while it is running
+    error: Optional[str]
+        The error of a failed load
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        """Create a LazyComponent, nothing is loaded before `start` or `get`.
+
+        Parameters
+        ----------
+        name: str
+            The name the component is reported under
+        factory: Callable[[], Any]
+            Builds the object
+        """
+        self.name = name
+        self.state = STATE_PENDING
+        self.load_duration_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.__factory = factory
+        self.__value: Any = None
+        self.__loaded = threading.Event()
+        self.__loader_pid: Optional[int] = None
+        self.__lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start loading in a background thread, unless this process already loads or loaded the component.
+        A failed load is started again.
+        """
+        with self.__lock:
+            if self.state == STATE_READY or (self.state == STATE_LOADING and self.__loader_pid == os.getpid()):
+                return
+            self.state = STATE_LOADING
+            self.error = None
+            self.__loaded = threading.Event()
+            self.__loader_pid = os.getpid()
+            threading.Thread(target=self.__load, args=(self.__loaded,), daemon=True).start()
+
+    def get(self, timeout_seconds: Optional[float] = WARMUP_WAIT_TIMEOUT_SECONDS) -> Any:
+        """Get the object, waiting for it to load.
+
+        Parameters
+        ----------
+        timeout_seconds: Optional[float]
+            How long to wait, None waits until the load ends
+
+        Returns
+        -------
+        Any
+            The loaded object
+        """
+        if self.state != STATE_READY:
+            self.start()
+            self.__loaded.wait(timeout_seconds)
+        if self.state == STATE_FAILED:
+            raise ComponentNotReadyException(ERROR_MESSAGE_COMPONENT_FAILED.format(self.name))
+        if self.state != STATE_READY:
+            raise ComponentNotReadyException(ERROR_MESSAGE_COMPONENT_NOT_READY.format(self.name))
+        return self.__value
+
+    def replace(self, value: Any) -> None:
+        """Publish a new object, e.g. a service updated for a new catalog, requests that already got the previous one keep it.
+
+        Parameters
+        ----------
+        value: Any
+            The object that replaces the loaded one
+        """
+        self.__value = value
+
+    def get_status(self) -> dict[str, Any]:
+        """Get the load state of the component.
+
+        Returns
+        -------
+        dict[str, Any]
+            The state, the load duration and the error of a failed load
+        """
+        return {'state': self.state,
+                'load_duration_seconds': self.load_duration_seconds,
+                'error': self.error}
+
+    def __load(self, loaded: threading.Event) -> None:
+        """Build the object and publish it.
+
+        Parameters
+        ----------
+        loaded: threading.Event
+            Set when the load ends, successfully or not
+        """
+        started_at = time.perf_counter()
+        try:
+            self.__value = self.__factory()
+            self.state = STATE_READY
+        except Exception as error:
+            self.error = '{}: {}'.format(type(error).__name__, error)
+            self.state = STATE_FAILED
+        self.load_duration_seconds = time.perf_counter() - started_at
+        loaded.set()
+
+
+components: list[LazyComponent] = []
+
+
+def register_component(name: str, factory: Callable[[], Any]) -> LazyComponent:
+    """Create a LazyComponent that is reported by `get_component_statuses` and waited for by `wait_for_components`.
+
+    Parameters
+    ----------
+    name: str
+        The name the component is reported under
+    factory: Callable[[], Any]
+        Builds the object
+
+    Returns
+    -------
+    LazyComponent
+        The registered component
+    """
+    component = LazyComponent(name, factory)
+    components.append(component)
+    return component
+
+
+def start_components() -> None:
+    """Start loading all registered components in the background, one after another in registration order.
+
+    Components load sequentially so that they do not compete for the CPU, and later components
+    reuse what earlier ones stored, e.g. the catalog embeddings. A request for a component that
+    has not started yet starts it right away.
+    """
+    threading.Thread(target=wait_for_components, daemon=True).start()
+
+
+def wait_for_components() -> None:
+    """Wait until every registered component is loaded or failed.
+    """
+    for component in components:
+        try:
+            component.get(timeout_seconds=None)
+        except ComponentNotReadyException:
+            pass
+
+
+def get_component_statuses() -> dict[str, dict[str, Any]]:
+    """Get the load state of all registered components.
+
+    Returns
+    -------
+    dict[str, dict[str, Any]]
+        The status of every component keyed by name
+    """
+    return {component.name: component.get_status() for component in components}
@@ -0,0 +1,110 @@
+
+import json
+import os
+from services import catalog_service
+from services.catalog_service import CatalogService, discover_data_file_paths
+from services.catalog_store import CatalogStore
+from services.food_item_service import FoodItemService
+
+EXEMPLAR_FOOD_ITEM_URI: str = 'http://www.foodvoc.org/resource/nevo#foodItem1'
+EXEMPLAR_NUTRIENT_URI: str = 'http://www.foodvoc.org/resource/nevo#nutrientPROT'
+
+
+def write_data_files(data_dir_path: str, food_item_label: str) -> tuple[str, str]:
+    """Write a one item food label file and nutrient file, return their paths.
+    """
+    food_items_data_file_path = os.path.join(data_dir_path, 'food_item_labels.json')
+    nutrient_amounts_data_file_path = os.path.join(data_dir_path, 'nutrient_amounts_for_food_items.json')
+    with open(food_items_data_file_path, 'w') as data_file:
+        json.dump({'data': [{'pref_labels': [{'label': food_item_label, 'language': 'en'}],
+                             'uri': EXEMPLAR_FOOD_ITEM_URI}]}, data_file)
+    with open(nutrient_amounts_data_file_path, 'w') as data_file:
+        json.dump({'data': [{'food_items_with_nutrients': [{'food_item_uri': EXEMPLAR_FOOD_ITEM_URI, 'nutrients': [
+            {'food_item_uri': EXEMPLAR_FOOD_ITEM_URI, 'uri': EXEMPLAR_NUTRIENT_URI, 'label_en': 'protein, total',
+             'unit': 'g', 'value': 2.0}]}]}]}, data_file)
+    return food_items_data_file_path, nutrient_amounts_data_file_path
+
+
+def use_data_files(monkeypatch, food_items_data_file_path: str, nutrient_amounts_data_file_path: str) -> None:
+    """Point the catalog service at the given data files.
+    """
+    monkeypatch.setattr(catalog_service, 'CATALOG_SOURCES_MANIFEST_FILE_PATH', food_items_data_file_path + '.missing')
+    monkeypatch.setattr(catalog_service, 'FOOD_ITEMS_DATA_FILE_PATTERN', food_items_data_file_path)
+    monkeypatch.setattr(catalog_service, 'NUTRIENT_AMOUNTS_FOR_FOOD_ITEMS_DATA_FILE_PATH', nutrient_amounts_data_file_path)
+
+
+class TestClass:
+
+    def test_catalog_is_shared_and_reloaded_on_change(self, tmp_path, monkeypatch):
+        """Test that the snapshot is loaded once and swapped for a new one when a data file changes.
+        """
+        food_items_data_file_path, nutrient_amounts_data_file_path = write_data_files(str(tmp_path), 'Potatoes raw')
+        use_data_files(monkeypatch, food_items_data_file_path, nutrient_amounts_data_file_path)
+        service = CatalogService(reload_check_interval_seconds=0.0, catalog_store=CatalogStore(str(tmp_path / 'catalog')))
+
+        catalog = service.get_catalog()
+        assert service.get_catalog() is catalog
+
+        write_data_files(str(tmp_path), 'Potatoes new raw')
+        os.utime(food_items_data_file_path, ns=(1, 1))
+        reloaded_catalog = service.get_catalog()
+
+        assert reloaded_catalog is not catalog
+        assert reloaded_catalog.version != catalog.version
+        assert FoodItemService(catalog).get_food_item(EXEMPLAR_FOOD_ITEM_URI).label == 'Potatoes raw'
+        assert FoodItemService(reloaded_catalog).get_food_item(EXEMPLAR_FOOD_ITEM_URI).label == 'Potatoes new raw'
+
+    def test_compiled_catalog_is_used_until_the_sources_change(self, tmp_path, monkeypatch):
+        """Test that the compiled catalog loads the same Catalog, and is ignored once a source changes.
+        """
+        food_items_data_file_path, nutrient_amounts_data_file_path = write_data_files(str(tmp_path), 'Potatoes raw')
+        use_data_files(monkeypatch, food_items_data_file_path, nutrient_amounts_data_file_path)
+        catalog_store = CatalogStore(str(tmp_path / 'catalog'))
+        service = CatalogService(reload_check_interval_seconds=0.0, catalog_store=catalog_store)
+        source_catalog = service.load_catalog_from_sources()
+        catalog_store.save(source_catalog, service.stamp_source_files())
+
+        compiled_catalog = catalog_store.load(service.stamp_source_files())
+
+        assert compiled_catalog is not None
+        assert compiled_catalog.version == source_catalog.version
+        assert FoodItemService(compiled_catalog).get_food_item(EXEMPLAR_FOOD_ITEM_URI).label == 'Potatoes raw'
+        assert compiled_catalog.nutrient_matrix.get_value(EXEMPLAR_FOOD_ITEM_URI, EXEMPLAR_NUTRIENT_URI) == 2.0
+        write_data_files(str(tmp_path), 'Potatoes new raw')
+        os.utime(food_items_data_file_path, ns=(1, 1))
+        assert catalog_store.load(service.stamp_source_files()) is None
+
+    def test_data_files_are_discovered_in_numeric_order(self, tmp_path, monkeypatch):
+        """Test that the food item label shards are found by pattern and ordered by the numbers in their names.
+        """
+        for file_name in ['food_item_labels_201_400.json', 'food_item_labels_0_200.json', 'food_item_labels_1001_1200.json']:
+            (tmp_path / file_name).write_text('{"data": []}')
+        monkeypatch.setattr(catalog_service, 'CATALOG_SOURCES_MANIFEST_FILE_PATH', str(tmp_path / 'missing.json'))
+        monkeypatch.setattr(catalog_service, 'FOOD_ITEMS_DATA_FILE_PATTERN', str(tmp_path / 'food_item_labels_*.json'))
+
+        food_items_data_file_paths, _ = discover_data_file_paths()
+
+        assert [os.path.basename(path) for path in food_items_data_file_paths] == [
+            'food_item_labels_0_200.json', 'food_item_labels_201_400.json', 'food_item_labels_1001_1200.json']
+
+    def test_every_preferred_label_is_kept_and_compiled(self, tmp_path, monkeypatch):
+        """Test that the other preferred labels of a food item are loaded after its first label and survive compilation.
+        """
+        food_items_data_file_path, nutrient_amounts_data_file_path = write_data_files(str(tmp_path), 'Potatoes raw')
+        with open(food_items_data_file_path, 'w') as data_file:
+            json.dump({'data': [{'pref_labels': [{'label': 'Potatoes raw', 'language': 'en'},
+                                                 {'label': 'Aardappelen rauw', 'language': 'nl'}],
+                                 'uri': EXEMPLAR_FOOD_ITEM_URI}]}, data_file)
+        use_data_files(monkeypatch, food_items_data_file_path, nutrient_amounts_data_file_path)
+        catalog_store = CatalogStore(str(tmp_path / 'catalog'))
+        service = CatalogService(reload_check_interval_seconds=0.0, catalog_store=catalog_store)
+        source_catalog = service.load_catalog_from_sources()
+        catalog_store.save(source_catalog, service.stamp_source_files())
+
+        compiled_catalog = catalog_store.load(service.stamp_source_files())
+
+        for catalog in (source_catalog, compiled_catalog):
+            food_item = FoodItemService(catalog).get_food_item(EXEMPLAR_FOOD_ITEM_URI)
+            assert food_item.label == 'Potatoes raw'
+            assert food_item.labels == ('Potatoes raw', 'Aardappelen rauw')
+            assert food_item.serialize() == {'uri': EXEMPLAR_FOOD_ITEM_URI, 'label': 'Potatoes raw'}
@@ -0,0 +1,114 @@
+import os
+import numpy as np
+from models.catalog_update import CatalogUpdate, get_kept_rows
+from models.food_item import FoodItem
+from services.catalog_service import CatalogService, get_catalog_diff
+from services.catalog_store import CatalogStore
+from services.food_item_service import FoodItemService
+from services.neighbor_table import NeighborTable
+from services.similarity_index import ExactSimilarityIndex, IvfSimilarityIndex
+from tests.test_catalog_service import EXEMPLAR_FOOD_ITEM_URI, EXEMPLAR_NUTRIENT_URI, use_data_files, write_data_files
+
+EXEMPLAR_ITEM_COUNT: int = 300
+EXEMPLAR_DIMENSION: int = 16
+EXEMPLAR_NEW_FOOD_ITEM_URI: str = 'http://www.foodvoc.org/resource/nevo#foodItem2'
+
+
+def build_updated_embeddings() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Build an embedding matrix and an update of it that removes, changes and adds rows.
+    """
+    rng = np.random.default_rng(7)
+    embeddings = rng.standard_normal((EXEMPLAR_ITEM_COUNT, EXEMPLAR_DIMENSION)).astype(np.float32)
+    uris = [str(row) for row in range(EXEMPLAR_ITEM_COUNT)]
+    updated_uris = [uri for uri in uris if uri not in {'3', '150'}] + ['new-1', 'new-2']
+    kept_rows = get_kept_rows({uri: row for row, uri in enumerate(uris)}, updated_uris, {'10', '200'})
+    updated_embeddings = np.empty((len(updated_uris), EXEMPLAR_DIMENSION), dtype=np.float32)
+    updated_embeddings[kept_rows >= 0] = embeddings[kept_rows[kept_rows >= 0]]
+    updated_embeddings[kept_rows < 0] = rng.standard_normal((int(np.sum(kept_rows < 0)), EXEMPLAR_DIMENSION))
+    return embeddings, updated_embeddings, kept_rows
+
+
+class TestClass:
+
+    def test_neighbor_table_update_matches_full_build(self):
+        """Test that an incrementally updated neighbor table equals a table built from scratch.
+        """
+        embeddings, updated_embeddings, kept_rows = build_updated_embeddings()
+        neighbor_table = NeighborTable(top_k=6)
+        neighbor_table.build(embeddings)
+
+        updated_neighbor_table = neighbor_table.update(updated_embeddings, kept_rows)
+
+        expected_neighbor_table = NeighborTable(top_k=6)
+        expected_neighbor_table.build(updated_embeddings)
+        assert np.allclose(updated_neighbor_table.scores, expected_neighbor_table.scores, atol=1e-5)
+        assert np.mean(updated_neighbor_table.indices == expected_neighbor_table.indices) > 0.99
+        assert neighbor_table.indices.shape[0] == EXEMPLAR_ITEM_COUNT
+
+    def test_similarity_index_update_matches_full_build(self):
+        """Test that updated exact and ivf indexes return the results of a fresh exact index.
+        """
+        embeddings, updated_embeddings, kept_rows = build_updated_embeddings()
+        expected_index = ExactSimilarityIndex()
+        expected_index.build(updated_embeddings)
+        expected_indices = expected_index.search(updated_embeddings[:20], 5)[1]
+
+        for similarity_index in [ExactSimilarityIndex(), IvfSimilarityIndex(n_lists=8, n_probe=8)]:
+            similarity_index.build(embeddings)
+            updated_index = similarity_index.update(updated_embeddings, kept_rows)
+            assert updated_index.search(updated_embeddings[:20], 5)[1].tolist() == expected_indices.tolist()
+            assert similarity_index.embeddings.shape[0] == EXEMPLAR_ITEM_COUNT
+
+    def test_catalog_update_publishes_a_new_snapshot(self, tmp_path, monkeypatch):
+        """Test that an update adds, relabels and removes food items in a new snapshot and leaves the previous one intact.
+        """
+        food_items_data_file_path, nutrient_amounts_data_file_path = write_data_files(str(tmp_path), 'Potatoes raw')
+        use_data_files(monkeypatch, food_items_data_file_path, nutrient_amounts_data_file_path)
+        service = CatalogService(reload_check_interval_seconds=0.0, catalog_store=CatalogStore(str(tmp_path / 'catalog')))
+        catalog = service.get_catalog()
+
+        updated_catalog = service.apply_update(CatalogUpdate(
+            [FoodItem(EXEMPLAR_NEW_FOOD_ITEM_URI, 'Carrots raw')],
+            {EXEMPLAR_NEW_FOOD_ITEM_URI: [{'uri': EXEMPLAR_NUTRIENT_URI, 'label_en': 'protein, total', 'unit': 'g', 'value': 1.0},
+                                          {'uri': 'nutrientFIBT', 'label_en': 'fibre, total dietary', 'unit': 'g', 'value': 3.0}]}))
+        relabelled_catalog = service.apply_update(CatalogUpdate(
+            [FoodItem(EXEMPLAR_FOOD_ITEM_URI, 'Potatoes boiled')], removed_food_item_uris=[EXEMPLAR_NEW_FOOD_ITEM_URI]), persist=True)
+
+        assert service.get_catalog() is relabelled_catalog
+        assert len({catalog.version, updated_catalog.version, relabelled_catalog.version}) == 3
+        assert FoodItemService(catalog).get_food_item(EXEMPLAR_FOOD_ITEM_URI).label == 'Potatoes raw'
+        assert updated_catalog.nutrient_matrix.get_value(EXEMPLAR_NEW_FOOD_ITEM_URI, 'nutrientFIBT') == 3.0
+        assert updated_catalog.nutrient_matrix.get_value(EXEMPLAR_FOOD_ITEM_URI, EXEMPLAR_NUTRIENT_URI) == 2.0
+        assert updated_catalog.nutrient_matrix.get_value(EXEMPLAR_FOOD_ITEM_URI, 'nutrientFIBT') is None
+        assert list(relabelled_catalog.food_items_by_food_item_uri) == [EXEMPLAR_FOOD_ITEM_URI]
+        assert relabelled_catalog.nutrient_matrix.food_item_uris == [EXEMPLAR_FOOD_ITEM_URI]
+        assert CatalogStore(str(tmp_path / 'catalog')).load(service.stamp_source_files()).version == relabelled_catalog.version
+
+    def test_reload_is_described_as_a_catalog_update(self, tmp_path, monkeypatch):
+        """Test that a reload after a data file changed notifies the listeners, and its diff holds only the relabelled food item.
+        """
+        food_items_data_file_path, nutrient_amounts_data_file_path = write_data_files(str(tmp_path), 'Potatoes raw')
+        use_data_files(monkeypatch, food_items_data_file_path, nutrient_amounts_data_file_path)
+        service = CatalogService(reload_check_interval_seconds=0.0, catalog_store=CatalogStore(str(tmp_path / 'catalog')))
+        reloaded_catalogs = []
+        service.add_reload_listener(reloaded_catalogs.append)
+        catalog = service.get_catalog()
+
+        write_data_files(str(tmp_path), 'Potatoes new raw')
+        os.utime(food_items_data_file_path, ns=(1, 1))
+        reloaded_catalog = service.get_catalog()
+        catalog_update = get_catalog_diff(catalog, reloaded_catalog)
+
+        assert reloaded_catalogs == [reloaded_catalog]
+        assert [food_item.label for food_item in catalog_update.upserted_food_items] == ['Potatoes new raw']
+        assert catalog_update.nutrient_amounts_by_food_item_uri == {}
+        assert catalog_update.removed_food_item_uris == []
+        updated_catalog = service.apply_update(CatalogUpdate(
+            [FoodItem(EXEMPLAR_NEW_FOOD_ITEM_URI, 'Carrots raw')],
+            {EXEMPLAR_FOOD_ITEM_URI: [{'uri': EXEMPLAR_NUTRIENT_URI, 'label_en': 'protein, total', 'unit': 'g', 'value': 3.0}]}))
+        catalog_update = get_catalog_diff(updated_catalog, reloaded_catalog)
+        assert catalog_update.upserted_food_items == []
+        assert catalog_update.nutrient_amounts_by_food_item_uri == {EXEMPLAR_FOOD_ITEM_URI: [
+            {'uri': EXEMPLAR_NUTRIENT_URI, 'label_en': 'protein, total', 'unit': 'g', 'value': 2.0}]}
+        assert catalog_update.removed_food_item_uris == [EXEMPLAR_NEW_FOOD_ITEM_URI]
+        assert reloaded_catalogs == [reloaded_catalog]
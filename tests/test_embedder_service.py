@@ -0,0 +1,46 @@
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy as np
+from services.embedder_service import BatchingEmbedder
+
+
+class RecordingEmbedder:
+    """Deterministic embedder that records the size of every encode call.
+    """
+
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+        self.lock = threading.Lock()
+
+    def encode(self, texts: list[str], convert_to_numpy: bool = True) -> np.ndarray:
+        with self.lock:
+            self.batch_sizes.append(len(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestClass:
+
+    def test_concurrent_encodes_are_batched(self):
+        """Test that concurrent single-text encodes share batched calls and get their own embedding back.
+        """
+        recording_embedder = RecordingEmbedder()
+        batching_embedder = BatchingEmbedder(recording_embedder, max_batch_size=8, max_wait_ms=200.0)
+        texts = ['milk' * (index % 4 + 1) for index in range(16)]
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            embeddings = list(executor.map(batching_embedder.encode, texts))
+
+        assert [embedding[0] for embedding in embeddings] == [len(text) for text in texts]
+        assert len(recording_embedder.batch_sizes) < len(texts)
+        assert max(recording_embedder.batch_sizes) <= 8
+        assert batching_embedder.get_stats()['texts'] == len(texts)
+
+    def test_lists_are_encoded_directly(self):
+        """Test that an already batched list bypasses the scheduler.
+        """
+        recording_embedder = RecordingEmbedder()
+        embeddings = BatchingEmbedder(recording_embedder).encode(['milk', 'bread'])
+
+        assert embeddings.shape == (2, 2)
+        assert recording_embedder.batch_sizes == [2]
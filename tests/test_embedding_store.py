@@ -0,0 +1,63 @@
+
+import numpy as np
+from services.embedding_store import EmbeddingStore
+
+EXEMPLAR_MODEL_NAME: str = 'Linus4Lyf/test-food'
+EXEMPLAR_MODEL_REVISION: str = 'main'
+EXEMPLAR_LABELS: list[str] = ['Potatoes raw', 'Aubergine raw', 'Pomegranate']
+
+
+class CountingEmbedder:
+    """Deterministic embedder that records which labels it was asked to encode.
+    """
+
+    def __init__(self):
+        self.encoded_labels: list[str] = []
+
+    def encode(self, labels: list[str], convert_to_numpy: bool = True) -> np.ndarray:
+        self.encoded_labels.extend(labels)
+        return np.array([[len(label), ord(label[0]), 1.0] for label in labels], dtype=np.float32)
+
+
+class TestClass:
+
+    def test_warm_start_does_not_encode(self, tmp_path):
+        """Test that stored embeddings are reused and memory-mapped on a warm start.
+        """
+        cold_embedder = CountingEmbedder()
+        cold_embeddings = EmbeddingStore(EXEMPLAR_MODEL_NAME, EXEMPLAR_MODEL_REVISION, str(tmp_path)).get_embeddings(
+            EXEMPLAR_LABELS, cold_embedder)
+
+        warm_embedder = CountingEmbedder()
+        warm_embeddings = EmbeddingStore(EXEMPLAR_MODEL_NAME, EXEMPLAR_MODEL_REVISION, str(tmp_path)).get_embeddings(
+            EXEMPLAR_LABELS, warm_embedder)
+
+        assert cold_embedder.encoded_labels == EXEMPLAR_LABELS
+        assert warm_embedder.encoded_labels == []
+        assert isinstance(warm_embeddings, np.memmap)
+        assert np.array_equal(cold_embeddings, warm_embeddings)
+
+    def test_only_new_labels_are_encoded(self, tmp_path):
+        """Test that only labels missing from the store are encoded, in the requested order.
+        """
+        EmbeddingStore(EXEMPLAR_MODEL_NAME, EXEMPLAR_MODEL_REVISION, str(tmp_path)).get_embeddings(
+            EXEMPLAR_LABELS, CountingEmbedder())
+
+        embedder = CountingEmbedder()
+        labels = ['Figs fresh'] + EXEMPLAR_LABELS[::-1]
+        embeddings = EmbeddingStore(EXEMPLAR_MODEL_NAME, EXEMPLAR_MODEL_REVISION, str(tmp_path)).get_embeddings(
+            labels, embedder)
+
+        assert embedder.encoded_labels == ['Figs fresh']
+        assert np.array_equal(embeddings, CountingEmbedder().encode(labels))
+
+    def test_revision_change_invalidates_store(self, tmp_path):
+        """Test that embeddings of another model revision are never reused.
+        """
+        EmbeddingStore(EXEMPLAR_MODEL_NAME, EXEMPLAR_MODEL_REVISION, str(tmp_path)).get_embeddings(
+            EXEMPLAR_LABELS, CountingEmbedder())
+
+        embedder = CountingEmbedder()
+        EmbeddingStore(EXEMPLAR_MODEL_NAME, 'v2', str(tmp_path)).get_embeddings(EXEMPLAR_LABELS, embedder)
+
+        assert embedder.encoded_labels == EXEMPLAR_LABELS
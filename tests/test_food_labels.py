@@ -0,0 +1,53 @@
+import numpy as np
+from models.food_item import FoodItem
+from models.food_labels import FoodLabels
+from services.similarity_index import ExactSimilarityIndex
+
+
+def build_food_items() -> list[FoodItem]:
+    """Build food items with one, three and two preferred labels.
+    """
+    return [FoodItem('uri-0', 'apple'),
+            FoodItem('uri-1', 'pear', labels=('pear', 'peer', 'poire')),
+            FoodItem('uri-2', 'bread', labels=('brood',))]
+
+
+class TestClass:
+
+    def test_rows_start_with_the_first_labels(self):
+        """Test that row i is the first label of food item i and the other labels follow grouped by food item.
+        """
+        food_labels = FoodLabels(build_food_items())
+
+        rows, positions = food_labels.get_rows(np.array([2, 1]))
+
+        assert food_labels.labels == ['apple', 'pear', 'bread', 'peer', 'poire', 'brood']
+        assert food_labels.food_item_indexes.tolist() == [0, 1, 2, 1, 1, 2]
+        assert food_labels.max_label_count == 3
+        assert rows.tolist() == [2, 1, 5, 3, 4] and positions.tolist() == [0, 1, 0, 1, 1]
+
+    def test_grouped_top_k_returns_distinct_food_items_by_their_best_label(self):
+        """Test that a search over the labels yields every food item once, scored by its most similar label.
+        """
+        food_labels = FoodLabels(build_food_items())
+        # the two other labels of the pear are the closest to the query
+        embeddings = np.array([[0, 1, 0], [0, 0, 1], [1, 1, 0], [1, 0.1, 0], [1, 0.2, 0], [0.5, 1, 0]], dtype=np.float32)
+        similarity_index = ExactSimilarityIndex()
+        similarity_index.build(embeddings)
+
+        scores, rows = similarity_index.search(np.array([1, 0, 0], dtype=np.float32), 2 * food_labels.max_label_count)
+        top_scores, food_item_indexes = food_labels.group_top_k(scores, rows, 2)
+        all_scores, all_food_item_indexes = food_labels.group_top_k(scores, rows, 4)
+
+        assert food_item_indexes.tolist() == [[1, 2]]
+        assert np.isclose(top_scores[0][0], 1 / np.linalg.norm([1, 0.1, 0]))
+        assert all_food_item_indexes.tolist() == [[1, 2, 0, -1]] and np.isneginf(all_scores[0][3])
+
+    def test_single_labels_are_their_own_food_items(self):
+        """Test that food items with one label each are grouped without any work.
+        """
+        food_labels = FoodLabels([FoodItem('uri-0', 'apple'), FoodItem('uri-1', 'pear')])
+        scores = np.array([[0.9, 0.1]], dtype=np.float32)
+        rows = np.array([[1, 0]])
+
+        assert food_labels.group_top_k(scores, rows, 2)[1].tolist() == [[1, 0]]
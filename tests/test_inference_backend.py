@@ -0,0 +1,63 @@
+
+import numpy as np
+from services.inference_backend import StubEmbedder, check_parity, sample_texts
+
+
+class VectorEmbedder:
+    """Deterministic embedder that looks texts up in a fixed embedding matrix, plus optional noise.
+    """
+
+    def __init__(self, embeddings: np.ndarray, noise: float = 0.0):
+        self.embeddings = embeddings
+        self.noise = noise
+
+    def encode(self, texts: list[str], convert_to_numpy: bool = True) -> np.ndarray:
+        rows = self.embeddings[[int(text) for text in texts]]
+        return rows + np.random.default_rng(1).standard_normal(rows.shape).astype(np.float32) * self.noise
+
+
+class TestClass:
+
+    def test_parity_passes_for_close_embeddings(self):
+        """Test that a backend whose embeddings are nearly identical passes the parity check.
+        """
+        embeddings = np.random.default_rng(0).standard_normal((200, 16)).astype(np.float32)
+        texts = [str(row) for row in range(200)]
+
+        report = check_parity(VectorEmbedder(embeddings), VectorEmbedder(embeddings, noise=1e-4), texts)
+
+        assert report['passed']
+        assert report['mean_cosine'] > 0.999
+        assert report['top_k_overlap'] > 0.99
+
+    def test_parity_fails_for_diverging_embeddings(self):
+        """Test that a backend whose embeddings diverge fails the parity check, so the service falls back.
+        """
+        embeddings = np.random.default_rng(0).standard_normal((200, 16)).astype(np.float32)
+        texts = [str(row) for row in range(200)]
+
+        report = check_parity(VectorEmbedder(embeddings), VectorEmbedder(embeddings, noise=1.0), texts)
+
+        assert not report['passed']
+        assert report['min_cosine'] < report['mean_cosine'] < 0.99
+
+    def test_sample_texts_covers_the_whole_catalog(self):
+        """Test that the parity sample is evenly spaced and includes the first and last text.
+        """
+        texts = [str(row) for row in range(10000)]
+
+        sample = sample_texts(texts, sample_size=100)
+
+        assert len(sample) == 100
+        assert sample[0] == '0' and sample[-1] == '9999'
+        assert sample_texts(texts[:50], sample_size=100) == texts[:50]
+
+    def test_stub_embedder_is_deterministic(self):
+        """Test that the stub embedder returns the same normalized embeddings in every instance and shares words between texts.
+        """
+        embeddings = StubEmbedder().encode(['Potatoes raw', 'Potatoes boiled', 'Apple juice'])
+
+        assert np.array_equal(embeddings, StubEmbedder().encode(['Potatoes raw', 'Potatoes boiled', 'Apple juice']))
+        assert np.array_equal(embeddings[0], StubEmbedder().encode('potatoes  RAW'))
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+        assert embeddings[0] @ embeddings[1] > embeddings[0] @ embeddings[2]
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+from services.json_fragments import JsonFragments, encode_json, render_json
+
+EXEMPLAR_FOOD_ITEM_URI: str = 'http://www.foodvoc.org/resource/nevo#foodItem1'
+
+
+def get_catalog() -> Catalog:
+    """Create a one item catalog with two nutrient amounts.
+    """
+    nutrient_matrix = NutrientMatrix(food_item_uris=[EXEMPLAR_FOOD_ITEM_URI],
+                                     nutrient_uris=['http://www.foodvoc.org/resource/nevo#nutrientPROT',
+                                                    'http://www.foodvoc.org/resource/nevo#nutrientSUGAR'],
+                                     nutrient_labels=['protein, total', 'sugar, total'], units=['g', 'g'],
+                                     values=np.array([[2.0, 0.5]]), present=np.array([[True, True]]))
+    return Catalog(version='v1', food_items_by_food_item_uri={
+        EXEMPLAR_FOOD_ITEM_URI: FoodItem(uri=EXEMPLAR_FOOD_ITEM_URI, label='Crème brûlée')}, nutrient_matrix=nutrient_matrix)
+
+
+class TestClass:
+
+    def test_fragments_render_like_the_serialized_objects(self):
+        """Test that a document assembled from fragments equals the encoding of the serialized objects.
+        """
+        catalog = get_catalog()
+        food_item = catalog.food_items_by_food_item_uri[EXEMPLAR_FOOD_ITEM_URI]
+        json_fragments = JsonFragments(catalog)
+
+        rendered = render_json({'food_item': json_fragments.get_food_item(food_item),
+                                'nutrient_amounts': json_fragments.get_nutrient_amounts(EXEMPLAR_FOOD_ITEM_URI),
+                                'results': [{'search_text': 'crème', 'food_items': json_fragments.get_food_items([food_item] * 2)}]})
+
+        expected = {'food_item': food_item.serialize(),
+                    'nutrient_amounts': [nutrient_amount.serialize() for nutrient_amount
+                                         in catalog.nutrient_matrix.get_nutrient_amounts(EXEMPLAR_FOOD_ITEM_URI)],
+                    'results': [{'search_text': 'crème', 'food_items': [food_item.serialize()] * 2}]}
+        assert rendered == encode_json(expected)
+        assert json.loads(rendered) == expected
+        assert json_fragments.get_food_item(food_item) is json_fragments.get_food_item(food_item)
+
+    def test_relabelled_food_item_is_encoded_with_its_own_label(self):
+        """Test that a food item whose label differs from the catalog's, e.g. served by a service of the previous snapshot, keeps its label.
+        """
+        catalog = get_catalog()
+        json_fragments = JsonFragments(catalog)
+        catalog_fragment = json_fragments.get_food_item(catalog.food_items_by_food_item_uri[EXEMPLAR_FOOD_ITEM_URI])
+
+        fragment = json_fragments.get_food_item(FoodItem(uri=EXEMPLAR_FOOD_ITEM_URI, label='Pudding'))
+
+        assert json.loads(fragment) == {'uri': EXEMPLAR_FOOD_ITEM_URI, 'label': 'Pudding'}
+        assert json_fragments.get_food_item(catalog.food_items_by_food_item_uri[EXEMPLAR_FOOD_ITEM_URI]) is catalog_fragment
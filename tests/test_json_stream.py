@@ -0,0 +1,40 @@
+
+import hashlib
+import json
+import pytest
+from services.json_stream import JsonArrayStream, JsonStreamException
+
+EXEMPLAR_FOOD_ITEMS_WITH_NUTRIENTS: list = [{'food_item_uri': 'http://www.foodvoc.org/resource/nevo#foodItem{}'.format(index),
+                                             'nutrients': [{'label_en': 'protein, total', 'unit': 'g', 'value': index * 0.5}],
+                                             'note': 'crème brûlée ' * index}
+                                            for index in range(20)]
+
+
+class TestClass:
+
+    def test_items_are_streamed_with_any_chunk_size(self, tmp_path):
+        """Test that the items of the array are decoded one by one, whatever the chunk boundaries, and the whole file is hashed.
+        """
+        document = json.dumps({'data': [{'comment': 'food_items_with_nutrients',
+                                         'food_items_with_nutrients': EXEMPLAR_FOOD_ITEMS_WITH_NUTRIENTS + [12345]}],
+                               'after': True}, ensure_ascii=False, indent=2)
+        data_file_path = tmp_path / 'nutrients.json'
+        data_file_path.write_bytes(document.encode('utf-8'))
+
+        for chunk_size in [1, 3, 17, 1 << 16]:
+            content_hash = hashlib.sha1()
+            items = list(JsonArrayStream(str(data_file_path), 'food_items_with_nutrients', content_hash, chunk_size=chunk_size))
+            assert items == EXEMPLAR_FOOD_ITEMS_WITH_NUTRIENTS + [12345]
+            assert content_hash.hexdigest() == hashlib.sha1(document.encode('utf-8')).hexdigest()
+
+    def test_truncated_document_is_rejected(self, tmp_path):
+        """Test that a document cut inside the array raises a JsonStreamException instead of returning partial data silently.
+        """
+        document = json.dumps({'data': [{'food_items_with_nutrients': EXEMPLAR_FOOD_ITEMS_WITH_NUTRIENTS}]})
+        data_file_path = tmp_path / 'nutrients.json'
+        data_file_path.write_text(document[:len(document) // 2])
+
+        with pytest.raises(JsonStreamException):
+            list(JsonArrayStream(str(data_file_path), 'food_items_with_nutrients', chunk_size=64))
+        with pytest.raises(JsonStreamException):
+            list(JsonArrayStream(str(data_file_path), 'missing', chunk_size=64))
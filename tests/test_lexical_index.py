@@ -0,0 +1,52 @@
+import numpy as np
+from models.food_item import FoodItem
+from services.lexical_index import LexicalIndex, get_trigrams
+
+EXEMPLAR_LABELS: list[str] = ['Bread rye dark', 'Bread raisin', 'Bread', 'Rye crispbread', 'Cheese 48+', 'Breezer']
+
+
+def build_lexical_index() -> LexicalIndex:
+    """Build a LexicalIndex over a handful of labels.
+    """
+    return LexicalIndex([FoodItem('uri{}'.format(row), label) for row, label in enumerate(EXEMPLAR_LABELS)])
+
+
+class TestClass:
+
+    def test_labels_starting_with_the_prefix_come_first(self):
+        """Test that labels starting with the prefix come first, shortest first, followed by labels whose words match.
+        """
+        lexical_index = build_lexical_index()
+
+        assert lexical_index.complete('BRE') == [2, 5, 1, 0]
+        assert lexical_index.complete('rye br') == [0]
+        assert lexical_index.complete('br', limit=2) == [2, 5]
+        assert lexical_index.complete('  ') == []
+        assert lexical_index.complete('milk') == []
+
+    def test_exact_and_fuzzy_matches(self):
+        """Test that normalized labels are found exactly and that equal trigram sets score 1.
+        """
+        lexical_index = build_lexical_index()
+
+        scores = lexical_index.score('cheese  48+')
+
+        assert lexical_index.find_exact(' bread ') == [2]
+        assert lexical_index.find_exact('bread r') == []
+        assert int(np.argmax(scores)) == 4 and scores[4] == 1.0
+        assert 0 < lexical_index.score('bread rye drak')[0] < 1
+        assert get_trigrams('ab') == [' ab', 'ab ']
+
+    def test_every_preferred_label_is_indexed(self):
+        """Test that a food item is found by any of its labels, once, and scored by its best label.
+        """
+        lexical_index = LexicalIndex([FoodItem('uri0', 'Potatoes raw', ('Aardappelen rauw', 'Potatoes uncooked')),
+                                      FoodItem('uri1', 'Potato crisps'), FoodItem('uri2', 'Apple', ('Appel',))])
+
+        scores = lexical_index.score('aardappelen rauw')
+
+        assert lexical_index.complete('pota') == [0, 1]
+        assert lexical_index.complete('aard') == [0]
+        assert lexical_index.complete('rauw') == [0]
+        assert lexical_index.find_exact('APPEL') == [2]
+        assert len(scores) == 3 and scores[0] == 1.0 and scores[2] < 1.0
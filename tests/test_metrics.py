@@ -0,0 +1,50 @@
+from services import metrics
+from services.metrics import Histogram, finish_request_timing, measure_stage, record_stage, register_collector, render_metrics, start_request_timing
+
+
+class TestClass:
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test that observations are counted in cumulative buckets with their sum and count, per label value.
+        """
+        histogram = Histogram('test_duration_seconds', 'Test latency.', ('stage',), buckets=[0.1, 1.0])
+        histogram.observe(('encode',), 0.05)
+        histogram.observe(('encode',), 0.5)
+        histogram.observe(('encode',), 5.0)
+
+        name, metric_type, _, samples = histogram.collect()
+
+        assert (name, metric_type) == ('test_duration_seconds', 'histogram')
+        assert samples == [('_bucket', {'stage': 'encode', 'le': '0.1'}, 1),
+                           ('_bucket', {'stage': 'encode', 'le': '1.0'}, 2),
+                           ('_bucket', {'stage': 'encode', 'le': '+Inf'}, 3),
+                           ('_sum', {'stage': 'encode'}, 5.55),
+                           ('_count', {'stage': 'encode'}, 3)]
+
+    def test_stages_are_reported_in_the_server_timing_header(self):
+        """Test that the stages of a request are summed per stage, reported with the total and recorded under its endpoint.
+        """
+        start_request_timing('search_food')
+        record_stage('encode', 0.002)
+        record_stage('similarity', 0.001)
+        record_stage('encode', 0.001)
+        with measure_stage('serialize'):
+            pass
+
+        server_timing = finish_request_timing(200)
+
+        assert server_timing.startswith('encode;dur=3.000, similarity;dur=1.000, serialize;dur=')
+        assert ', total;dur=' in server_timing
+        assert finish_request_timing(200) is None
+        assert 'food_retriever_stage_duration_seconds_count{endpoint="search_food",stage="encode"} 2.0' in render_metrics()
+
+    def test_collectors_are_rendered_in_the_text_format(self, monkeypatch):
+        """Test that the metrics of a collector are rendered with their help, type and escaped labels.
+        """
+        monkeypatch.setattr(metrics, 'collectors', [])
+        register_collector(lambda: [('test_catalog_info', 'gauge', 'Test catalog.', [('', {'version': 'a"b'}, 1)])])
+
+        rendered_metrics = render_metrics()
+
+        assert '# HELP test_catalog_info Test catalog.\n# TYPE test_catalog_info gauge\n' in rendered_metrics
+        assert 'test_catalog_info{version="a\\"b"} 1.0\n' in rendered_metrics
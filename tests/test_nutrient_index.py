@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+from services.nutrient_index import NutrientIndex, NutrientIndexException
+
+EXEMPLAR_FOOD_ITEM_URIS: list[str] = ['http://www.foodvoc.org/resource/nevo#foodItem{}'.format(number) for number in range(1, 6)]
+
+
+def build_nutrient_index() -> NutrientIndex:
+    """Build a NutrientIndex over 5 food items where the fourth has no sugars and the fifth no nutrient amounts.
+    """
+    food_items_by_food_item_uri = {food_item_uri: FoodItem(food_item_uri, 'food {}'.format(number))
+                                   for number, food_item_uri in enumerate(EXEMPLAR_FOOD_ITEM_URIS, 1)}
+    nutrient_matrix = NutrientMatrix(food_item_uris=EXEMPLAR_FOOD_ITEM_URIS[:4],
+                                     nutrient_uris=['http://www.foodvoc.org/resource/nevo#nutrientPROT',
+                                                    'http://www.foodvoc.org/resource/nevo#nutrientSUGAR',
+                                                    'http://www.foodvoc.org/resource/nevo#nutrientSUGARADDED',
+                                                    'http://www.foodvoc.org/resource/nevo#nutrientENERC'],
+                                     nutrient_labels=['protein, total', 'sugars, total', 'sugars, added',
+                                                      'energy kcal, total metabolisable'],
+                                     units=['g', 'g', 'g', 'kcal'],
+                                     values=np.array([[25.0, 1.0, 0.0, 150.0], [10.0, 8.0, 4.0, 300.0],
+                                                      [30.0, 0.004, 0.0, 120.0], [21.0, 0.0, 0.0, 250.0]]),
+                                     present=np.array([[True, True, True, True], [True, True, True, True],
+                                                       [True, True, True, True], [True, False, True, True]]))
+    return NutrientIndex(Catalog('exemplar', food_items_by_food_item_uri, nutrient_matrix))
+
+
+class TestClass:
+
+    def test_filter_intersects_predicates(self):
+        """Test that only food items with an amount matching every predicate are found, in URI order.
+        """
+        nutrient_index = build_nutrient_index()
+
+        positions = nutrient_index.filter(nutrient_index.parse_predicates(['protein > 20 g and sugars, total < 5 g',
+                                                                           'energy < 200 kcal']))
+
+        assert [nutrient_index.catalog.sorted_food_item_uris[position] for position in positions] \
+            == [EXEMPLAR_FOOD_ITEM_URIS[0], EXEMPLAR_FOOD_ITEM_URIS[2]]
+        assert len(nutrient_index.filter([])) == 5
+
+    def test_parse_predicates_converts_units(self):
+        """Test that bounds are converted to the unit of the nutrient and bounds are inclusive only for '<=', '>=' and '='.
+        """
+        nutrient_index = build_nutrient_index()
+
+        assert nutrient_index.parse_predicates(['energy <= 1046 kJ'])[0].value == pytest.approx(250.0, rel=1e-3)
+        assert len(nutrient_index.filter(nutrient_index.parse_predicates(['sugars, total < 5 mg']))) == 1
+        assert len(nutrient_index.filter(nutrient_index.parse_predicates(['protein >= 25']))) == 2
+        assert len(nutrient_index.filter(nutrient_index.parse_predicates(['protein = 25 g']))) == 1
+        with pytest.raises(NutrientIndexException):
+            nutrient_index.parse_predicates(['energy > 5 g'])
+
+    def test_get_column_rejects_unknown_and_ambiguous_nutrients(self):
+        """Test that a nutrient is found by URI, label or first word, unless the first word starts several labels.
+        """
+        nutrient_index = build_nutrient_index()
+
+        assert nutrient_index.get_column('http://www.foodvoc.org/resource/nevo#nutrientENERC') == 3
+        assert nutrient_index.get_column('Protein, total') == 0
+        assert nutrient_index.get_column('energy') == 3
+        with pytest.raises(NutrientIndexException):
+            nutrient_index.get_column('sugars')
+        with pytest.raises(NutrientIndexException):
+            nutrient_index.get_column('prot')
+
+    def test_get_page_sorts_and_pages_with_cursors(self):
+        """Test that pages sorted by decreasing amount put missing amounts last and cursors resume after the last item.
+        """
+        nutrient_index = build_nutrient_index()
+        food_item_uris = []
+        cursor = None
+        while True:
+            food_items, total, cursor = nutrient_index.get_page([], sort='-sugars, total', cursor=cursor, limit=2)
+            food_item_uris.extend(food_item.uri for food_item in food_items)
+            if cursor is None:
+                break
+
+        assert total == 5
+        assert food_item_uris == [EXEMPLAR_FOOD_ITEM_URIS[index] for index in [1, 0, 2, 3, 4]]
@@ -0,0 +1,45 @@
+
+import numpy as np
+from models.nutrient_matrix import NutrientMatrix
+
+EXEMPLAR_FOOD_ITEM_URIS: list[str] = ['http://www.foodvoc.org/resource/nevo#foodItem1',
+                                      'http://www.foodvoc.org/resource/nevo#foodItem2']
+EXEMPLAR_NUTRIENT_URIS: list[str] = ['http://www.foodvoc.org/resource/nevo#nutrientPROT',
+                                     'http://www.foodvoc.org/resource/nevo#nutrientSUGAR']
+
+
+def build_nutrient_matrix() -> NutrientMatrix:
+    """Build a 2 x 2 NutrientMatrix where the second food item has no sugars.
+    """
+    return NutrientMatrix(food_item_uris=EXEMPLAR_FOOD_ITEM_URIS, nutrient_uris=EXEMPLAR_NUTRIENT_URIS,
+                          nutrient_labels=['protein, total', 'sugars, total'], units=['g', 'g'],
+                          values=np.array([[2.0, 0.5], [20.0, 0.0]]),
+                          present=np.array([[True, True], [True, False]]))
+
+
+class TestClass:
+
+    def test_get_value(self):
+        """Test constant time lookups, including a missing amount and unknown URIs.
+        """
+        nutrient_matrix = build_nutrient_matrix()
+
+        assert nutrient_matrix.get_value(EXEMPLAR_FOOD_ITEM_URIS[0], EXEMPLAR_NUTRIENT_URIS[1]) == 0.5
+        assert nutrient_matrix.get_value(EXEMPLAR_FOOD_ITEM_URIS[1], EXEMPLAR_NUTRIENT_URIS[1]) is None
+        assert nutrient_matrix.get_value('unknown', EXEMPLAR_NUTRIENT_URIS[0]) is None
+
+    def test_get_nutrient_amounts_skips_missing_amounts(self):
+        """Test that only given amounts are materialized as NutrientAmounts.
+        """
+        nutrient_amounts = build_nutrient_matrix().get_nutrient_amounts(EXEMPLAR_FOOD_ITEM_URIS[1])
+
+        assert [nutrient_amount.nutrient_uri for nutrient_amount in nutrient_amounts] == EXEMPLAR_NUTRIENT_URIS[:1]
+        assert nutrient_amounts[0].value == 20.0
+
+    def test_compute_weighted_sums(self):
+        """Test the weighted sum of every food item, labels without a weight count as 0.
+        """
+        nutrient_matrix = build_nutrient_matrix()
+        weight_vector = nutrient_matrix.get_weight_vector({'protein, total': 1, 'sugars, total': -1, 'alcohol': -1})
+
+        assert nutrient_matrix.compute_weighted_sums(weight_vector).tolist() == [1.5, 20.0]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from models.nutrient_matrix import NutrientMatrix
+from services.nutrient_profiles import NUTRIENT_PROFILES, NutrientProfileException, get_nutrient_weights
+
+
+class TestClass:
+
+    def test_profile_and_custom_weights_are_combined(self):
+        """Test that custom weights take precedence over the weights of a named profile.
+        """
+        nutrient_weights = get_nutrient_weights('low-sugar', {'sugars, total': -5, 'sodium': -1})
+
+        assert nutrient_weights == {**NUTRIENT_PROFILES['low-sugar'], 'sugars, total': -5.0, 'sodium': -1.0}
+        assert get_nutrient_weights(None) == {}
+
+    def test_invalid_profiles_and_weights_are_rejected(self):
+        """Test that unknown profiles and non numeric or non finite weights raise a NutrientProfileException.
+        """
+        for profile_name, weights in [('unknown', None), (['low-sugar'], None), (None, ['sodium']),
+                                      (None, {'sodium': 'low'}), (None, {'sodium': float('nan')}), (None, {'sodium': True})]:
+            with pytest.raises(NutrientProfileException):
+                get_nutrient_weights(profile_name, weights)
+
+    def test_unknown_nutrient_labels_are_rejected(self):
+        """Test that custom weights for labels the catalog does not have raise a NutrientProfileException naming them.
+        """
+        nutrient_labels = {'sodium': [0], 'sugars, total': [1]}
+
+        assert get_nutrient_weights('low-sugar', {'sodium': -1}, nutrient_labels) == {**NUTRIENT_PROFILES['low-sugar'], 'sodium': -1.0}
+        with pytest.raises(NutrientProfileException, match='sugar, salt'):
+            get_nutrient_weights(None, {'sugar': 1, 'sodium': -1, 'salt': -1}, nutrient_labels)
+
+    def test_profile_scores_are_one_weighted_sum(self):
+        """Test that a profile's weights spread over the matrix columns give the expected weighted sums.
+        """
+        nutrient_matrix = NutrientMatrix(food_item_uris=['a', 'b'], nutrient_uris=['n1', 'n2'],
+                                         nutrient_labels=['sodium', 'protein, total'], units=['mg', 'g'],
+                                         values=np.array([[100.0, 2.0], [10.0, 8.0]]), present=np.ones((2, 2), dtype=bool))
+
+        weighted_sums = nutrient_matrix.compute_weighted_sums(nutrient_matrix.get_weight_vector(
+            {'protein, total': 1, **get_nutrient_weights('low-sodium')}))
+
+        assert weighted_sums.tolist() == [-298.0, -22.0]
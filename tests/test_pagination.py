@@ -0,0 +1,38 @@
+
+import pytest
+from services.pagination import PaginationException, decode_cursor, encode_cursor, get_page
+
+
+class TestClass:
+
+    def test_pages_cover_all_keys_once(self):
+        """Test that following the cursors returns every key exactly once and in order.
+        """
+        sorted_keys = tuple(sorted('http://example.org/food#{}'.format(index) for index in range(25)))
+
+        keys, cursor = [], None
+        while True:
+            page, cursor = get_page(sorted_keys, cursor, limit=10)
+            keys.extend(page)
+            if cursor is None:
+                break
+
+        assert keys == list(sorted_keys)
+
+    def test_cursor_survives_a_reload(self):
+        """Test that a cursor continues after its key, even when keys were added or removed in between.
+        """
+        page, cursor = get_page(('a', 'b', 'c', 'd'), None, limit=2)
+        next_page, _ = get_page(('a', 'bb', 'd', 'e'), cursor, limit=2)
+
+        assert list(page) == ['a', 'b']
+        assert list(next_page) == ['bb', 'd']
+
+    def test_invalid_cursor_and_limit_are_rejected(self):
+        """Test that a malformed cursor or an out of range limit raise a PaginationException.
+        """
+        assert decode_cursor(encode_cursor('http://example.org/food#1')) == 'http://example.org/food#1'
+        with pytest.raises(PaginationException):
+            get_page(('a',), '%%%', limit=1)
+        with pytest.raises(PaginationException):
+            get_page(('a',), None, limit=0)
@@ -0,0 +1,53 @@
+
+import numpy as np
+from services.lru_cache import LruCache
+from services.query_cache import QueryCache, normalize_query
+
+EXEMPLAR_MODEL_KEY: str = 'Linus4Lyf/test-food@main'
+EXEMPLAR_EMBEDDING: np.ndarray = np.array([0.5, -1.0, 2.0], dtype=np.float32)
+
+
+class TestClass:
+
+    def test_normalize_query(self):
+        """Test that case and whitespace variants normalize to the same query.
+        """
+        assert normalize_query('  Whole   MILK ') == normalize_query('whole milk') == 'whole milk'
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted first.
+        """
+        lru_cache = LruCache(max_size=2)
+        lru_cache.put('milk', 1)
+        lru_cache.put('bread', 2)
+        lru_cache.get('milk')
+        lru_cache.put('cheese', 3)
+
+        assert lru_cache.get('bread') is None
+        assert lru_cache.get('milk') == 1
+        assert (lru_cache.hits, lru_cache.misses) == (2, 1)
+
+    def test_persistent_tier_is_shared(self, tmp_path):
+        """Test that an embedding cached by one worker is found by another through the persistent tier.
+        """
+        persistent_cache_path = str(tmp_path / 'query_embeddings.sqlite')
+        QueryCache(EXEMPLAR_MODEL_KEY, 'v1', 10, 10, persistent_cache_path).put_embedding('milk', EXEMPLAR_EMBEDDING)
+
+        other_worker_cache = QueryCache(EXEMPLAR_MODEL_KEY, 'v1', 10, 10, persistent_cache_path)
+        other_model_cache = QueryCache('other-model@main', 'v1', 10, 10, persistent_cache_path)
+
+        assert np.array_equal(other_worker_cache.get_embedding('milk'), EXEMPLAR_EMBEDDING)
+        assert other_worker_cache.get_stats()['persistent_embeddings']['hits'] == 1
+        assert other_model_cache.get_embedding('milk') is None
+
+    def test_results_are_dropped_on_catalog_version_change(self):
+        """Test that cached results are keyed by k and invalidated by a new catalog version.
+        """
+        query_cache = QueryCache(EXEMPLAR_MODEL_KEY, 'v1', 10, 10)
+        query_cache.put_results('milk', 20, [3, 1, 2])
+
+        assert query_cache.get_results('milk', 20) == [3, 1, 2]
+        assert query_cache.get_results('milk', 5) is None
+        query_cache.set_catalog_version('v2')
+        assert query_cache.get_results('milk', 20) is None
+        assert query_cache.get_stats()['results']['hit_rate'] == 1 / 3
@@ -0,0 +1,32 @@
+
+from services.response_cache import ResponseCache, compute_etag
+
+
+class TestClass:
+
+    def test_responses_are_dropped_when_the_version_changes(self):
+        """Test that cached responses are served for their version only and dropped on a version change.
+        """
+        response_cache = ResponseCache(max_size=10)
+        response_cache.put('v1', '/detail?food_item_uri=1', b'{"label": "milk"}')
+
+        assert response_cache.get('v1', '/detail?food_item_uri=1') == b'{"label": "milk"}'
+        assert response_cache.get('v2', '/detail?food_item_uri=1') is None
+        assert response_cache.get_stats()['size'] == 0
+
+    def test_cache_is_size_bounded(self):
+        """Test that the least recently used response is evicted beyond max_size.
+        """
+        response_cache = ResponseCache(max_size=2)
+        for index in range(3):
+            response_cache.put('v1', '/search?search_text={}'.format(index), index)
+
+        assert response_cache.get('v1', '/search?search_text=0') is None
+        assert response_cache.get('v1', '/search?search_text=2') == 2
+
+    def test_etag_depends_on_version_and_request(self):
+        """Test that the entity tag changes with the version and with the request, and is stable otherwise.
+        """
+        assert compute_etag('v1', '/search?search_text=milk') == compute_etag('v1', '/search?search_text=milk')
+        assert compute_etag('v1', '/search?search_text=milk') != compute_etag('v2', '/search?search_text=milk')
+        assert compute_etag('v1', '/search?search_text=milk') != compute_etag('v1', '/search?search_text=bread')
@@ -0,0 +1,137 @@
+
+import numpy as np
+from services.neighbor_table import NeighborTable
+from services.shared_embeddings import get_shared_object
+from services.similarity_index import ExactSimilarityIndex, IvfSimilarityIndex, QuantizedSimilarityIndex, evaluate_recall, load_or_build_similarity_index
+
+EXEMPLAR_ITEM_COUNT: int = 500
+EXEMPLAR_DIMENSION: int = 16
+
+
+def build_embeddings() -> np.ndarray:
+    """Build a reproducible random embedding matrix.
+    """
+    return np.random.default_rng(42).standard_normal((EXEMPLAR_ITEM_COUNT, EXEMPLAR_DIMENSION)).astype(np.float32)
+
+
+class TestClass:
+
+    def test_exact_search_matches_brute_force(self):
+        """Test that the exact backend returns the top cosine similarities, most similar first.
+        """
+        embeddings = build_embeddings()
+        similarity_index = ExactSimilarityIndex()
+        similarity_index.build(embeddings)
+
+        scores, indices = similarity_index.search(embeddings[7], 5)
+
+        unit_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        expected_scores = unit_embeddings @ unit_embeddings[7]
+        assert indices[0].tolist() == np.argsort(-expected_scores)[:5].tolist()
+        assert indices[0][0] == 7
+        assert np.allclose(scores[0], np.sort(expected_scores)[::-1][:5], atol=1e-5)
+
+    def test_ivf_probing_all_lists_is_exact(self):
+        """Test that the ivf backend has full recall when every list is probed.
+        """
+        similarity_index = IvfSimilarityIndex(n_lists=10, n_probe=10)
+        similarity_index.build(build_embeddings())
+
+        report = evaluate_recall(similarity_index, build_embeddings()[:50], top_k=10)
+
+        assert report['recall'] == 1.0
+        assert report['parameters'] == {'n_lists': 10, 'n_probe': 10}
+
+    def test_ivf_index_is_saved_and_loaded(self, tmp_path):
+        """Test that a saved ivf index is loaded instead of rebuilt and returns the same results.
+        """
+        embeddings = build_embeddings()
+        built_index = load_or_build_similarity_index('ivf', embeddings, str(tmp_path), n_lists=8, n_probe=2)
+        loaded_index = load_or_build_similarity_index('ivf', embeddings, str(tmp_path), n_lists=8, n_probe=2)
+
+        assert len(list(tmp_path.iterdir())) == 1
+        assert np.array_equal(loaded_index.list_rows, built_index.list_rows)
+        assert np.array_equal(loaded_index.search(embeddings[:20], 5)[1], built_index.search(embeddings[:20], 5)[1])
+
+    def test_neighbor_table_matches_exact_search(self):
+        """Test that the blocked neighbor table holds the exact search results of every item.
+        """
+        embeddings = build_embeddings()
+        exact_index = ExactSimilarityIndex()
+        exact_index.build(embeddings)
+        neighbor_table = NeighborTable(top_k=6)
+        neighbor_table.build(embeddings, block_size=64)
+
+        assert neighbor_table.indices.shape == (EXEMPLAR_ITEM_COUNT, 6)
+        assert np.array_equal(neighbor_table.indices, exact_index.search(embeddings, 6)[1])
+        assert neighbor_table.get_neighbors(7, 3) == exact_index.search(embeddings[7], 3)[1][0].tolist()
+
+    def test_ranked_search_only_returns_items_above_the_threshold(self):
+        """Test that a ranked search returns the most similar items of every query's suffix, padded when it is short.
+        """
+        embeddings = build_embeddings()
+        health_scores = np.random.default_rng(3).random(EXEMPLAR_ITEM_COUNT)
+        ranked_rows = np.argsort(health_scores, kind='stable')
+        first_positions = np.array([0, 250, EXEMPLAR_ITEM_COUNT - 3])
+        exact_index = ExactSimilarityIndex()
+        exact_index.build(embeddings)
+
+        scores, indices = exact_index.search_ranked(embeddings[:3], ranked_rows, first_positions, 5)
+
+        unit_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        for query_index, first_position in enumerate(first_positions):
+            candidate_rows = ranked_rows[first_position:]
+            expected_rows = candidate_rows[np.argsort(-(unit_embeddings[candidate_rows] @ unit_embeddings[query_index]))[:5]]
+            assert indices[query_index][indices[query_index] >= 0].tolist() == expected_rows.tolist()
+        assert indices[2].tolist()[3:] == [-1, -1] and np.isneginf(scores[2][3:]).all()
+
+    def test_quantized_search_agrees_with_exact_search(self):
+        """Test that the int8 scan with an exact re-rank returns the exact results and scores from a quarter of the memory.
+        """
+        embeddings = build_embeddings()
+        quantized_index = QuantizedSimilarityIndex(precision='int8', pca_dimension=0)
+        quantized_index.build(embeddings)
+        exact_index = ExactSimilarityIndex()
+        exact_index.build(embeddings)
+
+        report = evaluate_recall(quantized_index, embeddings[:50], top_k=10)
+        scores, indices = quantized_index.search(embeddings[:5], 10)
+
+        assert report['recall'] == 1.0
+        assert report['scan_mb'] < report['exact_scan_mb'] / 3
+        assert np.array_equal(indices, exact_index.search(embeddings[:5], 10)[1])
+        assert np.allclose(scores, exact_index.search(embeddings[:5], 10)[0], atol=1e-5)
+
+    def test_quantized_ranked_search_and_update_match_exact_search(self):
+        """Test that a reduced, float16 index answers ranked searches exactly and keeps doing so after an update.
+        """
+        embeddings = build_embeddings()
+        ranked_rows = np.argsort(np.random.default_rng(3).random(EXEMPLAR_ITEM_COUNT), kind='stable')
+        first_positions = np.array([0, 250, EXEMPLAR_ITEM_COUNT - 3])
+        quantized_index = QuantizedSimilarityIndex(precision='float16', pca_dimension=12, rerank_factor=10)
+        quantized_index.build(embeddings)
+        exact_index = ExactSimilarityIndex()
+        exact_index.build(embeddings)
+
+        indices = quantized_index.search_ranked(embeddings[:3], ranked_rows, first_positions, 5)[1]
+        updated_embeddings = embeddings.copy()
+        updated_embeddings[:10] = np.random.default_rng(7).standard_normal((10, EXEMPLAR_DIMENSION))
+        kept_rows = np.where(np.arange(EXEMPLAR_ITEM_COUNT) < 10, -1, np.arange(EXEMPLAR_ITEM_COUNT))
+        updated_index = quantized_index.update(updated_embeddings, kept_rows)
+
+        assert quantized_index.codes.shape == (EXEMPLAR_ITEM_COUNT, 12) and quantized_index.codes.dtype == np.float16
+        assert np.array_equal(indices, exact_index.search_ranked(embeddings[:3], ranked_rows, first_positions, 5)[1])
+        assert evaluate_recall(updated_index, updated_embeddings[:20], top_k=5)['recall'] >= 0.95
+        assert updated_index.search(updated_embeddings[3], 1)[1][0][0] == 3
+
+    def test_shared_objects_are_created_once_per_catalog_version(self):
+        """Test that services asking for the same object of a catalog version share one instance.
+        """
+        created = []
+
+        first = get_shared_object('version-1', ('embeddings',), lambda: created.append(1) or build_embeddings())
+        second = get_shared_object('version-1', ('embeddings',), lambda: created.append(2) or build_embeddings())
+        third = get_shared_object('version-2', ('embeddings',), lambda: created.append(3) or build_embeddings())
+
+        assert first is second and third is not first
+        assert created == [1, 3]
@@ -0,0 +1,61 @@
+import numpy as np
+from benchmarks.synthetic_catalog import SYNTHETIC_FOOD_ITEM_URI, SyntheticCatalog
+from models.catalog import Catalog
+from models.food_item import FoodItem
+from models.nutrient_matrix import NutrientMatrix
+from services import catalog_service
+from services.catalog_service import CatalogService
+from services.catalog_store import CatalogStore
+
+TEMPLATE_FOOD_ITEM_URIS: list[str] = ['http://www.foodvoc.org/resource/nevo#foodItem1',
+                                      'http://www.foodvoc.org/resource/nevo#foodItem10',
+                                      'http://www.foodvoc.org/resource/nevo#foodItem11']
+
+
+def get_template_catalog() -> Catalog:
+    """Create a three item template catalog, the last food item has no nutrient amounts.
+    """
+    food_items = {food_item_uri: FoodItem(uri=food_item_uri, label=label) for food_item_uri, label in zip(
+        TEMPLATE_FOOD_ITEM_URIS, ['Potatoes raw', 'Aubergine raw', 'Pomegranate'])}
+    nutrient_matrix = NutrientMatrix(food_item_uris=TEMPLATE_FOOD_ITEM_URIS[:2],
+                                     nutrient_uris=['http://www.foodvoc.org/resource/nevo#nutrientPROT',
+                                                    'http://www.foodvoc.org/resource/nevo#nutrientSUGAR'],
+                                     nutrient_labels=['protein, total', 'sugar, total'], units=['g', 'g'],
+                                     values=np.array([[2.0, 0.0], [1.0, 3.0]]),
+                                     present=np.array([[True, False], [True, True]]))
+    return Catalog(version='template', food_items_by_food_item_uri=food_items, nutrient_matrix=nutrient_matrix)
+
+
+class TestClass:
+
+    def test_synthetic_catalog_scales_the_templates(self, tmp_path, monkeypatch):
+        """Test that the written sources load as a catalog of the requested size, with jittered copies of the templates.
+        """
+        data_dir_path = tmp_path / 'data'
+        monkeypatch.setattr(catalog_service, 'FOOD_ITEMS_DATA_FILE_PATTERN', str(data_dir_path / 'food_item_labels_*.json'))
+        monkeypatch.setattr(catalog_service, 'NUTRIENT_AMOUNTS_FOR_FOOD_ITEMS_DATA_FILE_PATH',
+                            str(data_dir_path / 'nutrient_amounts_for_food_items.json'))
+        monkeypatch.setattr(catalog_service, 'CATALOG_SOURCES_MANIFEST_FILE_PATH', str(data_dir_path / 'missing.json'))
+
+        SyntheticCatalog(get_template_catalog(), 10).write(str(data_dir_path))
+        catalog = CatalogService(catalog_store=CatalogStore(str(tmp_path / 'catalog'))).load_catalog_from_sources()
+        nutrient_matrix = catalog.nutrient_matrix
+
+        assert len(catalog.food_items_by_food_item_uri) == 10
+        assert catalog.food_items_by_food_item_uri[SYNTHETIC_FOOD_ITEM_URI.format(0)].label == 'Potatoes raw'
+        assert catalog.food_items_by_food_item_uri[SYNTHETIC_FOOD_ITEM_URI.format(4)].label == 'Aubergine raw organic 1'
+        # the copies of the template without nutrient amounts have none either
+        assert len(nutrient_matrix.food_item_uris) == 7
+        first_copy_row = nutrient_matrix.row_by_food_item_uri[SYNTHETIC_FOOD_ITEM_URI.format(4)]
+        assert np.array_equal(nutrient_matrix.present[first_copy_row], [True, True])
+        assert 0.5 < nutrient_matrix.values[first_copy_row, 1] / 3.0 < 2.0
+
+    def test_synthetic_catalog_is_deterministic(self, tmp_path):
+        """Test that the same templates, size and seed write identical sources.
+        """
+        first_file_paths = SyntheticCatalog(get_template_catalog(), 20).write(str(tmp_path / 'first'))
+        second_file_paths = SyntheticCatalog(get_template_catalog(), 20).write(str(tmp_path / 'second'))
+
+        for first_file_path, second_file_path in zip(first_file_paths, second_file_paths):
+            with open(first_file_path) as first_file, open(second_file_path) as second_file:
+                assert first_file.read() == second_file.read()
@@ -0,0 +1,52 @@
+
+import threading
+import pytest
+from services.warmup_service import ComponentNotReadyException, LazyComponent
+
+
+class TestClass:
+
+    def test_component_loads_in_the_background(self):
+        """Test that a component loads in a background thread and reports its state and load duration.
+        """
+        release = threading.Event()
+        component = LazyComponent('slow', lambda: release.wait() and 'service')
+
+        component.start()
+        with pytest.raises(ComponentNotReadyException):
+            component.get(timeout_seconds=0.01)
+        assert component.get_status()['state'] == 'loading'
+
+        release.set()
+        assert component.get(timeout_seconds=5) == 'service'
+        assert component.get_status()['state'] == 'ready'
+        assert component.get_status()['load_duration_seconds'] >= 0
+
+    def test_failed_component_reports_its_error(self):
+        """Test that a failing load is reported and requests for the component are refused.
+        """
+        def fail():
+            raise ValueError('no model')
+        component = LazyComponent('broken', fail)
+
+        with pytest.raises(ComponentNotReadyException):
+            component.get(timeout_seconds=5)
+        assert component.get_status()['state'] == 'failed'
+        assert 'no model' in component.get_status()['error']
+
+    def test_failed_component_is_loaded_again(self):
+        """Test that a request after a failed load starts a new load, which can succeed.
+        """
+        attempts = []
+        def load_on_second_attempt():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ValueError('model not downloaded yet')
+            return 'service'
+        component = LazyComponent('flaky', load_on_second_attempt)
+
+        with pytest.raises(ComponentNotReadyException):
+            component.get(timeout_seconds=5)
+        assert component.get(timeout_seconds=5) == 'service'
+        assert component.get_status() == {'state': 'ready', 'load_duration_seconds': component.load_duration_seconds, 'error': None}
+        assert len(attempts) == 2